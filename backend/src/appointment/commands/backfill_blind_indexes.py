@@ -0,0 +1,60 @@
+from sqlalchemy.orm import Session, lazyload
+
+from ..database import models
+from ..dependencies.database import get_engine_and_session
+
+BLIND_INDEXED_MODELS = [
+    models.Subscriber,
+    models.Calendar,
+    models.Schedule,
+    models.ExternalConnections,
+    models.Invite,
+]
+
+
+def backfill(db: Session, batch_size: int = 500) -> dict[str, int]:
+    """(Re-)computes the blind index columns of every blind indexed model, one batch of rows at a time.
+    Returns the number of rows processed per table."""
+    processed = {}
+    for model in BLIND_INDEXED_MODELS:
+        processed[model.__tablename__] = 0
+        last_id = 0
+
+        while True:
+            rows = (
+                db.query(model)
+                .options(lazyload('*'))
+                .filter(model.id > last_id)
+                .order_by(model.id)
+                .limit(batch_size)
+                .all()
+            )
+            if len(rows) == 0:
+                break
+
+            for row in rows:
+                for index_column, column in model.__blind_indexes__.items():
+                    setattr(row, index_column, models.blind_index(getattr(row, column)))
+
+            processed[model.__tablename__] += len(rows)
+            last_id = rows[-1].id
+
+            db.commit()
+            # Don't keep the whole table around in the identity map
+            db.expunge_all()
+
+    return processed
+
+
+def run(batch_size: int):
+    print('Backfilling blind indexes...')
+
+    _, session = get_engine_and_session()
+
+    with session() as db:
+        processed = backfill(db, batch_size)
+
+    for table, count in processed.items():
+        print(f'{table}: {count} rows')
+
+    print('Finished backfilling blind indexes.')
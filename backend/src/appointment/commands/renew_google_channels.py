@@ -0,0 +1,77 @@
+import os
+
+from redis import Redis, RedisCluster
+from sqlalchemy.orm import Session
+
+from .. import utils
+from ..controller.apis.google_client import GoogleClient
+from ..controller.calendar import GoogleConnector
+from ..database import models, repo
+from ..dependencies.database import (
+    boot_redis_cluster,
+    boot_redis_pools,
+    close_redis_cluster,
+    close_redis_pools,
+    get_engine_and_session,
+    get_redis,
+)
+from ..dependencies.google import get_google_client
+
+
+def renew(db: Session, redis_instance: Redis | RedisCluster, google_client: GoogleClient) -> int:
+    """Opens a push notification channel for every mirrored Google calendar whose channel is about to run out.
+    Returns the number of channels opened."""
+    calendars = (
+        db.query(models.Calendar)
+        .filter(models.Calendar.provider == models.CalendarProvider.google)
+        .filter(models.Calendar.connected == 1)
+        .all()
+    )
+
+    renewed = 0
+    for calendar in calendars:
+        external_connection = utils.list_first(
+            repo.external_connection.get_by_type(db, calendar.owner_id, models.ExternalConnectionType.google)
+        )
+        if external_connection is None or external_connection.token is None:
+            continue
+
+        connector = GoogleConnector(
+            db=db,
+            redis_instance=redis_instance,
+            google_client=google_client,
+            remote_calendar_id=calendar.user,
+            subscriber_id=calendar.owner_id,
+            calendar_id=calendar.id,
+            google_tkn=external_connection.token,
+        )
+        mirror = connector.mirror()
+        if mirror is not None and mirror.renew_watch():
+            renewed += 1
+
+    return renewed
+
+
+def run():
+    if not os.getenv('GOOGLE_WEBHOOK_URL'):
+        print('No push notifications without GOOGLE_WEBHOOK_URL, nothing to do.')
+        return
+
+    boot_redis_cluster()
+    boot_redis_pools()
+
+    redis_instance = get_redis()
+    if redis_instance is None:
+        print('Google calendars are only mirrored with redis, please set REDIS_URL.')
+        return
+
+    _, session = get_engine_and_session()
+
+    try:
+        with session() as db:
+            renewed = renew(db, redis_instance, get_google_client())
+    finally:
+        close_redis_pools()
+        close_redis_cluster()
+
+    print(f'Opened {renewed} Google calendar push notification channels.')
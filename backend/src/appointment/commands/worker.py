@@ -0,0 +1,47 @@
+import logging
+import signal
+
+from ..controller.mailer import boot_templates, close_smtp_pool
+from ..dependencies.database import (
+    boot_redis_cluster,
+    boot_redis_pools,
+    close_redis_cluster,
+    close_redis_pools,
+    get_redis,
+)
+from ..middleware.l10n import boot_l10n
+from ..tasks import emails  # noqa: F401 - registers the email tasks
+from ..tasks.queue import Worker
+
+
+def run(concurrency: int = 4, max_attempts: int = 5, backoff: int = 30):
+    boot_redis_cluster()
+    boot_redis_pools()
+
+    redis_instance = get_redis()
+    if redis_instance is None:
+        print('The worker needs redis, please set REDIS_URL.')
+        return
+
+    # Parse our localization files and compile our email templates before the first job
+    boot_l10n()
+    boot_templates()
+
+    worker = Worker(redis_instance, concurrency=concurrency, max_attempts=max_attempts, backoff=backoff)
+
+    # Finish the jobs in progress on shutdown
+    def stop(signum, frame):
+        logging.info(f'[worker] Received signal {signum}, stopping...')
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f'Worker {worker.consumer} started, processing up to {concurrency} jobs at once.')
+    try:
+        worker.run()
+    finally:
+        close_smtp_pool()
+        close_redis_pools()
+        close_redis_cluster()
+    print('Worker stopped.')
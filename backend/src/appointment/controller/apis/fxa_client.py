@@ -145,7 +145,7 @@ class FxaClient:
     def token_saver(self, token):
         """requests-oauth automagically calls this function when it has a new refresh token for us.
         This makes it a bit awkward but we make it work..."""
-        from appointment.dependencies.database import get_db
+        from appointment.dependencies.database import get_engine_and_session
 
         self.client.token = token
 
@@ -153,9 +153,12 @@ class FxaClient:
         if self.subscriber_id is None:
             return
 
-        repo.external_connection.update_token(
-            next(get_db()), json.dumps(token), self.subscriber_id, models.ExternalConnectionType.fxa
-        )
+        # Borrow a connection from the shared pool just for this update
+        _, session = get_engine_and_session()
+        with session() as db:
+            repo.external_connection.update_token(
+                db, json.dumps(token), self.subscriber_id, models.ExternalConnectionType.fxa
+            )
 
     def get_profile(self):
         """Retrieve the user's profile information"""
@@ -1,11 +1,17 @@
 import logging
 import os
+import threading
+import time
 from datetime import datetime
+from functools import cache
 
+import httplib2
 import sentry_sdk
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, Resource
 from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http, HttpRequest
 
 from ... import utils
 from ...database import repo
@@ -13,7 +19,26 @@ from ...database.models import CalendarProvider
 from ...database.schemas import CalendarConnection
 from ...defines import DATETIMEFMT
 from ...exceptions.calendar import EventNotCreatedException, EventNotDeletedException, FreeBusyTimeException
-from ...exceptions.google_api import GoogleScopeChanged, GoogleInvalidCredentials
+from ...exceptions.google_api import GoogleScopeChanged, GoogleInvalidCredentials, GoogleSyncTokenExpired
+
+_http_local = threading.local()
+
+
+def get_http() -> httplib2.Http:
+    """Retrieves this thread's keep-alive transport to the Google APIs. httplib2 isn't thread-safe, so each thread
+    gets its own, and keeps its connections open for the next request."""
+    http = getattr(_http_local, 'http', None)
+    if http is None:
+        http = build_http()
+        _http_local.http = http
+    return http
+
+
+@cache
+def get_service(name: str, version: str) -> Resource:
+    """Retrieves a process-wide service object, built once from the discovery document bundled with the client.
+    It's not bound to any credentials, pass an authorized http object to each request's execute instead."""
+    return build(name, version, http=httplib2.Http(), cache_discovery=False, static_discovery=True)
 
 
 class GoogleClient:
@@ -27,6 +52,10 @@ class GoogleClient:
     ]
     client: Flow | None = None
 
+    # Most requests Google accepts in a single batch request
+    # Ref: https://developers.google.com/calendar/api/guides/batch
+    BATCH_SIZE = 50
+
     def __init__(self, client_id, client_secret, project_id, callback_url):
         self.config = {
             'web': {
@@ -58,6 +87,11 @@ class GoogleClient:
             access_type='offline', prompt='consent', login_hint=email if email else None
         )
 
+    @staticmethod
+    def authorized_http(token) -> AuthorizedHttp:
+        """Binds a token to this thread's shared transport, refreshing the token if needed"""
+        return AuthorizedHttp(token, http=get_http())
+
     def get_credentials(self, code: str):
         if self.client is None:
             return None
@@ -78,8 +112,7 @@ class GoogleClient:
         if self.client is None:
             return None
 
-        user_info_service = build('oauth2', 'v2', credentials=token)
-        user_info = user_info_service.userinfo().get().execute()
+        user_info = get_service('oauth2', 'v2').userinfo().get().execute(http=self.authorized_http(token))
 
         return user_info
 
@@ -88,69 +121,67 @@ class GoogleClient:
         Ref: https://developers.google.com/calendar/api/v3/reference/calendarList/list"""
         response = {}
         items = []
-        with build('calendar', 'v3', credentials=token, cache_discovery=False) as service:
-            request = service.calendarList().list(minAccessRole='writer')
-            while request is not None:
-                try:
-                    response = request.execute()
+        service = get_service('calendar', 'v3')
+        http = self.authorized_http(token)
 
-                    items += response.get('items', [])
-                except HttpError as e:
-                    logging.warning(f'[google_client.list_calendars] Request Error: {e.status_code}/{e.error_details}')
+        request = service.calendarList().list(minAccessRole='writer')
+        while request is not None:
+            try:
+                response = request.execute(http=http)
+
+                items += response.get('items', [])
+            except HttpError as e:
+                logging.warning(f'[google_client.list_calendars] Request Error: {e.status_code}/{e.error_details}')
 
-                request = service.calendarList().list_next(request, response)
+            request = service.calendarList().list_next(request, response)
 
         return items
 
     def get_free_busy(self, calendar_ids, time_min, time_max, token):
         """Query the free busy api
         Ref: https://developers.google.com/calendar/api/v3/reference/freebusy/query"""
-        response = {}
         items = []
 
-        import time
-
         perf_start = time.perf_counter_ns()
-        with build('calendar', 'v3', credentials=token, cache_discovery=False) as service:
-            request = service.freebusy().query(
-                body=dict(
-                    timeMin=time_min,
-                    timeMax=time_max,
-                    items=[{'id': calendar_id} for calendar_id in calendar_ids]
-                )
+        request = get_service('calendar', 'v3').freebusy().query(
+            body=dict(
+                timeMin=time_min,
+                timeMax=time_max,
+                items=[{'id': calendar_id} for calendar_id in calendar_ids]
             )
+        )
+
+        # FreeBusy isn't paginated, it's just the one request
+        try:
+            response = request.execute(http=self.authorized_http(token))
+            calendars = response.get('calendars', {}).values()
+            errors = [error for calendar in calendars for error in calendar.get('errors', [])]
+
+            # Log errors and throw 'em in sentry
+            if any(errors):
+                reasons = [
+                    {
+                        'domain': utils.setup_encryption_engine().encrypt(error.get('domain')),
+                        'reason': error.get('reason')
+                    } for error in errors
+                ]
+                ex = FreeBusyTimeException(reasons)
+                if os.getenv('SENTRY_DSN'):
+                    sentry_sdk.capture_exception(ex)
+                logging.warning(f'[google_client.get_free_time] FreeBusy API Error: {ex}')
+
+            calendar_items = [calendar.get('busy', []) for calendar in calendars]
+            for busy in calendar_items:
+                # Transform to datetimes to match caldav's behaviour
+                items += [
+                    {
+                        'start': datetime.strptime(entry.get('start'), DATETIMEFMT),
+                        'end': datetime.strptime(entry.get('end'), DATETIMEFMT)
+                    } for entry in busy
+                ]
+        except HttpError as e:
+            logging.warning(f'[google_client.get_free_time] Request Error: {e.status_code}/{e.error_details}')
 
-            while request is not None:
-                try:
-                    response = request.execute()
-                    errors = [calendar.get('errors') for calendar in response.get('calendars', {}).values()]
-
-                    # Log errors and throw 'em in sentry
-                    if any(errors):
-                        reasons = [
-                            {
-                                'domain': utils.setup_encryption_engine().encrypt(error.get('domain')),
-                                'reason': error.get('reason')
-                            } for error in errors
-                        ]
-                        if os.getenv('SENTRY_DSN'):
-                            ex = FreeBusyTimeException(reasons)
-                            sentry_sdk.capture_exception(ex)
-                        logging.warning(f'[google_client.get_free_time] FreeBusy API Error: {ex}')
-
-                    calendar_items = [calendar.get('busy', []) for calendar in response.get('calendars', {}).values()]
-                    for busy in calendar_items:
-                        # Transform to datetimes to match caldav's behaviour
-                        items += [
-                            {
-                                'start': datetime.strptime(entry.get('start'), DATETIMEFMT),
-                                'end': datetime.strptime(entry.get('end'), DATETIMEFMT)
-                            } for entry in busy
-                        ]
-                except HttpError as e:
-                    logging.warning(f'[google_client.get_free_time] Request Error: {e.status_code}/{e.error_details}')
-
-                request = service.calendarList().list_next(request, response)
         perf_end = time.perf_counter_ns()
 
         # Capture the metric if sentry is enabled
@@ -160,32 +191,37 @@ class GoogleClient:
 
         return items
 
+    # Limit the fields we request
+    EVENT_FIELDS = (
+        'items/id',
+        'items/iCalUID',
+        'items/status',
+        'items/summary',
+        'items/description',
+        'items/attendees',
+        'items/start',
+        'items/end',
+        'items/transparency',
+        # Top level stuff
+        'nextPageToken',
+    )
+
+    # Explicitly ignore workingLocation events
+    # See: https://developers.google.com/calendar/api/v3/reference/events#eventType
+    EVENT_TYPES = ['default', 'focusTime', 'outOfOffice']
+
     def list_events(self, calendar_id, time_min, time_max, token):
-        response = {}
         items = []
 
-        # Limit the fields we request
-        fields = ','.join(
-            (
-                'items/id',
-                'items/iCalUID',
-                'items/status',
-                'items/summary',
-                'items/description',
-                'items/attendees',
-                'items/start',
-                'items/end',
-                'items/transparency',
-                # Top level stuff
-                'nextPageToken',
-            )
-        )
+        fields = ','.join(self.EVENT_FIELDS)
+        event_types = self.EVENT_TYPES
 
-        # Explicitly ignore workingLocation events
-        # See: https://developers.google.com/calendar/api/v3/reference/events#eventType
-        event_types = ['default', 'focusTime', 'outOfOffice']
+        service = get_service('calendar', 'v3')
+        http = self.authorized_http(token)
 
-        with build('calendar', 'v3', credentials=token, cache_discovery=False) as service:
+        # list_next can't handle the repeated eventTypes parameter, so we pass the page token along ourselves
+        page_token = None
+        while True:
             request = service.events().list(
                 calendarId=calendar_id,
                 timeMin=time_min,
@@ -194,41 +230,139 @@ class GoogleClient:
                 orderBy='startTime',
                 eventTypes=event_types,
                 fields=fields,
+                pageToken=page_token,
             )
-            while request is not None:
-                try:
-                    response = request.execute()
+            try:
+                response = request.execute(http=http)
 
-                    items += response.get('items', [])
-                except HttpError as e:
-                    logging.warning(f'[google_client.list_events] Request Error: {e.status_code}/{e.error_details}')
+                items += response.get('items', [])
+            except HttpError as e:
+                logging.warning(f'[google_client.list_events] Request Error: {e.status_code}/{e.error_details}')
+                break
 
-                request = service.events().list_next(request, response)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
 
         return items
 
-    def save_event(self, calendar_id, body, token):
-        response = None
-        with build('calendar', 'v3', credentials=token, cache_discovery=False) as service:
+    def sync_events(
+        self, calendar_id, sync_token, token, time_min: str | None = None, time_max: str | None = None
+    ) -> tuple[list[dict], str | None]:
+        """Retrieve the events that changed since the sync token was handed out, or all of them (that end after
+        time_min and start before time_max, if given) without one. Returns the events, deleted ones come back
+        cancelled, and the sync token for next time. Ref: https://developers.google.com/calendar/api/guides/sync"""
+        items = []
+        fields = ','.join(self.EVENT_FIELDS + ('nextSyncToken',))
+
+        service = get_service('calendar', 'v3')
+        http = self.authorized_http(token)
+
+        page_token = None
+        while True:
+            request = service.events().list(
+                calendarId=calendar_id,
+                singleEvents=True,
+                eventTypes=self.EVENT_TYPES,
+                fields=fields,
+                syncToken=sync_token,
+                # Google doesn't take a time range along with a sync token, the changes we get are unbounded
+                timeMin=None if sync_token else time_min,
+                timeMax=None if sync_token else time_max,
+                pageToken=page_token,
+            )
             try:
-                response = service.events().import_(calendarId=calendar_id, body=body).execute()
+                response = request.execute(http=http)
             except HttpError as e:
-                logging.warning(f'[google_client.save_event] Request Error: {e.status_code}/{e.error_details}')
-                raise EventNotCreatedException()
+                if e.status_code == 410:
+                    raise GoogleSyncTokenExpired()
+                logging.warning(f'[google_client.sync_events] Request Error: {e.status_code}/{e.error_details}')
+                raise
+
+            items += response.get('items', [])
+
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return items, response.get('nextSyncToken')
+
+    def watch_events(self, calendar_id, channel_id, address, channel_token, ttl, token) -> dict:
+        """Ask Google to let the given address know whenever the calendar's events change
+        Ref: https://developers.google.com/calendar/api/guides/push"""
+        body = {
+            'id': channel_id,
+            'type': 'web_hook',
+            'address': address,
+            'token': channel_token,
+            'params': {'ttl': str(ttl)},
+        }
+        request = get_service('calendar', 'v3').events().watch(
+            calendarId=calendar_id, eventTypes=self.EVENT_TYPES, body=body
+        )
+        return request.execute(http=self.authorized_http(token))
+
+    def stop_channel(self, channel_id, resource_id, token):
+        """Stop push notifications of a channel opened by watch_events
+        Ref: https://developers.google.com/calendar/api/v3/reference/channels/stop"""
+        request = get_service('calendar', 'v3').channels().stop(body={'id': channel_id, 'resourceId': resource_id})
+        return request.execute(http=self.authorized_http(token))
+
+    def save_event(self, calendar_id, body, token):
+        response = None
+        try:
+            request = get_service('calendar', 'v3').events().import_(calendarId=calendar_id, body=body)
+            response = request.execute(http=self.authorized_http(token))
+        except HttpError as e:
+            logging.warning(f'[google_client.save_event] Request Error: {e.status_code}/{e.error_details}')
+            raise EventNotCreatedException()
 
         return response
 
     def delete_event(self, calendar_id, event_id, token):
         response = None
-        with build('calendar', 'v3', credentials=token, cache_discovery=False) as service:
-            try:
-                response = service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
-            except HttpError as e:
-                logging.warning(f'[google_client.delete_event] Request Error: {e.status_code}/{e.error_details}')
-                raise EventNotDeletedException()
+        try:
+            request = get_service('calendar', 'v3').events().delete(calendarId=calendar_id, eventId=event_id)
+            response = request.execute(http=self.authorized_http(token))
+        except HttpError as e:
+            logging.warning(f'[google_client.delete_event] Request Error: {e.status_code}/{e.error_details}')
+            raise EventNotDeletedException()
 
         return response
 
+    def execute_batch(self, requests: list[HttpRequest], token) -> list[tuple[dict | None, HttpError | None]]:
+        """Send several requests over Google's batch endpoint, in one round-trip per BATCH_SIZE requests.
+        Returns a (response, exception) tuple for each request, in the order they were passed in."""
+        service = get_service('calendar', 'v3')
+        http = self.authorized_http(token)
+        results = [(None, None)] * len(requests)
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = (response, exception)
+
+        for chunk in utils.chunk_list(list(enumerate(requests)), chunk_by=self.BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=callback)
+            for index, request in chunk:
+                batch.add(request, request_id=str(index))
+            batch.execute(http=http)
+
+        return results
+
+    def delete_events(self, calendar_id, event_ids: list[str], token):
+        """Delete several events with as few round-trips as possible, all of them are attempted even if some fail"""
+        events = get_service('calendar', 'v3').events()
+        try:
+            results = self.execute_batch(
+                [events.delete(calendarId=calendar_id, eventId=event_id) for event_id in event_ids], token
+            )
+        except HttpError as e:
+            logging.warning(f'[google_client.delete_events] Request Error: {e.status_code}/{e.error_details}')
+            raise EventNotDeletedException()
+
+        errors = [exception for _, exception in results if exception]
+        for e in errors:
+            logging.warning(f'[google_client.delete_events] Request Error: {e.status_code}/{e.error_details}')
+        if errors:
+            raise EventNotDeletedException()
+
     def sync_calendars(self, db, subscriber_id: int, token):
         # Grab all the Google calendars
         calendars = self.list_calendars(token)
@@ -3,17 +3,22 @@
 Handle authentication with Thunderbird Accounts or FxA and get subscription data.
 """
 
+import json
 import os
 import hashlib
 import hmac
 import datetime
 import urllib.parse
 
+from redis import Redis, RedisCluster
 from sqlalchemy.orm import Session
 
 from .apis.accounts_client import AccountsClient
 from .apis.fxa_client import FxaClient
+from .. import utils
 from ..database import schemas, models, repo
+from ..defines import REDIS_AUTH_SUBSCRIBER_KEY, REDIS_AUTH_SESSION_KEY
+from ..dependencies.database import get_redis
 
 
 def logout(
@@ -21,17 +26,105 @@ def logout(
     subscriber: models.Subscriber,
     auth_client: FxaClient | AccountsClient | None,
     deny_previous_tokens=True,
+    session_id: str | None = None,
 ):
-    """Sets a minimum valid issued at time (time). This prevents access tokens issued earlier from working."""
+    """Sets a minimum valid issued at time (time). This prevents access tokens issued earlier from working.
+    Pass in the accounts session id to stop trusting that session as well."""
     if deny_previous_tokens:
         subscriber.minimum_valid_iat_time = datetime.datetime.now(datetime.UTC)
         db.add(subscriber)
         db.commit()
 
+    invalidate_cached_auth(subscriber.id, session_id)
+
     if auth_client:
         auth_client.logout()
 
 
+def get_auth_cache(redis_instance: Redis | RedisCluster | None = None) -> Redis | RedisCluster | None:
+    """Retrieves the redis instance authentication checks are cached in, or None if they aren't cached"""
+    if int(os.getenv('AUTH_CACHE_TTL', 60)) <= 0:
+        return None
+    return redis_instance if redis_instance is not None else get_redis()
+
+
+def get_cached_validity(
+    subscriber_id: int, redis_instance: Redis | RedisCluster | None = None
+) -> tuple[int | None, bool] | None:
+    """Retrieve the minimum valid iat time (in seconds) of a subscriber's tokens and whether they're deleted, or None
+    if we haven't checked them recently"""
+    redis_instance = get_auth_cache(redis_instance)
+    if redis_instance is None:
+        return None
+
+    cached = redis_instance.get(f'{REDIS_AUTH_SUBSCRIBER_KEY}:{utils.obscure_key(subscriber_id)}')
+    if cached is None:
+        return None
+
+    cached = json.loads(cached)
+    return cached['iat'], cached['deleted']
+
+
+def put_cached_validity(subscriber: models.Subscriber, redis_instance: Redis | RedisCluster | None = None):
+    """Remember what a subscriber's tokens are checked against for a little while (AUTH_CACHE_TTL seconds)"""
+    redis_instance = get_auth_cache(redis_instance)
+    if redis_instance is None:
+        return False
+
+    minimum_valid_iat_time = subscriber.minimum_valid_iat_time
+    redis_instance.set(
+        f'{REDIS_AUTH_SUBSCRIBER_KEY}:{utils.obscure_key(subscriber.id)}',
+        json.dumps({
+            # We only need second resolution
+            'iat': int(minimum_valid_iat_time.timestamp()) if minimum_valid_iat_time else None,
+            'deleted': subscriber.is_deleted,
+        }),
+        ex=int(os.getenv('AUTH_CACHE_TTL', 60)),
+    )
+    return True
+
+
+def get_cached_session(session_id: str, redis_instance: Redis | RedisCluster | None = None) -> int | None:
+    """Retrieve the id of the subscriber an accounts session belongs to, or None if we haven't looked it up recently"""
+    redis_instance = get_auth_cache(redis_instance)
+    if redis_instance is None:
+        return None
+
+    subscriber_id = redis_instance.get(f'{REDIS_AUTH_SESSION_KEY}:{utils.obscure_key(session_id)}')
+    return int(subscriber_id) if subscriber_id is not None else None
+
+
+def put_cached_session(session_id: str, subscriber_id: int, redis_instance: Redis | RedisCluster | None = None):
+    """Remember who an accounts session belongs to for a little while (AUTH_CACHE_TTL seconds)"""
+    redis_instance = get_auth_cache(redis_instance)
+    if redis_instance is None:
+        return False
+
+    redis_instance.set(
+        f'{REDIS_AUTH_SESSION_KEY}:{utils.obscure_key(session_id)}',
+        subscriber_id,
+        ex=int(os.getenv('AUTH_CACHE_TTL', 60)),
+    )
+    return True
+
+
+def invalidate_cached_auth(
+    subscriber_id: int, session_id: str | None = None, redis_instance: Redis | RedisCluster | None = None
+):
+    """Drop what we've cached of a subscriber's authentication, so their next request is checked from scratch.
+    Optionally pass in an accounts session id to drop that as well."""
+    redis_instance = get_auth_cache(redis_instance)
+    if redis_instance is None:
+        return False
+
+    keys = [f'{REDIS_AUTH_SUBSCRIBER_KEY}:{utils.obscure_key(subscriber_id)}']
+    if session_id:
+        keys.append(f'{REDIS_AUTH_SESSION_KEY}:{utils.obscure_key(session_id)}')
+
+    redis_instance.delete(*keys)
+    return True
+
+
 def sign_url(url: str):
     """helper to sign a given url"""
     secret = os.getenv('SIGNED_SECRET')
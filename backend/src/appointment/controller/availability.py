@@ -0,0 +1,150 @@
+"""Module: availability
+
+Stores a per-day snapshot of the busy time that goes into a schedule's public availability, so only the days that
+changed (or were never computed) need to hit the remote calendars again.
+"""
+
+import json
+import math
+import os
+import time
+from datetime import date, datetime, UTC
+
+import numpy as np
+import sentry_sdk
+from redis import Redis, RedisCluster
+
+from .. import utils
+from ..database import models
+from ..defines import REDIS_AVAILABILITY_KEY, DATEFMT
+
+META_FIELD = 'meta'
+SECONDS_PER_DAY = 86400
+
+
+def utc_days(start: float, end: float) -> list[date]:
+    """Returns the utc days touched by the timestamp range [start, end)"""
+    first_day = math.floor(start / SECONDS_PER_DAY)
+    last_day = max(first_day, math.ceil(end / SECONDS_PER_DAY) - 1)
+    return [datetime.fromtimestamp(day * SECONDS_PER_DAY, UTC).date() for day in range(first_day, last_day + 1)]
+
+
+def utc_days_of_arrays(starts: np.ndarray, ends: np.ndarray) -> list[date]:
+    """Returns the sorted utc days touched by any of the timestamp ranges [start, end)"""
+    first_days = starts // SECONDS_PER_DAY
+    last_days = np.maximum(first_days, -(-ends // SECONDS_PER_DAY) - 1)
+
+    day_numbers = set(np.concatenate([first_days, last_days]).tolist())
+    # Ranges spanning more than two days are rare, fill in their middle days one by one
+    long_ranges = last_days - first_days > 1
+    for first_day, last_day in zip(first_days[long_ranges].tolist(), last_days[long_ranges].tolist()):
+        day_numbers.update(range(first_day, last_day))
+
+    return [datetime.fromtimestamp(day * SECONDS_PER_DAY, UTC).date() for day in sorted(day_numbers)]
+
+
+def get_key(subscriber_id: int):
+    return f'{REDIS_AVAILABILITY_KEY}:{utils.obscure_key(subscriber_id)}'
+
+
+def invalidate(subscriber_id: int, days: list[date] | None = None, redis_instance: Redis | RedisCluster | None = None):
+    """Drop the availability snapshot of a subscriber. Pass in days to only drop those days from the snapshot."""
+    if redis_instance is None:
+        return False
+
+    if days is None:
+        redis_instance.delete(get_key(subscriber_id))
+    elif len(days) > 0:
+        redis_instance.hdel(get_key(subscriber_id), *[day.strftime(DATEFMT) for day in days])
+
+    return True
+
+
+def invalidate_slot(
+    schedule: models.Schedule | None, start: datetime, duration: int, redis_instance: Redis | RedisCluster | None = None
+):
+    """Drop the days a schedule slot covers from its owner's availability snapshot"""
+    if schedule is None or schedule.calendar is None:
+        return False
+
+    start = start.timestamp()
+    return invalidate(schedule.calendar.owner_id, utc_days(start, start + duration * 60), redis_instance)
+
+
+class AvailabilitySnapshot:
+    """Per-day busy time of a subscriber's schedule. Each day is stored encrypted in a redis hash alongside a
+    fingerprint of the schedule and calendars it was computed for, a mismatch voids the whole snapshot."""
+
+    def __init__(
+        self,
+        redis_instance: Redis | RedisCluster | None,
+        subscriber_id: int,
+        schedule: models.Schedule,
+        calendars: list[models.Calendar],
+        expiry=None,
+    ):
+        self.redis_instance = redis_instance
+        self.key = get_key(subscriber_id)
+        self.expiry = int(expiry or os.getenv('REDIS_EVENT_EXPIRE_SECONDS', 900))
+        self.fingerprint = json.dumps([
+            schedule.id,
+            schedule.time_updated.timestamp() if schedule.time_updated else None,
+            sorted(calendar.id for calendar in calendars),
+        ])
+        # Set when the stored snapshot belongs to an outdated schedule or calendar setup
+        self.outdated = False
+
+    def get_days(self, days: list[date]) -> dict[date, list[tuple[float, float]] | None]:
+        """Retrieve the busy (start, end) timestamps for each day, or None if the day isn't stored or stale"""
+        busy_by_day = {day: None for day in days}
+        if self.redis_instance is None or len(days) == 0:
+            return busy_by_day
+
+        timer_boot = time.perf_counter_ns()
+
+        meta, *values = self.redis_instance.hmget(self.key, META_FIELD, *[day.strftime(DATEFMT) for day in days])
+        if meta is None or utils.decrypt(meta) != self.fingerprint:
+            self.outdated = meta is not None
+            return busy_by_day
+
+        now = time.time()
+        for day, value in zip(days, values):
+            if value is None:
+                continue
+
+            stored = json.loads(utils.decrypt(value))
+            if now - stored['t'] > self.expiry:
+                continue
+
+            busy_by_day[day] = [tuple(busy) for busy in stored['busy']]
+
+        sentry_sdk.set_measurement('redis_availability_get_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
+
+        return busy_by_day
+
+    def put_days(self, busy_by_day: dict[date, list[tuple[float, float]]]):
+        """Store the busy (start, end) timestamps for each given day"""
+        if self.redis_instance is None or len(busy_by_day) == 0:
+            return False
+
+        timer_boot = time.perf_counter_ns()
+
+        now = time.time()
+        mapping = {
+            day.strftime(DATEFMT): utils.encrypt(json.dumps({'t': now, 'busy': busy}))
+            for day, busy in busy_by_day.items()
+        }
+        mapping[META_FIELD] = utils.encrypt(self.fingerprint)
+
+        pipeline = self.redis_instance.pipeline()
+        if self.outdated:
+            pipeline.delete(self.key)
+        pipeline.hset(self.key, mapping=mapping)
+        pipeline.expire(self.key, self.expiry)
+        pipeline.execute()
+
+        self.outdated = False
+
+        sentry_sdk.set_measurement('redis_availability_put_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
+
+        return True
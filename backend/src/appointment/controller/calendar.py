@@ -3,30 +3,50 @@
 Handle connection to a CalDAV server.
 """
 
+import abc
+import concurrent.futures
+import contextvars
 import json
 import logging
+import secrets
+import threading
 import time
+import zlib
 import zoneinfo
 import os
+from collections import OrderedDict
 from urllib.parse import urlparse, urljoin
 
 import caldav.lib.error
+import msgpack
+import numpy as np
 import requests
 import sentry_sdk
 from dns.exception import DNSException
 from redis import Redis, RedisCluster
-from caldav import DAVClient
+from caldav import CalendarSet, DAVClient, Principal
 from fastapi import BackgroundTasks
 from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
 from icalendar import Calendar, Event, vCalAddress, vText
 from datetime import datetime, timedelta, timezone, UTC
+from functools import cache
 from zoneinfo import ZoneInfo
 from enum import Enum
 
 from sqlalchemy.orm import Session
 
+from . import availability
+from .mirror import CalDavMirror, GoogleMirror, google_event, as_timestamp, FLOATING_SLACK
 from .. import utils
-from ..defines import REDIS_REMOTE_EVENTS_KEY, DATEFMT, DEFAULT_CALENDAR_COLOUR
+from ..defines import (
+    REDIS_REMOTE_EVENTS_KEY,
+    REDIS_REMOTE_EVENTS_VERSION_KEY,
+    REDIS_CALDAV_MIRROR_KEY,
+    REDIS_GOOGLE_MIRROR_KEY,
+    DATEFMT,
+    DEFAULT_CALENDAR_COLOUR,
+)
 from .apis.google_client import GoogleClient
 from ..database.models import CalendarProvider, BookingStatus
 from ..database import schemas, models, repo
@@ -35,13 +55,213 @@ from ..exceptions.calendar import TestConnectionFailed
 from ..exceptions.validation import RemoteCalendarConnectionError
 from ..l10n import l10n
 from ..tasks.emails import send_invite_email, send_pending_email, send_rejection_email
+from ..tasks.queue import enqueue
+
+
+@cache
+def remote_calendar_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Process-wide bounded thread pool used to query remote calendars concurrently"""
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=int(os.getenv('REMOTE_CALENDAR_MAX_WORKERS', 8)), thread_name_prefix='remote-calendar'
+    )
+
+
+# Shared http sessions keyed by (url, user), with the password they were opened with
+_dav_sessions: OrderedDict[tuple[str, str], tuple[str, requests.Session]] = OrderedDict()
+_dav_sessions_lock = threading.Lock()
+
+# Discovered (principal url, calendar home url, expires at) keyed by (url, user)
+_dav_discovery: dict[tuple[str, str], tuple[str, str, float]] = {}
+
+
+def get_dav_session(url: str, user: str, password: str) -> requests.Session:
+    """Retrieves a process-wide http session for the given server and user, so connections to it are kept alive
+    across connectors. A changed password replaces the session, the least recently used ones are closed once there
+    are more than CALDAV_SESSION_POOL_SIZE."""
+    key = (url, user)
+    closing = []
+    with _dav_sessions_lock:
+        cached = _dav_sessions.get(key)
+        if cached and cached[0] == password:
+            _dav_sessions.move_to_end(key)
+            return cached[1]
+        if cached:
+            closing.append(cached[1])
+
+        session = requests.Session()
+        _dav_sessions[key] = (password, session)
+        while len(_dav_sessions) > int(os.getenv('CALDAV_SESSION_POOL_SIZE', 256)):
+            closing.append(_dav_sessions.popitem(last=False)[1][1])
+
+    for session_to_close in closing:
+        session_to_close.close()
+
+    return session
+
+
+def get_dav_client(url: str, user: str, password: str) -> DAVClient:
+    """Builds a DAV client for the given server and user on the shared http session. The client itself isn't shared,
+    caldav changes its url (e.g. for a calendar home on another host) and auth as it goes."""
+    client = DAVClient(url=url, username=user, password=password)
+    # It opened a session of its own, which hasn't connected anywhere yet
+    client.session.close()
+    client.session = get_dav_session(url, user, password)
+    return client
+
+
+def close_dav_clients():
+    """Close all shared DAV sessions, and forget what we've discovered"""
+    with _dav_sessions_lock:
+        sessions = [session for _, session in _dav_sessions.values()]
+        _dav_sessions.clear()
+        _dav_discovery.clear()
+
+    for session in sessions:
+        session.close()
+
+
+# Field of the cache generation hash that covers all of a subscriber's calendars
+ALL_CALENDARS_VERSION_FIELD = 'all'
+
+# Field of the cached events hash that holds which ranges are covered, and by which envelope
+CACHED_RANGES_FIELD = 'ranges'
+
+# Version of the envelope cached events are stored in, anything else is treated as not cached
+EVENT_CACHE_FORMAT = 3
+
+# Envelope payloads larger than this (in bytes) are compressed
+EVENT_CACHE_COMPRESS_BYTES = 1024
+
+# Envelope flags, stored in the first (encrypted) byte of the payload
+ENVELOPE_ZLIB = 2
+
+# The event fields that get their own slot in a cached row, anything else set goes in as extra json
+CACHED_EVENT_FIELDS = {'title', 'start', 'end', 'all_day', 'tentative', 'description'}
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = EPOCH.replace(tzinfo=UTC)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def utc_datetime(timestamp: float) -> datetime:
+    """Returns the naive utc datetime of a timestamp"""
+    return datetime.fromtimestamp(timestamp, UTC).replace(tzinfo=None)
+
+
+def pack_datetime(value: datetime) -> tuple[int, int | None]:
+    """Returns (utc microseconds since the epoch, utc offset in seconds or None if it's naive) of a datetime"""
+    offset = value.utcoffset()
+    if offset is None:
+        return (value - EPOCH) // MICROSECOND, None
+    return (value - EPOCH_UTC) // MICROSECOND, offset // timedelta(seconds=1)
+
+
+@cache
+def offset_timezone(offset: int) -> timezone:
+    return timezone(timedelta(seconds=offset))
+
+
+def unpack_datetime(micros: int, offset: int | None) -> datetime:
+    seconds, micros = divmod(micros, 1_000_000)
+    if offset is None:
+        return datetime.fromtimestamp(seconds, UTC).replace(tzinfo=None, microsecond=micros)
+    return datetime.fromtimestamp(seconds, offset_timezone(offset)).replace(microsecond=micros)
+
+
+def pack_events(events: list[schemas.Event]) -> str:
+    """Packs events into one encrypted envelope: the format version, then the encrypted flags and msgpack payload. Each
+    event is a row of [start, start offset, end, end offset, all day, tentative, title, description, extra]."""
+    rows = []
+    for event in events:
+        extra = None
+        if event.model_fields_set - CACHED_EVENT_FIELDS:
+            extra = event.model_dump(mode='json', exclude=CACHED_EVENT_FIELDS, exclude_defaults=True)
+        rows.append([
+            *pack_datetime(event.start),
+            *pack_datetime(event.end),
+            event.all_day,
+            event.tentative,
+            event.title,
+            event.description,
+            extra or None,
+        ])
+
+    flags, payload = 0, msgpack.packb(rows)
+    if len(payload) > EVENT_CACHE_COMPRESS_BYTES:
+        flags, payload = flags | ENVELOPE_ZLIB, zlib.compress(payload, 1)
+
+    return f'{EVENT_CACHE_FORMAT}:{utils.encrypt_bytes(bytes([flags]) + payload)}'
+
+
+def unpack_rows(envelope: str) -> list[list] | None:
+    """Unpacks the rows of an envelope, or None if we can't read it"""
+    version, _, encrypted = envelope.partition(':')
+    if version != str(EVENT_CACHE_FORMAT):
+        return None
+
+    payload = utils.decrypt_bytes(encrypted)
+    flags, payload = payload[0], payload[1:]
+    if flags & ENVELOPE_ZLIB:
+        payload = zlib.decompress(payload)
+    return msgpack.unpackb(payload)
+
+
+def row_overlaps(row: list, start: float, end: float) -> bool:
+    """Whether a cached row falls (at least partially) within the given utc timestamps. All day events are stored in
+    utc, but they're really in the calendar's timezone."""
+    slack = FLOATING_SLACK if row[4] else 0
+    return row[0] / 1e6 < end + slack and row[2] / 1e6 > start - slack
+
+
+# Cached events are copies of this one, which is much quicker than constructing (let alone validating) each
+EVENT_TEMPLATE = schemas.Event.model_construct(CACHED_EVENT_FIELDS, title='', start=EPOCH, end=EPOCH)
+
+
+def row_event(row: list) -> schemas.Event:
+    """Turns a cached row back into an event, these were validated on the way in so we don't do it again"""
+    start, start_offset, end, end_offset, all_day, tentative, title, description, extra = row
+    event = EVENT_TEMPLATE.model_copy(update={
+        'title': title,
+        'start': unpack_datetime(start, start_offset),
+        'end': unpack_datetime(end, end_offset),
+        'all_day': all_day,
+        'tentative': tentative,
+        'description': description,
+    })
+    if extra:
+        event = schemas.Event.model_validate({**dict(event), **extra})
+    return event
+
+
+def subtract_range(first: float, last: float, start: float, end: float) -> list[tuple[float, float]]:
+    """Returns what's left of first to last once start to end is taken out"""
+    return [(a, b) for a, b in ((first, min(last, start)), (max(first, end), last)) if a < b]
+
+
+def uncovered_ranges(start: float, end: float, ranges: list[tuple[float, float]]) -> list[tuple[float, float]]:
+    """Returns the parts of start to end not covered by any of the given ranges"""
+    gaps = []
+    cursor = start
+    for first, last in sorted(ranges):
+        if first >= end:
+            break
+        if last <= cursor:
+            continue
+        if first > cursor:
+            gaps.append((cursor, first))
+        cursor = last
+
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
 
 class RemoteEventState(Enum):
     CANCELLED = 'CANCELLED'
     TENTATIVE = 'TENTATIVE'
     CONFIRMED = 'CONFIRMED'
 
-class BaseConnector:
+class BaseConnector(abc.ABC):
     redis_instance: Redis | RedisCluster | None
     subscriber_id: int
     calendar_id: int
@@ -52,8 +272,8 @@ class BaseConnector:
         self.calendar_id = calendar_id
 
     def obscure_key(self, key):
-        """Obscure part of a key with our encryption algo"""
-        return utils.setup_encryption_engine().encrypt(key)
+        """Obscure part of a key with a keyed hash, see utils.obscure_key"""
+        return utils.obscure_key(key)
 
     def get_key_body(self, only_subscriber=False):
         parts = [self.obscure_key(self.subscriber_id)]
@@ -62,63 +282,160 @@ class BaseConnector:
 
         return ':'.join(parts)
 
-    def get_cached_events(self, key_scope):
-        """Retrieve any cached events, else returns None if redis is not available or there's no cache."""
-        if self.redis_instance is None:
-            return None
+    def get_cache_version_key(self) -> str:
+        return f'{REDIS_REMOTE_EVENTS_VERSION_KEY}:{self.get_key_body(only_subscriber=True)}'
 
-        key_scope = self.obscure_key(key_scope)
+    def get_cached_key(self) -> str:
+        """Returns the key of our cached events. It's namespaced by the subscriber's and the calendar's cache
+        generation, see bust_cached_events."""
+        versions = self.redis_instance.hmget(
+            self.get_cache_version_key(), ALL_CALENDARS_VERSION_FIELD, self.obscure_key(self.calendar_id)
+        )
+        generation = '.'.join(version or '0' for version in versions)
+        return f'{REDIS_REMOTE_EVENTS_KEY}:{self.get_key_body()}:{generation}'
+
+    @staticmethod
+    def load_cached_ranges(encrypted_ranges: str | None) -> list[list]:
+        """Returns the cached ranges as [[start, end, expires at, envelope field], ...] in utc timestamps"""
+        if encrypted_ranges is None:
+            return []
+        cached = json.loads(utils.decrypt(encrypted_ranges))
+        return cached['ranges'] if cached.get('format') == EVENT_CACHE_FORMAT else []
+
+    def get_cached_events(
+        self, start: datetime, end: datetime, key: str | None = None
+    ) -> tuple[list[schemas.Event], list[tuple[datetime, datetime]]]:
+        """Retrieve any cached events in the given range, along with the parts of the range that aren't cached (yet).
+        If redis is not available everything is uncached."""
+        if self.redis_instance is None:
+            return [], [(start, end)]
 
         timer_boot = time.perf_counter_ns()
 
-        encrypted_events = self.redis_instance.get(f'{REDIS_REMOTE_EVENTS_KEY}:{self.get_key_body()}:{key_scope}')
-        if encrypted_events is None:
+        range_start = as_timestamp(start)
+        range_end = as_timestamp(end)
+
+        cached = self.redis_instance.hgetall(key or self.get_cached_key())
+        now = time.time()
+        ranges = [
+            (max(first, range_start), min(last, range_end), field)
+            for first, last, expires, field in self.load_cached_ranges(cached.get(CACHED_RANGES_FIELD))
+            if expires > now and first < range_end and last > range_start
+        ]
+
+        # Each envelope is only unpacked once, even if it covers a couple of pieces of the range
+        envelopes = {}
+        for field in {field for _, _, field in ranges}:
+            envelopes[field] = unpack_rows(cached[field]) if field in cached else None
+        ranges = [(first, last, field) for first, last, field in ranges if envelopes[field] is not None]
+
+        gaps = uncovered_ranges(range_start, range_end, [(first, last) for first, last, _ in ranges])
+        if not ranges:
             sentry_sdk.set_measurement('redis_get_miss_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
-            return None
+            return [], [(start, end)]
+
+        # Events running across pieces are only picked up once
+        rows = {}
+        for first, last, field in ranges:
+            for row in envelopes[field]:
+                if row_overlaps(row, first, last):
+                    rows.setdefault((*row[:8], json.dumps(row[8]) if row[8] else None), row)
+        events = [row_event(row) for row in sorted(rows.values(), key=lambda row: row[0])]
 
         sentry_sdk.set_measurement('redis_get_hit_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
 
-        return [schemas.Event.model_load_redis(blob) for blob in json.loads(encrypted_events)]
+        return events, [(utc_datetime(first), utc_datetime(last)) for first, last in gaps]
 
     def put_cached_events(
         self,
-        key_scope,
+        start: datetime,
+        end: datetime,
         events: list[schemas.Event],
-        expiry=os.getenv('REDIS_EVENT_EXPIRE_SECONDS', 900)
+        expiry=None,
+        key: str | None = None,
     ):
-        """Sets the passed cached events with an option to set a custom expiry time."""
+        """Caches the passed events as everything there is in the given range, replacing whatever was cached there.
+        Optionally set a custom expiry time."""
         if self.redis_instance is None:
             return False
 
-        key_scope = self.obscure_key(key_scope)
         timer_boot = time.perf_counter_ns()
 
-        encrypted_events = json.dumps([event.model_dump_redis() for event in events])
-        self.redis_instance.set(
-            f'{REDIS_REMOTE_EVENTS_KEY}:{self.get_key_body()}:{key_scope}', value=encrypted_events, ex=expiry
-        )
+        expiry = int(expiry or os.getenv('REDIS_EVENT_EXPIRE_SECONDS', 900))
+        key = key or self.get_cached_key()
+        range_start = as_timestamp(start)
+        range_end = as_timestamp(end)
+        now = time.time()
+
+        pipeline = self.redis_instance.pipeline()
+        pipeline.hget(key, CACHED_RANGES_FIELD)
+        pipeline.hkeys(key)
+        encrypted_ranges, fields = pipeline.execute()
+
+        # Drop anything that ran out, and cut this range out of what's left
+        ranges = [
+            [first, last, expires, field]
+            for old_first, old_last, expires, field in self.load_cached_ranges(encrypted_ranges) if expires > now
+            for first, last in subtract_range(old_first, old_last, range_start, range_end)
+        ]
+        new_field = secrets.token_hex(8)
+        ranges.append([range_start, range_end, now + expiry, new_field])
+
+        # Envelopes no range points to anymore, including any left by a put we raced with
+        unused = set(fields) - {field for _, _, _, field in ranges} - {CACHED_RANGES_FIELD}
+
+        pipeline = self.redis_instance.pipeline()
+        if unused:
+            pipeline.hdel(key, *unused)
+        pipeline.hset(key, mapping={
+            new_field: pack_events(events),
+            CACHED_RANGES_FIELD: utils.encrypt(json.dumps({'format': EVENT_CACHE_FORMAT, 'ranges': ranges})),
+        })
+        pipeline.expire(key, expiry)
+        pipeline.execute()
+
         sentry_sdk.set_measurement('redis_put_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
 
         return True
 
+    def list_events(self, start: str, end: str) -> list[schemas.Event]:
+        """find all events in given date range, only asking the remote server for the parts we don't have cached"""
+        # If the cache is busted while we're fetching, what we got goes to the old generation
+        key = self.get_cached_key() if self.redis_instance is not None else None
+        events, gaps = self.get_cached_events(
+            datetime.strptime(start, DATEFMT), datetime.strptime(end, DATEFMT), key=key
+        )
+        if not gaps:
+            return events
+
+        for (gap_start, gap_end), fetched in zip(gaps, self.fetch_events(gaps)):
+            self.put_cached_events(gap_start, gap_end, fetched, key=key)
+            events += fetched
+
+        # Events running across the edge of a gap are both cached and fetched
+        events = {event.model_dump_json(): event for event in events}.values()
+        return sorted(events, key=lambda event: as_timestamp(event.start))
+
+    @abc.abstractmethod
+    def fetch_events(self, ranges: list[tuple[datetime, datetime]]) -> list[list[schemas.Event]]:
+        """find all events in each of the given (naive utc) ranges on the remote server"""
+
     def bust_cached_events(self, all_calendars=False):
-        """Delete cached events for a specific subscriber/calendar.
-        Optionally pass in all_calendars to remove all cached calendar events for a specific subscriber."""
+        """Invalidate cached events for a specific subscriber/calendar by bumping its cache generation, the old keys
+        are left to expire. Optionally pass in all_calendars to invalidate all cached calendar events for a specific
+        subscriber."""
         if self.redis_instance is None:
             return False
 
         timer_boot = time.perf_counter_ns()
 
-        # Scan returns a tuple like: (Cursor start, [...keys found])
-        ret = self.redis_instance.scan(
-            0, f'{REDIS_REMOTE_EVENTS_KEY}:{self.get_key_body(only_subscriber=all_calendars)}:*'
-        )
+        field = ALL_CALENDARS_VERSION_FIELD if all_calendars else self.obscure_key(self.calendar_id)
 
-        if len(ret[1]) == 0:
-            return False
-
-        # Expand the list in position 1, which is a list of keys found from the scan
-        self.redis_instance.delete(*ret[1])
+        pipeline = self.redis_instance.pipeline()
+        # Remote events changed, so the availability snapshot is outdated too
+        availability.invalidate(self.subscriber_id, redis_instance=pipeline)
+        pipeline.hincrby(self.get_cache_version_key(), field, 1)
+        pipeline.execute()
 
         sentry_sdk.set_measurement('redis_bust_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
 
@@ -130,6 +447,10 @@ class GoogleConnector(BaseConnector):
     This should match CaldavConnector (except for the constructor).
     """
 
+    # Number of calendars we ask for in a single FreeBusy query, this is the most the API allows
+    # Ref: https://developers.google.com/calendar/api/v3/reference/freebusy/query
+    FREE_BUSY_CHUNK_SIZE = 50
+
     def __init__(
         self,
         subscriber_id,
@@ -155,14 +476,76 @@ class GoogleConnector(BaseConnector):
         """Retrieve a list of { start, end } dicts that will indicate busy time for a user
         Note: This does not use the remote_calendar_id from the class,
         all calendars must be available under the google_token provided to the class"""
+        if self.mirror():
+            try:
+                busy = self.get_mirrored_busy_time(calendar_ids, start, end)
+                if busy is not None:
+                    return busy
+            except HttpError:
+                logging.warning('[calendar.get_busy_time] Could not sync mirror, falling back to FreeBusy.')
+
         time_min = datetime.strptime(start, DATEFMT).isoformat() + 'Z'
         time_max = datetime.strptime(end, DATEFMT).isoformat() + 'Z'
 
-        results = []
-        for calendars in utils.chunk_list(calendar_ids, chunk_by=5):
-            results += self.google_client.get_free_busy(calendars, time_min, time_max, self.google_token)
+        chunks = list(utils.chunk_list(calendar_ids, chunk_by=self.FREE_BUSY_CHUNK_SIZE))
+        if not chunks:
+            return []
+
+        def query(calendars):
+            return self.google_client.get_free_busy(calendars, time_min, time_max, self.google_token)
+
+        # Hand any other chunks to the pool, and query the first one ourselves in the meantime
+        executor = remote_calendar_executor()
+        futures = [executor.submit(contextvars.copy_context().run, query, chunk) for chunk in chunks[1:]]
+
+        results = query(chunks[0])
+        for future, chunk in zip(futures, chunks[1:]):
+            # We may be running on the pool ourselves, so don't wait on work it hasn't started yet
+            results += query(chunk) if future.cancel() else future.result()
         return results
 
+    def get_mirrored_busy_time(self, calendar_ids: list, start: str, end: str):
+        """Retrieve busy time from our mirrors of the given calendars, in the same shape FreeBusy would give us.
+        Returns None if the range reaches further out than the mirrors do."""
+        time_min = datetime.strptime(start, DATEFMT)
+        time_max = datetime.strptime(end, DATEFMT)
+
+        items = []
+        for calendar_id in calendar_ids:
+            mirror = self.mirror(calendar_id)
+            mirror.refresh()
+            if not mirror.covers(time_max):
+                return None
+            for event in mirror.events(time_min, time_max):
+                # FreeBusy hands out naive utc datetimes
+                items.append({
+                    'start': event.start.astimezone(UTC).replace(tzinfo=None) if event.start.tzinfo else event.start,
+                    'end': event.end.astimezone(UTC).replace(tzinfo=None) if event.end.tzinfo else event.end,
+                })
+        return items
+
+    def mirror(self, calendar_id: str | None = None) -> GoogleMirror | None:
+        """Retrieves the redis mirror of a calendar (by default the connector's), or None if we can't keep one"""
+        enabled = os.getenv('GOOGLE_MIRROR_ENABLED', '')
+        if self.redis_instance is None or not self.google_token or enabled.lower() not in ('true', '1'):
+            return None
+
+        calendar_id = calendar_id or self.remote_calendar_id
+        # Busting our cached events refreshes the mirror too, we only know the calendar's own field if it's ours
+        version_fields = [ALL_CALENDARS_VERSION_FIELD]
+        if calendar_id == self.remote_calendar_id:
+            version_fields.append(self.obscure_key(self.calendar_id))
+
+        return GoogleMirror(
+            self.redis_instance,
+            self.google_client,
+            self.google_token,
+            calendar_id,
+            f'{REDIS_GOOGLE_MIRROR_KEY}:{self.get_key_body(only_subscriber=True)}:{self.obscure_key(calendar_id)}',
+            version_key=self.get_cache_version_key(),
+            version_fields=version_fields,
+        )
+
     def test_connection(self) -> bool:
         """This occurs during Google OAuth login"""
         return bool(self.google_token)
@@ -190,74 +573,25 @@ class GoogleConnector(BaseConnector):
 
         return calendars
 
-    def list_events(self, start, end):
-        """find all events in given date range on the remote server"""
-        cache_scope = f'{start}_{end}'
-        cached_events = self.get_cached_events(cache_scope)
-        if cached_events:
-            return cached_events
-
-        time_min = datetime.strptime(start, DATEFMT).isoformat() + 'Z'
-        time_max = datetime.strptime(end, DATEFMT).isoformat() + 'Z'
-
-        # We're storing google cal id in user...for now.
-        remote_events = self.google_client.list_events(self.remote_calendar_id, time_min, time_max, self.google_token)
-
-        events = []
-        for event in remote_events:
-            # If the event doesn't have transparency assume its opaque (and thus blocks time) by default.
-            transparency = event.get('transparency', 'opaque').lower()
-            status = event.get('status').lower()
-
-            # Ignore cancelled events or non-time blocking events
-            if status == 'cancelled' or transparency == 'transparent':
-                continue
-
-            # Grab the attendee list for marking tentative events / filtering out declined events
-            attendees = event.get('attendees') or []
-            declined = any(
-                (attendee.get('self') and attendee.get('responseStatus') == 'declined') for attendee in attendees
-            )
-
-            # Don't show declined events
-            if declined:
-                continue
-
-            # Mark tentative events
-            tentative = any(
-                (attendee.get('self') and attendee.get('responseStatus') == 'tentative') for attendee in attendees
-            )
-
-            summary = event.get('summary', 'Title not found!')
-            description = event.get('description', '')
-
-            all_day = 'date' in event.get('start')
-
-            start = (
-                datetime.strptime(event.get('start')['date'], DATEFMT)
-                if all_day
-                else datetime.fromisoformat(event.get('start')['dateTime'])
-            )
-            end = (
-                datetime.strptime(event.get('end')['date'], DATEFMT)
-                if all_day
-                else datetime.fromisoformat(event.get('end')['dateTime'])
-            )
+    def fetch_events(self, ranges: list[tuple[datetime, datetime]]) -> list[list[schemas.Event]]:
+        """find all events in each of the given (naive utc) ranges on the remote server"""
+        mirror = self.mirror()
+        if mirror:
+            try:
+                mirror.refresh()
+                if all(mirror.covers(end) for _, end in ranges):
+                    return [mirror.events(start, end) for start, end in ranges]
+            except HttpError:
+                logging.warning('[calendar.fetch_events] Could not sync mirror, listing events instead.')
 
-            events.append(
-                schemas.Event(
-                    title=summary,
-                    start=start,
-                    end=end,
-                    all_day=all_day,
-                    tentative=tentative,
-                    description=description,
-                )
+        results = []
+        for start, end in ranges:
+            # We're storing google cal id in user...for now.
+            remote_events = self.google_client.list_events(
+                self.remote_calendar_id, start.isoformat() + 'Z', end.isoformat() + 'Z', self.google_token
             )
-
-        self.put_cached_events(cache_scope, events)
-
-        return events
+            results.append([event for event in map(google_event, remote_events) if event is not None])
+        return results
 
     def save_event(
         self,
@@ -317,7 +651,23 @@ class GoogleConnector(BaseConnector):
         """delete all events in given date range from the server
         Not intended to be used in production. For cleaning purposes after testing only.
         """
-        pass
+        time_min = datetime.strptime(start, DATEFMT)
+        time_max = time_min + timedelta(days=1)
+
+        remote_events = self.google_client.list_events(
+            self.remote_calendar_id, time_min.isoformat() + 'Z', time_max.isoformat() + 'Z', self.google_token
+        )
+        event_ids = [
+            event.get('id') for event in remote_events
+            if (event.get('start', {}).get('dateTime') or event.get('start', {}).get('date', '')).startswith(start)
+        ]
+
+        if event_ids:
+            self.google_client.delete_events(self.remote_calendar_id, event_ids, self.google_token)
+
+        self.bust_cached_events()
+
+        return len(event_ids)
 
 
 class CalDavConnector(BaseConnector):
@@ -340,11 +690,15 @@ class CalDavConnector(BaseConnector):
         self.user = user
 
         # connect to the CalDAV server
-        self.client = DAVClient(url=self.url, username=self.user, password=self.password)
+        self.client = get_dav_client(self.url, self.user, self.password)
 
     def get_busy_time(self, calendar_ids: list, start: str, end: str):
         """Retrieve a list of { start, end } dicts that will indicate busy time for a user
         Note: This does not use the remote_calendar_id from the class"""
+        # Our mirror already knows what's going on in this calendar
+        if calendar_ids == [self.url] and self.mirror():
+            return [{'start': event.start, 'end': event.end} for event in self.list_events(start, end)]
+
         time_min = datetime.strptime(start, DATEFMT)
         time_max = datetime.strptime(end, DATEFMT)
 
@@ -374,14 +728,53 @@ class CalDavConnector(BaseConnector):
 
         return items
 
+    def mirror(self) -> CalDavMirror | None:
+        """Retrieves the redis mirror of this calendar, or None if we can't keep one"""
+        enabled = os.getenv('CALDAV_MIRROR_ENABLED')
+        if self.redis_instance is None or (enabled and enabled.lower() not in ('true', '1')):
+            return None
+
+        return CalDavMirror(
+            self.redis_instance, self.client, self.url, f'{REDIS_CALDAV_MIRROR_KEY}:{self.get_key_body()}'
+        )
+
+    def principal(self) -> Principal:
+        """Retrieves the principal with its calendar home. Both urls are only discovered once per
+        CALDAV_DISCOVERY_TTL seconds for each server and user, saving a couple of PROPFINDs on every call."""
+        key = (self.url, self.user)
+        cached = _dav_discovery.get(key)
+        if cached and cached[2] > time.monotonic():
+            principal = Principal(client=self.client, url=cached[0])
+            # Set as is, the url setter would move the client over to the calendar home's host
+            principal.calendar_home_set = CalendarSet(self.client, cached[1])
+            return principal
+
+        principal = Principal(client=self.client)
+        _dav_discovery[key] = (
+            str(principal.url),
+            str(principal.calendar_home_set.url),
+            time.monotonic() + int(os.getenv('CALDAV_DISCOVERY_TTL', 3600)),
+        )
+        return principal
+
+    def calendars(self) -> list[caldav.Calendar]:
+        """List the calendars in the principal's calendar home"""
+        key = (self.url, self.user)
+        try:
+            return self.principal().calendars()
+        except caldav.lib.error.NotFoundError:
+            # The calendar home may have moved since we've looked, if so find it again
+            if _dav_discovery.pop(key, None) is None:
+                raise
+            return self.principal().calendars()
+
     def test_connection(self) -> bool:
         """Ensure the connection information is correct and the calendar connection works"""
 
         supports_vevent = False
 
         try:
-            cals = self.client.principal()
-            for cal in cals.calendars():
+            for cal in self.calendars():
                 supported_comps = cal.get_supported_components()
                 supports_vevent = 'VEVENT' in supported_comps
                 # If one supports it, then that's good enough!
@@ -427,8 +820,7 @@ class CalDavConnector(BaseConnector):
     def sync_calendars(self):
         error_occurred = False
 
-        principal = self.client.principal()
-        for cal in principal.calendars():
+        for cal in self.calendars():
             # Does this calendar support vevents?
             supported_comps = cal.get_supported_components()
 
@@ -463,8 +855,7 @@ class CalDavConnector(BaseConnector):
     def list_calendars(self):
         """find all calendars on the remote server"""
         calendars = []
-        principal = self.client.principal()
-        for c in principal.calendars():
+        for c in self.calendars():
             calendars.append(
                 schemas.CalendarConnectionOut(
                     title=c.name,
@@ -474,18 +865,23 @@ class CalDavConnector(BaseConnector):
             )
         return calendars
 
-    def list_events(self, start, end):
-        """find all events in given date range on the remote server"""
-        cache_scope = f'{start}_{end}'
-        cached_events = self.get_cached_events(cache_scope)
-        if cached_events:
-            return cached_events
+    def fetch_events(self, ranges: list[tuple[datetime, datetime]]) -> list[list[schemas.Event]]:
+        """find all events in each of the given (naive utc) ranges on the remote server"""
+        mirror = self.mirror()
+        if mirror:
+            # Only what changed since last time is transferred, the rest comes out of the mirror
+            mirror.refresh()
+            return [mirror.events(start, end) for start, end in ranges]
 
+        return [self.search_events(start, end) for start, end in ranges]
+
+    def search_events(self, start: datetime, end: datetime):
+        """query the remote server for all events in given date range"""
         events = []
         calendar = self.client.calendar(url=self.url)
         result = calendar.search(
-            start=datetime.strptime(start, DATEFMT),
-            end=datetime.strptime(end, DATEFMT),
+            start=start,
+            end=end,
             event=True,
             expand=True,
         )
@@ -530,8 +926,6 @@ class CalDavConnector(BaseConnector):
                 )
             )
 
-        self.put_cached_events(cache_scope, events)
-
         return events
 
     def save_event(
@@ -638,7 +1032,8 @@ class Tools:
             attendee.timezone = 'UTC'
         date = slot.start.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(attendee.timezone))
         # Send mail
-        background_tasks.add_task(
+        enqueue(
+            background_tasks,
             send_invite_email,
             organizer.name,
             organizer.email,
@@ -666,7 +1061,8 @@ class Tools:
             attendee.timezone = 'UTC'
         date = slot.start.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(attendee.timezone))
         # Send mail
-        background_tasks.add_task(
+        enqueue(
+            background_tasks,
             send_pending_email,
             organizer.name,
             date=date,
@@ -692,7 +1088,8 @@ class Tools:
             attendee.timezone = 'UTC'
         date = slot.start.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(attendee.timezone))
         # Send mail
-        background_tasks.add_task(
+        enqueue(
+            background_tasks,
             send_rejection_email,
             organizer.name,
             date=date,
@@ -704,8 +1101,13 @@ class Tools:
     @staticmethod
     def available_slots_from_schedule(schedule: models.Schedule) -> list[schemas.SlotBase]:
         """This helper calculates a list of slots according to the given schedule configuration."""
-        slots = []
+        starts, durations = Tools.slot_arrays_from_schedule(schedule)
+        return Tools.slots_from_arrays(starts, durations, timezone=zoneinfo.ZoneInfo(schedule.calendar.owner.timezone))
 
+    @staticmethod
+    def slot_arrays_from_schedule(schedule: models.Schedule) -> tuple[np.ndarray, np.ndarray]:
+        """Same as available_slots_from_schedule, but returns the slots as two int64 arrays:
+        the start as unix timestamp and the duration in minutes. Slots are sorted by start."""
         now = datetime.now()
 
         subscriber = schedule.calendar.owner
@@ -750,22 +1152,20 @@ class Tools:
 
         slot_duration_seconds = schedule.slot_duration * 60
 
-        # Between the available booking time
-        for ordinal in range(schedule_start.toordinal(), schedule_end.toordinal()):
-            time_start = 0
+        # Every day between the available booking time that is within our schedule's weekdays.
+        # Ordinal 1 (0001-01-01) is a monday, so this gives us the iso weekday.
+        ordinals = np.arange(schedule_start.toordinal(), schedule_end.toordinal(), dtype=np.int64)
+        ordinals = ordinals[np.isin((ordinals - 1) % 7 + 1, weekdays)]
 
-            # If it's today and now is greater than our normal start time...
-            if now_tz.toordinal() == ordinal and now_tz_total_seconds > start_time.total_seconds():
-                # Note: This is in seconds!
-                # Get the offset from now to 0:00:00, and adjust it so 0 aligns with our start_time.
-                # (So if the date is today it's 9am, and our start time is also 9am then time_start should be 0)
-                time_start = int(now_tz_total_seconds - start_time.total_seconds())
+        # Offsets of each timeslot from the day's start time, we step by slot duration in seconds.
+        offsets = np.arange(0, max(total_time, 0), slot_duration_seconds, dtype=np.int64)
 
-                # Round up to the nearest slot duration, I'm bad at math...
-                # Get the remainder of the slow, subtract that from our time_start, then add the slot duration back in.
-                time_start -= time_start % slot_duration_seconds
-                time_start += slot_duration_seconds
+        if len(ordinals) == 0 or len(offsets) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
 
+        day_starts = np.empty(len(ordinals), dtype=np.int64)
+        shifted_days = []
+        for index, ordinal in enumerate(ordinals.tolist()):
             date = datetime.fromordinal(ordinal)
             current_datetime = datetime(
                 year=date.year,
@@ -775,16 +1175,91 @@ class Tools:
                 minute=start_time_local.minute,
                 tzinfo=timezone,
             )
-            # Check if this weekday is within our schedule
-            if current_datetime.isoweekday() in weekdays:
-                # Generate each timeslot based on the selected duration
-                # We just loop through the difference of the start and end time and step by slot duration in seconds.
-                slots += [
-                    schemas.SlotBase(start=current_datetime + timedelta(seconds=time), duration=schedule.slot_duration)
-                    for time in range(time_start, total_time, slot_duration_seconds)
-                ]
+            day_starts[index] = int(current_datetime.timestamp())
+
+            # Slots follow the wall clock, so if the utc offset changes during the day (dst) they can't be placed
+            # by simply adding seconds to the day's start.
+            last_slot = current_datetime + timedelta(seconds=int(offsets[-1]))
+            if current_datetime.utcoffset() != last_slot.utcoffset():
+                shifted_days.append((index, current_datetime))
 
-        return slots
+        starts = day_starts[:, None] + offsets[None, :]
+        for index, current_datetime in shifted_days:
+            starts[index] = [
+                int((current_datetime + timedelta(seconds=offset)).timestamp()) for offset in offsets.tolist()
+            ]
+
+        # Mask out everything before now
+        mask = np.ones(starts.shape, dtype=bool)
+        today = np.flatnonzero(ordinals == now_tz.toordinal())
+
+        # If it's today and now is greater than our normal start time...
+        if len(today) and now_tz_total_seconds > start_time.total_seconds():
+            # Note: This is in seconds!
+            # Get the offset from now to 0:00:00, and adjust it so 0 aligns with our start_time.
+            # (So if the date is today it's 9am, and our start time is also 9am then time_start should be 0)
+            time_start = int(now_tz_total_seconds - start_time.total_seconds())
+
+            # Round up to the nearest slot duration, I'm bad at math...
+            # Get the remainder of the slow, subtract that from our time_start, then add the slot duration back in.
+            time_start -= time_start % slot_duration_seconds
+            time_start += slot_duration_seconds
+
+            mask[today[0]] = offsets >= time_start
+
+        starts = starts[mask]
+        return starts, np.full(len(starts), schedule.slot_duration, dtype=np.int64)
+
+    @staticmethod
+    def slots_from_arrays(
+        starts: np.ndarray, durations: np.ndarray, booked: np.ndarray | None = None, timezone=UTC
+    ) -> list[schemas.SlotBase]:
+        """Turns slot arrays (unix timestamp starts, durations in minutes, and optionally a booked flag)
+        into slot objects localized to the given timezone."""
+        if booked is None:
+            booked = np.zeros(len(starts), dtype=bool)
+
+        return [
+            schemas.SlotBase(
+                start=datetime.fromtimestamp(start, timezone),
+                duration=duration,
+                booking_status=BookingStatus.booked if is_booked else BookingStatus.none,
+            )
+            for start, duration, is_booked in zip(starts.tolist(), durations.tolist(), booked.tolist())
+        ]
+
+    @staticmethod
+    def merge_busy_intervals(intervals: list[tuple[float, float]]) -> list[tuple[float, float]]:
+        """Sorts (start, end) timestamp intervals into a list of non-overlapping intervals.
+        Only intervals that truly overlap are merged, intervals that merely touch stay separate."""
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start < merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+
+        return merged
+
+    @staticmethod
+    def blocked_by_busy(slot_starts: np.ndarray, slot_ends: np.ndarray, busy: list[tuple[float, float]]) -> np.ndarray:
+        """Returns a mask of the slots that overlap any of the busy (start, end) timestamp intervals"""
+        busy = Tools.merge_busy_intervals(busy)
+        if len(busy) == 0:
+            return np.zeros(len(slot_starts), dtype=bool)
+
+        busy_starts, busy_ends = np.array(busy, dtype=np.float64).T
+
+        # Merged intervals don't overlap, so their ends are sorted as well.
+        # Find the first busy interval ending after each slot starts, any earlier one can't block it.
+        index = np.searchsorted(busy_ends, slot_starts, side='right')
+
+        # if there is an overlap of both date ranges, a collision was found
+        # see https://en.wikipedia.org/wiki/De_Morgan%27s_laws
+        blocked = index < len(busy_ends)
+        blocked[blocked] = busy_starts[index[blocked]] < slot_ends[blocked]
+        return blocked
 
     @staticmethod
     def events_roll_up_difference(
@@ -793,35 +1268,38 @@ class Tools:
         """This helper rolls up all events from list A, which have a time collision with any event in list B
         and returns all remaining elements from A as new list.
         """
+        busy = [(event.start.timestamp(), event.end.timestamp()) for event in b_list]
+        return Tools.busy_roll_up_difference(a_list, busy)
 
-        def is_blocker(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datetime):
-            """
-            if there is an overlap of both date ranges, a collision was found
-            see https://en.wikipedia.org/wiki/De_Morgan%27s_laws
-            """
-            return a_start.timestamp() < b_end.timestamp() and a_end.timestamp() > b_start.timestamp()
+    @staticmethod
+    def busy_roll_up_difference(
+        a_list: list[schemas.SlotBase], busy: list[tuple[float, float]]
+    ) -> list[schemas.SlotBase]:
+        """Same as events_roll_up_difference, but takes the busy time as (start, end) timestamp intervals."""
+        # Timestamps are expensive, grab them once per slot
+        slot_starts = np.array([slot.start.timestamp() for slot in a_list], dtype=np.float64)
+        slot_ends = np.array(
+            [(slot.start + timedelta(minutes=slot.duration)).timestamp() for slot in a_list], dtype=np.float64
+        )
+        blocked = Tools.blocked_by_busy(slot_starts, slot_ends, busy)
 
         available_slots = []
         collisions = []
+        previous_collision_end = None
 
-        for slot in a_list:
-            slot_start = slot.start
-            slot_end = slot.start + timedelta(minutes=slot.duration)
-
-            # If any of the events are overlap the slot time...
-            if any([is_blocker(slot_start, slot_end, event.start, event.end) for event in b_list]):
-                previous_collision_end = (
-                    collisions[-1].start + timedelta(minutes=collisions[-1].duration) if len(collisions) else None
-                )
-
+        for slot, slot_start, is_blocked in zip(a_list, slot_starts.tolist(), blocked.tolist()):
+            if is_blocked:
                 # ...and the last item was a previous collision then extend the previous collision's duration
-                if previous_collision_end and previous_collision_end.timestamp() == slot_start.timestamp():
+                if previous_collision_end == slot_start:
                     collisions[-1].duration += slot.duration
                 else:
                     # ...if the last item was a normal available time, then create a new collision
                     collisions.append(
-                        schemas.SlotBase(start=slot_start, duration=slot.duration, booking_status=BookingStatus.booked)
+                        schemas.SlotBase(start=slot.start, duration=slot.duration, booking_status=BookingStatus.booked)
                     )
+                previous_collision_end = (
+                    collisions[-1].start + timedelta(minutes=collisions[-1].duration)
+                ).timestamp()
             else:
                 # ...Otherwise, just append the normal available time.
                 available_slots.append(slot)
@@ -834,6 +1312,67 @@ class Tools:
 
         return available_slots
 
+    @staticmethod
+    def busy_roll_up_arrays(
+        starts: np.ndarray, durations: np.ndarray, busy: list[tuple[float, float]]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Array version of busy_roll_up_difference for sorted, non-overlapping slots (see slot_arrays_from_schedule).
+        Returns the start, duration and booked flag arrays of the remaining slots and rolled up collisions."""
+        ends = starts + durations * 60
+        blocked = Tools.blocked_by_busy(starts, ends, busy)
+
+        # Back to back collisions are rolled up into one booked slot
+        blocked_starts, blocked_ends, blocked_durations = starts[blocked], ends[blocked], durations[blocked]
+        run_starts = np.ones(len(blocked_starts), dtype=bool)
+        run_starts[1:] = blocked_starts[1:] != blocked_ends[:-1]
+        run_indices = np.flatnonzero(run_starts)
+
+        collision_durations = (
+            np.add.reduceat(blocked_durations, run_indices) if len(run_indices) else blocked_durations[run_indices]
+        )
+
+        # Append the two lists, and sort!
+        starts = np.concatenate([starts[~blocked], blocked_starts[run_indices]])
+        durations = np.concatenate([durations[~blocked], collision_durations])
+        booked = np.arange(len(starts)) >= len(starts) - len(run_indices)
+
+        order = np.argsort(starts, kind='stable')
+        return starts[order], durations[order], booked[order]
+
+    @staticmethod
+    def caldav_busy_events(con: 'CalDavConnector', url: str, start: str, end: str) -> list[schemas.Event]:
+        """Retrieve busy time from a caldav calendar, falling back to a full event listing if the server
+        doesn't support the FreeBusy API."""
+        try:
+            return [
+                schemas.Event(
+                    start=busy.get('start'),
+                    end=busy.get('end'),
+                    title='Busy'
+                ) for busy in con.get_busy_time([url], start, end)
+            ]
+        except caldav.lib.error.ReportError:
+            logging.debug("[Tools.caldav_busy_events] CalDAV server does not support FreeBusy API.")
+            pass
+
+        # Okay maybe this server doesn't support freebusy, try the old way
+        try:
+            return con.list_events(start, end)
+        except requests.exceptions.ConnectionError:
+            # Connection error with remote caldav calendar, don't crash this route.
+            return []
+
+    @staticmethod
+    def google_busy_events(con: 'GoogleConnector', calendar_ids: list, start: str, end: str) -> list[schemas.Event]:
+        """Retrieve busy time for a chunk of google calendars"""
+        return [
+            schemas.Event(
+                start=busy.get('start'),
+                end=busy.get('end'),
+                title='Busy'
+            ) for busy in con.get_busy_time(calendar_ids, start, end)
+        ]
+
     @staticmethod
     def existing_events_for_schedule(
         schedule: models.Schedule,
@@ -842,30 +1381,37 @@ class Tools:
         google_client: GoogleClient,
         db,
         redis=None,
-    ) -> list[schemas.Event]:
-        """This helper retrieves all events existing in given calendars for the scheduled date range"""
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> tuple[list[schemas.Event], list[int]]:
+        """This helper retrieves all events existing in given calendars for the scheduled date range, or the given
+        start and end date range. Remote calendars are queried concurrently within one time budget, returns the events
+        and a list of calendar ids that did not answer in time."""
         existing_events = []
         google_calendars = []
+        caldav_connectors = []
 
-        now = datetime.now()
+        if start is None or end is None:
+            now = datetime.now()
 
-        earliest_booking = now + timedelta(minutes=schedule.earliest_booking)
-        farthest_booking = now + timedelta(minutes=schedule.farthest_booking)
+            earliest_booking = now + timedelta(minutes=schedule.earliest_booking)
+            farthest_booking = now + timedelta(minutes=schedule.farthest_booking)
 
-        start = max([datetime.combine(schedule.start_date, schedule.start_time), earliest_booking])
-        end = (
-            min([datetime.combine(schedule.end_date, schedule.end_time), farthest_booking])
-            if schedule.end_date
-            else farthest_booking
-        )
+            start = max([datetime.combine(schedule.start_date, schedule.start_time), earliest_booking])
+            end = (
+                min([datetime.combine(schedule.end_date, schedule.end_time), farthest_booking])
+                if schedule.end_date
+                else farthest_booking
+            )
+        start = start.strftime(DATEFMT)
+        end = end.strftime(DATEFMT)
 
         # handle calendar events
         for calendar in calendars:
             if calendar.provider == CalendarProvider.google:
                 google_calendars.append(calendar)
             else:
-                # Caldav - We don't have a smart way to batch these right now so just call them 1 by 1
-                con = CalDavConnector(
+                caldav_connectors.append((calendar, CalDavConnector(
                     db=db,
                     redis_instance=redis,
                     url=calendar.url,
@@ -873,30 +1419,9 @@ class Tools:
                     password=calendar.password,
                     subscriber_id=subscriber.id,
                     calendar_id=calendar.id,
-                )
+                )))
 
-                try:
-                    existing_events.extend([
-                        schemas.Event(
-                            start=busy.get('start'),
-                            end=busy.get('end'),
-                            title='Busy'
-                        ) for busy in
-                        con.get_busy_time([calendar.url], start.strftime(DATEFMT), end.strftime(DATEFMT))
-                    ])
-
-                    # We're good here, continue along the loop
-                    continue
-                except caldav.lib.error.ReportError:
-                    logging.debug("[Tools.existing_events_for_schedule] CalDAV server does not support FreeBusy API.")
-                    pass
-
-                # Okay maybe this server doesn't support freebusy, try the old way
-                try:
-                    existing_events.extend(con.list_events(start.strftime(DATEFMT), end.strftime(DATEFMT)))
-                except requests.exceptions.ConnectionError:
-                    # Connection error with remote caldav calendar, don't crash this route.
-                    pass
+        google_connector = None
 
         # Batch up google calendar calls since we can only have one google calendar connected
         if len(google_calendars) > 0 and google_calendars[0].provider == CalendarProvider.google:
@@ -906,7 +1431,7 @@ class Tools:
             if external_connection is None or external_connection.token is None:
                 raise RemoteCalendarConnectionError()
 
-            con = GoogleConnector(
+            google_connector = GoogleConnector(
                 db=db,
                 redis_instance=redis,
                 google_client=google_client,
@@ -915,17 +1440,47 @@ class Tools:
                 subscriber_id=subscriber.id,
                 google_tkn=external_connection.token,
             )
-            existing_events.extend([
-                schemas.Event(
-                    start=busy.get('start'),
-                    end=busy.get('end'),
-                    title='Busy'
-                ) for busy in con.get_busy_time(
-                    [calendar.user for calendar in google_calendars],
-                    start.strftime(DATEFMT),
-                    end.strftime(DATEFMT)
-                )
-            ])
+
+        # Fan out every remote query, each future maps to the calendar ids it covers
+        executor = remote_calendar_executor()
+        futures = {}
+
+        def submit(fn, *args):
+            # Carry our request context (l10n, etc...) over to the worker thread
+            return executor.submit(contextvars.copy_context().run, fn, *args)
+
+        for calendar, con in caldav_connectors:
+            futures[submit(Tools.caldav_busy_events, con, calendar.url, start, end)] = [calendar.id]
+
+        if google_connector:
+            for chunk in utils.chunk_list(google_calendars, chunk_by=GoogleConnector.FREE_BUSY_CHUNK_SIZE):
+                calendar_ids = [calendar.user for calendar in chunk]
+                futures[submit(Tools.google_busy_events, google_connector, calendar_ids, start, end)] = [
+                    calendar.id for calendar in chunk
+                ]
+
+        # In seconds, the total time budget for all remote queries
+        timeout = float(os.getenv('REMOTE_CALENDAR_TIMEOUT', 10))
+
+        timer_fan_out = time.perf_counter_ns()
+        timed_out_calendars = []
+        try:
+            # Merge results as they arrive
+            for future in concurrent.futures.as_completed(futures, timeout=timeout):
+                existing_events.extend(future.result())
+        except concurrent.futures.TimeoutError:
+            for future, calendar_ids in futures.items():
+                if not future.done():
+                    timed_out_calendars.extend(calendar_ids)
+            logging.warning(
+                f'[Tools.existing_events_for_schedule] {len(timed_out_calendars)} calendar(s) did not answer in time.'
+            )
+        finally:
+            # Don't leave any queued up work behind if we're bailing early
+            for future in futures:
+                future.cancel()
+
+        sentry_sdk.set_measurement('remote_calendar_fan_out_time', time.perf_counter_ns() - timer_fan_out, 'nanosecond')
 
         # handle already requested time slots
         for slot in schedule.slots:
@@ -937,7 +1492,67 @@ class Tools:
                 )
             )
 
-        return existing_events
+        return existing_events, timed_out_calendars
+
+    @staticmethod
+    def availability_for_schedule(
+        schedule: models.Schedule,
+        calendars: list[schemas.Calendar],
+        subscriber: models.Subscriber,
+        google_client: GoogleClient,
+        db,
+        redis=None,
+    ) -> tuple[list[schemas.SlotBase], list[int]]:
+        """This helper calculates the available slots of a schedule. Busy time is served from the availability
+        snapshot, only days missing from it are requested from the remote calendars (and then stored).
+        Returns the slots and a list of calendar ids that did not answer in time."""
+        starts, durations = Tools.slot_arrays_from_schedule(schedule)
+
+        # Every utc day our slots touch
+        days = availability.utc_days_of_arrays(starts, starts + durations * 60)
+
+        snapshot = availability.AvailabilitySnapshot(redis, subscriber.id, schedule, calendars)
+        busy_by_day = snapshot.get_days(days)
+
+        missing_days = [day for day in days if busy_by_day[day] is None]
+        unavailable_calendars = []
+
+        if missing_days:
+            # One remote query (and time budget) from the first to the last missing day, even if it covers days we
+            # already have, beats a round of remote queries for each gap
+            events, timed_out = Tools.existing_events_for_schedule(
+                schedule,
+                calendars,
+                subscriber,
+                google_client,
+                db,
+                redis,
+                start=datetime.combine(missing_days[0], datetime.min.time()),
+                end=datetime.combine(missing_days[-1] + timedelta(days=1), datetime.min.time()),
+            )
+
+            fetched = {day: [] for day in missing_days}
+            for event in events:
+                event_start, event_end = event.start.timestamp(), event.end.timestamp()
+                for day in availability.utc_days(event_start, event_end):
+                    if day in fetched:
+                        fetched[day].append((event_start, event_end))
+
+            busy_by_day.update(fetched)
+
+            # Don't store incomplete days
+            if timed_out:
+                unavailable_calendars.extend(timed_out)
+            else:
+                snapshot.put_days(fetched)
+
+        # Events spanning multiple days show up once per day
+        busy = {interval for day_busy in busy_by_day.values() for interval in day_busy}
+
+        starts, durations, booked = Tools.busy_roll_up_arrays(starts, durations, list(busy))
+        timezone = zoneinfo.ZoneInfo(schedule.calendar.owner.timezone)
+
+        return Tools.slots_from_arrays(starts, durations, booked, timezone), unavailable_calendars
 
     @staticmethod
     def dns_caldav_lookup(url, secure=True):
@@ -5,31 +5,56 @@ Handle outgoing emails.
 import datetime
 import logging
 import os
+import queue
 import smtplib
 import ssl
+import threading
+import time
 from email.message import EmailMessage
 
 import jinja2
 import sentry_sdk
 import validators
 
+from functools import cache
 from html import escape
 from fastapi.templating import Jinja2Templates
 
 from ..l10n import l10n
 
 
-def get_jinja():
+@cache
+def get_jinja() -> Jinja2Templates:
+    """Retrieves the process-wide email template environment. Templates are compiled once and kept in memory,
+    compiled bytecode is also cached on disk so other worker processes can skip the compile step."""
     path = 'src/appointment/templates/email'
 
-    templates = Jinja2Templates(path)
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(path),
+        autoescape=True,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        # Templates don't change while we're running, don't check the disk on every render
+        auto_reload=False,
+        # Keep every template around
+        cache_size=-1,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(),
+    )
     # Add our l10n function
-    templates.env.trim_blocks = True
-    templates.env.lstrip_blocks = True
-    templates.env.globals.update(l10n=l10n)
-    templates.env.globals.update(homepage_url=os.getenv('FRONTEND_URL'))
+    env.globals.update(l10n=l10n)
+    env.globals.update(homepage_url=os.getenv('FRONTEND_URL'))
 
-    return templates
+    return Jinja2Templates(env=env)
+
+
+def boot_templates():
+    """Load and compile every email template, and load the inline images ahead of the first email"""
+    env = get_jinja().env
+    for template_name in env.list_templates(extensions=['jinja2']):
+        env.get_template(template_name)
+
+    for path in STATIC_ATTACHMENTS:
+        get_static_attachment(path)
 
 
 def get_template(template_name) -> 'jinja2.Template':
@@ -38,6 +63,190 @@ def get_template(template_name) -> 'jinja2.Template':
     return templates.get_template(template_name)
 
 
+class SmtpPool:
+    """Keeps a bounded number of authenticated SMTP connections alive, so we don't have to pay for the connect,
+    TLS handshake and login on every email. Connections that sat idle for a while are checked with a NOOP before
+    they're reused, and a send that fails because the server hung up is retried once on a fresh connection."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        security: str = 'NONE',
+        user: str | None = None,
+        password: str | None = None,
+        size: int = 4,
+        max_idle: int = 30,
+        timeout: int = 30,
+    ):
+        self.host = host
+        self.port = port
+        self.security = security
+        self.user = user
+        self.password = password
+        self.size = size
+        self.max_idle = max_idle
+        self.timeout = timeout
+
+        # Idle connections as (server, last used), the most recently used one is handed out first
+        self._idle: queue.LifoQueue[tuple[smtplib.SMTP, float]] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def connect(self) -> smtplib.SMTP:
+        """Open and authenticate a new connection"""
+        timer_boot = time.perf_counter_ns()
+
+        # if configured, create a secure SSL context
+        if self.security == 'SSL':
+            server = smtplib.SMTP_SSL(
+                self.host, self.port, timeout=self.timeout, context=ssl.create_default_context()
+            )
+            server.login(self.user, self.password)
+        elif self.security == 'STARTTLS':
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            server.starttls(context=ssl.create_default_context())
+            server.login(self.user, self.password)
+        # fall back to non-secure
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+
+        sentry_sdk.set_measurement('smtp_connect_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
+
+        return server
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _checkout(self) -> smtplib.SMTP:
+        """Grab a live idle connection, or open a new one if there are none left"""
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+
+            if time.monotonic() - last_used < self.max_idle:
+                return server
+
+            # The server may have dropped us while we were idle, make sure it's still there
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(server)
+
+    def _checkin(self, server: smtplib.SMTP):
+        if self._closed:
+            self._discard(server)
+        else:
+            self._idle.put((server, time.monotonic()))
+
+    def send(self, message: EmailMessage, to_addrs=None) -> dict:
+        """Send one message over a pooled connection"""
+        result = self.send_batch([(message, to_addrs)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def send_batch(self, messages: list[tuple[EmailMessage, str | list[str] | None]]) -> list[dict | Exception]:
+        """Send a batch of (message, recipients) over a single session. A message the server refuses doesn't stop
+        the batch, its exception is returned in its place, otherwise the refused recipients of
+        smtplib.send_message are returned. Blocks while all connections are in use."""
+        results = []
+
+        self._slots.acquire()
+        server = None
+        try:
+            server = self._checkout()
+            for message, to_addrs in messages:
+                try:
+                    try:
+                        results.append(server.send_message(message, to_addrs=to_addrs))
+                    except smtplib.SMTPServerDisconnected:
+                        # Our kept alive connection went away from under us, retry once on a fresh one
+                        self._discard(server)
+                        server = None
+                        server = self.connect()
+                        results.append(server.send_message(message, to_addrs=to_addrs))
+                except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                    # The server refused this message, smtplib already reset the session so we can carry on
+                    results.append(e)
+        except BaseException:
+            # Anything else leaves the session in an unknown state
+            if server:
+                self._discard(server)
+                server = None
+            raise
+        finally:
+            if server:
+                self._checkin(server)
+            self._slots.release()
+
+        return results
+
+    def close(self):
+        """Quit all idle connections, connections in use are quit as they're returned"""
+        self._closed = True
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(server)
+
+
+_smtp_pool: SmtpPool | None = None
+_smtp_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SmtpPool:
+    """Retrieves the process-wide smtp connection pool, creating it from the SMTP_* env vars on first use"""
+    global _smtp_pool
+
+    if _smtp_pool is not None:
+        return _smtp_pool
+
+    with _smtp_pool_lock:
+        if _smtp_pool is None:
+            # get smtp configuration
+            smtp_url = os.getenv('SMTP_URL', 'localhost')
+            smtp_port = os.getenv('SMTP_PORT', 25)
+
+            # check config
+            url = f'http://{smtp_url}:{smtp_port}'
+            if not validators.url(url):
+                # url is not valid
+                logging.error('[mailer.get_smtp_pool] No valid SMTP url configured: ' + url)
+
+            _smtp_pool = SmtpPool(
+                host=smtp_url,
+                port=int(smtp_port),
+                security=os.getenv('SMTP_SECURITY', 'NONE'),
+                user=os.getenv('SMTP_USER'),
+                password=os.getenv('SMTP_PASS'),
+                size=int(os.getenv('SMTP_POOL_SIZE', 4)),
+                max_idle=int(os.getenv('SMTP_POOL_MAX_IDLE', 30)),
+            )
+
+    return _smtp_pool
+
+
+def close_smtp_pool():
+    """Quit all pooled smtp connections, the next email opens a fresh pool"""
+    global _smtp_pool
+
+    with _smtp_pool_lock:
+        if _smtp_pool is not None:
+            _smtp_pool.close()
+        _smtp_pool = None
+
+
 class Attachment:
     def __init__(self, mime: tuple[str,str], filename: str, data: str|bytes):
         self.mime_main = mime[0]
@@ -46,6 +255,31 @@ class Attachment:
         self.data = data
 
 
+class StaticAttachment(Attachment):
+    """An inline image that ships with the app. Its MIME part is built and base64 encoded once, and the very same part
+    is added to every email. Don't modify it!"""
+
+    def __init__(self, mime: tuple[str, str], filename: str, data: bytes):
+        super().__init__(mime, filename, data)
+        # Same as what EmailMessage.add_related would build
+        self.part = EmailMessage()
+        self.part.set_content(data, mime[0], mime[1], cid=f'<{filename}>')
+        self.part['Content-Disposition'] = 'inline'
+
+
+# Inline images used by the email templates, relative to the templates/assets/img folder
+STATIC_ATTACHMENTS = ['tbpro_logo.png', 'icons/calendar.png', 'icons/clock.png']
+
+
+@cache
+def get_static_attachment(path: str) -> StaticAttachment:
+    """Retrieves an image under the templates/assets/img folder, it's only read from disk the first time"""
+    with open(f'src/appointment/templates/assets/img/{path}', 'rb') as fh:
+        data = fh.read()
+
+    return StaticAttachment(mime=('image', 'png'), filename=os.path.basename(path), data=data)
+
+
 class Mailer:
     def __init__(
         self,
@@ -80,15 +314,8 @@ class Mailer:
 
     def _attachments(self):
         """provide all attachments as list, add tbpro logo to every mail"""
-        with open('src/appointment/templates/assets/img/tbpro_logo.png', 'rb') as fh:
-            tbpro_logo = fh.read()
-
         return [
-            Attachment(
-                mime=('image', 'png'),
-                filename='tbpro_logo.png',
-                data=tbpro_logo,
-            ),
+            get_static_attachment('tbpro_logo.png'),
             *self.attachments,
         ]
 
@@ -122,6 +349,12 @@ class Mailer:
                     'Content-Type',
                     f'{a.mime_main}/{a.mime_sub}; charset="UTF-8"; method={self.method}'
                 )
+            elif isinstance(a, StaticAttachment):
+                # Attach the ready-made part to the html payload
+                html_part = message.get_payload()[1]
+                if html_part.get_content_maintype() != 'multipart':
+                    html_part.make_related()
+                html_part.attach(a.part)
             else:
                 # Attach it to the html payload
                 message.get_payload()[1].add_related(
@@ -135,44 +368,39 @@ class Mailer:
 
     def send(self):
         """actually send the email"""
-        # get smtp configuration
-        SMTP_SECURITY = os.getenv('SMTP_SECURITY', 'NONE')
-        SMTP_URL = os.getenv('SMTP_URL', 'localhost')
-        SMTP_PORT = os.getenv('SMTP_PORT', 25)
-        SMTP_USER = os.getenv('SMTP_USER')
-        SMTP_PASS = os.getenv('SMTP_PASS')
-
-        # check config
-        url = f'http://{SMTP_URL}:{SMTP_PORT}'
-        if not validators.url(url):
-            # url is not valid
-            logging.error('[mailer.send] No valid SMTP url configured: ' + url)
-
-        server = None
         try:
-            # if configured, create a secure SSL context
-            if SMTP_SECURITY == 'SSL':
-                server = smtplib.SMTP_SSL(SMTP_URL, SMTP_PORT, context=ssl.create_default_context())
-                server.login(SMTP_USER, SMTP_PASS)
-            elif SMTP_SECURITY == 'STARTTLS':
-                server = smtplib.SMTP(SMTP_URL, SMTP_PORT)
-                server.starttls(context=ssl.create_default_context())
-                server.login(SMTP_USER, SMTP_PASS)
-            # fall back to non-secure
-            else:
-                server = smtplib.SMTP(SMTP_URL, SMTP_PORT)
-            # now send email
-            server.send_message(self.build(), to_addrs=self.to)
+            get_smtp_pool().send(self.build(), to_addrs=self.to)
         except Exception as e:
             # sending email was not possible
             logging.error('[mailer.send] An error occurred on sending email: ' + str(e))
             if os.getenv('SENTRY_DSN'):
                 sentry_sdk.capture_exception(e)
             raise e
-        finally:
-            if server:
-                server.quit()
 
+    @staticmethod
+    def send_batch(mails: list['Mailer']) -> list[Exception | None]:
+        """send a batch of emails over one smtp session, a failed email doesn't stop the rest of the batch.
+        Returns the exception of each failed email, or None if it went out."""
+        try:
+            results = get_smtp_pool().send_batch([(mail.build(), mail.to) for mail in mails])
+        except Exception as e:
+            # the batch couldn't be sent at all
+            logging.error('[mailer.send_batch] An error occurred on sending emails: ' + str(e))
+            if os.getenv('SENTRY_DSN'):
+                sentry_sdk.capture_exception(e)
+            return [e] * len(mails)
+
+        errors = []
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error('[mailer.send_batch] An error occurred on sending email: ' + str(result))
+                if os.getenv('SENTRY_DSN'):
+                    sentry_sdk.capture_exception(result)
+                errors.append(result)
+            else:
+                errors.append(None)
+
+        return errors
 
 class BaseBookingMail(Mailer):
     def __init__(self, name, email, date, duration, *args, **kwargs):
@@ -207,25 +435,10 @@ class BaseBookingMail(Mailer):
 
     def _attachments(self):
         """We need these little icons for the message body"""
-        path = 'src/appointment/templates/assets/img/icons'
-
-        with open(f'{path}/calendar.png', 'rb') as fh:
-            calendar_icon = fh.read()
-        with open(f'{path}/clock.png', 'rb') as fh:
-            clock_icon = fh.read()
-
         return [
             *super()._attachments(),
-            Attachment(
-                mime=('image', 'png'),
-                filename='calendar.png',
-                data=calendar_icon,
-            ),
-            Attachment(
-                mime=('image', 'png'),
-                filename='clock.png',
-                data=clock_icon,
-            ),
+            get_static_attachment('icons/calendar.png'),
+            get_static_attachment('icons/clock.png'),
         ]
 
 
@@ -0,0 +1,653 @@
+"""Module: mirror
+
+Keeps a copy of remote calendars in redis, so only what changed since the last look has to be transferred.
+
+CalDAV calendars are brought up to date with an RFC 6578 sync-collection report, or by comparing the CTag and ETags on
+servers that don't support it. Google calendars use the events api sync tokens, and can be told to refresh by push
+notifications.
+"""
+
+import json
+import logging
+import os
+import secrets
+import time
+import uuid
+from datetime import date, datetime, timedelta, UTC
+from xml.sax.saxutils import escape
+
+import caldav.lib.error
+import recurring_ical_events
+import sentry_sdk
+from caldav import DAVClient
+from googleapiclient.errors import HttpError
+from icalendar import Calendar
+from redis import Redis, RedisCluster
+
+from .. import utils
+from .apis.google_client import GoogleClient
+from ..database import schemas
+from ..defines import REDIS_GOOGLE_CHANNEL_KEY, DATEFMT
+from ..exceptions.google_api import GoogleSyncTokenExpired
+from ..l10n import l10n
+
+META_FIELD = 'meta'
+DIRTY_FIELD = 'dirty'
+
+# The fields of a google event we keep in its mirror
+STORED_EVENT_FIELDS = {'title', 'start', 'end', 'all_day', 'tentative', 'description'}
+
+# In seconds, how long before a push notification channel runs out we open a new one
+WATCH_RENEW_MARGIN = 86400
+
+# Number of calendar objects we ask for in a single calendar-multiget report
+MULTIGET_CHUNK_SIZE = 100
+
+# Object ranges are stored in utc, floating times may be off by up to this much
+FLOATING_SLACK = timedelta(days=1).total_seconds()
+
+SYNC_COLLECTION = """<?xml version="1.0" encoding="utf-8"?>
+<d:sync-collection xmlns:d="DAV:">
+  <d:sync-token>{token}</d:sync-token>
+  <d:sync-level>1</d:sync-level>
+  <d:prop><d:getetag/></d:prop>
+</d:sync-collection>"""
+
+CALENDAR_MULTIGET = """<?xml version="1.0" encoding="utf-8"?>
+<c:calendar-multiget xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav">
+  <d:prop><d:getetag/><c:calendar-data/></d:prop>
+  {hrefs}
+</c:calendar-multiget>"""
+
+PROPFIND_CTAG = """<?xml version="1.0" encoding="utf-8"?>
+<d:propfind xmlns:d="DAV:" xmlns:cs="http://calendarserver.org/ns/">
+  <d:prop><cs:getctag/></d:prop>
+</d:propfind>"""
+
+PROPFIND_ETAGS = """<?xml version="1.0" encoding="utf-8"?>
+<d:propfind xmlns:d="DAV:">
+  <d:prop><d:getetag/><d:resourcetype/></d:prop>
+</d:propfind>"""
+
+DAV = '{DAV:}'
+CALDAV = '{urn:ietf:params:xml:ns:caldav}'
+CALENDARSERVER = '{http://calendarserver.org/ns/}'
+
+
+class SyncMode:
+    # RFC 6578 sync-collection reports
+    SYNC_TOKEN = 'sync-token'
+    # CTag and ETag comparison, for servers without sync-collection support
+    ETAG = 'etag'
+
+
+def parse_multistatus(response) -> list[tuple[str, str | None, dict]]:
+    """Returns (href, status, {property tag: element}) for each response of a multistatus body.
+    The status is None when it's only given per property."""
+    results = []
+    if response.tree is None:
+        return results
+
+    for item in response.tree.iter(f'{DAV}response'):
+        href = item.findtext(f'{DAV}href')
+        status = item.findtext(f'{DAV}status')
+        props = {}
+        for propstat in item.iter(f'{DAV}propstat'):
+            if ' 200 ' not in (propstat.findtext(f'{DAV}status') or ''):
+                continue
+            for prop in propstat.iter(f'{DAV}prop'):
+                props.update({element.tag: element for element in prop})
+        results.append((href, status, props))
+    return results
+
+
+def object_range(ical: str) -> tuple[float | None, float | None]:
+    """Returns the utc (first start, last end) timestamps of a calendar object, the end is None if it recurs"""
+    starts = []
+    ends = []
+    for component in Calendar.from_ical(ical).walk('VEVENT'):
+        if 'dtstart' not in component:
+            continue
+
+        start = component.decoded('dtstart')
+        if 'dtend' in component:
+            end = component.decoded('dtend')
+        else:
+            end = start + component.decoded('duration', timedelta(0))
+
+        starts.append(as_timestamp(start))
+        # Recurring series don't have an end we'd want to work out here
+        if 'rrule' in component or 'rdate' in component:
+            ends.append(None)
+        else:
+            ends.append(as_timestamp(end))
+
+    if not starts:
+        return None, None
+    return min(starts), None if None in ends else max(ends)
+
+
+def as_timestamp(value: date | datetime) -> float:
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.timestamp()
+
+
+def to_events(ical: str, start: datetime, end: datetime) -> list[schemas.Event]:
+    """Expands a calendar object into the busy events that fall in the given range, skipping the same events as a
+    calendar search would"""
+    events = []
+    for component in recurring_ical_events.of(Calendar.from_ical(ical), components=['VEVENT']).between(start, end):
+        transparency = str(component.get('transp', 'opaque')).lower()
+        status = str(component.get('status', '')).lower()
+
+        # Ignore cancelled events
+        if status == 'cancelled' or transparency == 'transparent':
+            continue
+
+        # Ignore events with missing datetime data
+        if 'dtstart' not in component or ('dtend' not in component and 'duration' not in component):
+            continue
+
+        event_start = component.decoded('dtstart')
+        if 'dtend' in component:
+            event_end = component.decoded('dtend')
+        else:
+            event_end = event_start + component.decoded('duration')
+
+        events.append(
+            schemas.Event(
+                title=str(component['summary']) if 'summary' in component else l10n('event-summary-default'),
+                start=event_start,
+                end=event_end,
+                # if start doesn't hold time information (no datetime), it's a whole day
+                all_day=not isinstance(event_start, datetime),
+                tentative=status == 'tentative',
+                description=str(component.get('description', '')),
+            )
+        )
+    return events
+
+
+class CalDavMirror:
+    """A copy of a single CalDAV calendar, stored encrypted in a redis hash. Each calendar object is a field keyed by
+    its href holding its etag, calendar data and the time range it covers, the meta field holds how we sync."""
+
+    def __init__(
+        self,
+        redis_instance: Redis | RedisCluster,
+        client: DAVClient,
+        url: str,
+        key: str,
+        expiry=None,
+    ):
+        self.redis_instance = redis_instance
+        self.client = client
+        self.url = url
+        self.key = key
+        # Mirrors nobody reads from for this long go away
+        self.expiry = int(expiry or os.getenv('CALDAV_MIRROR_EXPIRE_SECONDS', 7 * 86400))
+
+    def get_meta(self) -> dict:
+        meta = self.redis_instance.hget(self.key, META_FIELD)
+        meta = json.loads(utils.decrypt(meta)) if meta else {}
+        # The calendar moved, so whatever we have belongs to another one
+        return meta if meta.get('url') == self.url else {}
+
+    def get_etags(self) -> dict[str, str]:
+        return {
+            href: json.loads(utils.decrypt(value))['etag']
+            for href, value in self.redis_instance.hgetall(self.key).items()
+            if href != META_FIELD
+        }
+
+    def refresh(self) -> int:
+        """Bring the mirror up to date, returns the number of calendar objects that were changed or removed"""
+        timer_boot = time.perf_counter_ns()
+
+        meta = self.get_meta()
+        reset = not meta
+        changed = None
+
+        if meta.get('mode', SyncMode.SYNC_TOKEN) == SyncMode.SYNC_TOKEN:
+            try:
+                changed, removed, token = self.sync_collection(meta.get('token'))
+            except caldav.lib.error.AuthorizationError:
+                # Some servers answer an expired sync token with a 403, which we can't tell apart from bad
+                # credentials without starting over.
+                if not meta.get('token'):
+                    raise
+                changed = None
+
+            if changed is None and meta.get('token'):
+                # The server forgot our sync token, start over
+                reset = True
+                changed, removed, token = self.sync_collection(None)
+
+            if changed is not None:
+                meta = {'url': self.url, 'mode': SyncMode.SYNC_TOKEN, 'token': token}
+
+        if changed is None:
+            logging.debug('[mirror.refresh] Server does not support sync-collection, comparing etags.')
+            changed, removed, ctag = self.compare_etags(None if reset else meta.get('ctag'), reset)
+            meta = {'url': self.url, 'mode': SyncMode.ETAG, 'ctag': ctag}
+
+        objects = self.multiget(changed) if changed else []
+        # Objects that are gone by the time we ask for them count as removed
+        removed = set(removed) | (set(changed) - {href for href, _, _ in objects})
+
+        pipeline = self.redis_instance.pipeline()
+        if reset:
+            pipeline.delete(self.key)
+        elif removed:
+            pipeline.hdel(self.key, *removed)
+
+        mapping = {
+            href: utils.encrypt(json.dumps({'etag': etag, 'ical': ical, 'range': object_range(ical)}))
+            for href, etag, ical in objects
+        }
+        mapping[META_FIELD] = utils.encrypt(json.dumps(meta))
+        pipeline.hset(self.key, mapping=mapping)
+        pipeline.expire(self.key, self.expiry)
+        pipeline.execute()
+
+        sentry_sdk.set_measurement('caldav_mirror_refresh_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
+
+        return len(objects) + len(removed)
+
+    def sync_collection(self, token: str | None) -> tuple[list[str] | None, list[str], str | None]:
+        """Ask for what changed since the sync token, or for everything without one.
+        Returns the changed hrefs, the removed hrefs and the new sync token. Changed is None if the report failed."""
+        changed = []
+        removed = []
+
+        while True:
+            response = self.client.report(self.url, SYNC_COLLECTION.format(token=escape(token or '')), depth=1)
+            if response.status >= 400 or response.tree is None:
+                return None, [], None
+
+            truncated = False
+            for href, status, props in parse_multistatus(response):
+                if status and ' 404 ' in status:
+                    removed.append(href)
+                elif status and ' 507 ' in status:
+                    # The server has more for us, ask again from the token it gave us
+                    truncated = True
+                elif f'{DAV}getetag' in props:
+                    changed.append(href)
+
+            token = response.tree.findtext(f'{DAV}sync-token')
+            if not truncated:
+                return changed, removed, token
+
+    def compare_etags(self, ctag: str | None, reset: bool) -> tuple[list[str], list[str], str | None]:
+        """Compare the calendar's etags against ours, skipped altogether if its ctag didn't change.
+        Returns the changed hrefs, the removed hrefs and the current ctag."""
+        response = self.client.propfind(self.url, PROPFIND_CTAG, depth=0)
+        current_ctag = None
+        for _, _, props in parse_multistatus(response):
+            if f'{CALENDARSERVER}getctag' in props:
+                current_ctag = props[f'{CALENDARSERVER}getctag'].text
+
+        if ctag and ctag == current_ctag:
+            return [], [], current_ctag
+
+        response = self.client.propfind(self.url, PROPFIND_ETAGS, depth=1)
+        etags = {}
+        for href, _, props in parse_multistatus(response):
+            resource_type = props.get(f'{DAV}resourcetype')
+            # Skip the calendar collection itself
+            if f'{DAV}getetag' not in props or (resource_type is not None and len(resource_type) > 0):
+                continue
+            etags[href] = props[f'{DAV}getetag'].text
+
+        known = {} if reset else self.get_etags()
+        changed = [href for href, etag in etags.items() if known.get(href) != etag]
+        removed = [href for href in known if href not in etags]
+        return changed, removed, current_ctag
+
+    def multiget(self, hrefs: list[str]) -> list[tuple[str, str, str]]:
+        """Retrieve the (href, etag, calendar data) of the given calendar objects"""
+        objects = []
+        for chunk in utils.chunk_list(hrefs, chunk_by=MULTIGET_CHUNK_SIZE):
+            body = CALENDAR_MULTIGET.format(hrefs=''.join(f'<d:href>{escape(href)}</d:href>' for href in chunk))
+            response = self.client.report(self.url, body, depth=1)
+            for href, _, props in parse_multistatus(response):
+                if f'{CALDAV}calendar-data' not in props:
+                    continue
+                etag = props[f'{DAV}getetag'].text if f'{DAV}getetag' in props else None
+                objects.append((href, etag, props[f'{CALDAV}calendar-data'].text))
+        return objects
+
+    def events(self, start: datetime, end: datetime) -> list[schemas.Event]:
+        """Retrieve the events in the given range from the mirror"""
+        timer_boot = time.perf_counter_ns()
+
+        range_start = as_timestamp(start) - FLOATING_SLACK
+        range_end = as_timestamp(end) + FLOATING_SLACK
+
+        events = []
+        for href, value in self.redis_instance.hgetall(self.key).items():
+            if href == META_FIELD:
+                continue
+
+            stored = json.loads(utils.decrypt(value))
+            first, last = stored['range']
+            # Skip anything that can't overlap without parsing it
+            if first is None or first >= range_end or (last is not None and last <= range_start):
+                continue
+
+            try:
+                events += to_events(stored['ical'], start, end)
+            except ValueError as ex:
+                logging.warning(f'[mirror.events] Skipping unreadable calendar object: {ex}')
+
+        sentry_sdk.set_measurement('caldav_mirror_read_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
+
+        return sorted(events, key=lambda event: as_timestamp(event.start))
+
+
+def google_event(item: dict) -> schemas.Event | None:
+    """Turns a Google Calendar event into one of ours, or None if it doesn't block any time"""
+    # If the event doesn't have transparency assume its opaque (and thus blocks time) by default.
+    transparency = item.get('transparency', 'opaque').lower()
+    status = item.get('status', '').lower()
+
+    # Ignore cancelled events or non-time blocking events
+    if status == 'cancelled' or transparency == 'transparent':
+        return None
+
+    # Grab the attendee list for marking tentative events / filtering out declined events
+    attendees = item.get('attendees') or []
+    declined = any((attendee.get('self') and attendee.get('responseStatus') == 'declined') for attendee in attendees)
+
+    # Don't show declined events
+    if declined:
+        return None
+
+    # Mark tentative events
+    tentative = any((attendee.get('self') and attendee.get('responseStatus') == 'tentative') for attendee in attendees)
+
+    all_day = 'date' in item.get('start')
+
+    start = (
+        datetime.strptime(item.get('start')['date'], DATEFMT)
+        if all_day
+        else datetime.fromisoformat(item.get('start')['dateTime'])
+    )
+    end = (
+        datetime.strptime(item.get('end')['date'], DATEFMT)
+        if all_day
+        else datetime.fromisoformat(item.get('end')['dateTime'])
+    )
+
+    return schemas.Event(
+        title=item.get('summary', 'Title not found!'),
+        start=start,
+        end=end,
+        all_day=all_day,
+        tentative=tentative,
+        description=item.get('description', ''),
+    )
+
+
+class GoogleMirror:
+    """A copy of a single Google calendar's time blocking events, stored encrypted in a redis hash. Each event is a
+    field keyed by its id, the meta field holds the sync token. Push notifications set the dirty field, telling us
+    to refresh on the next read, and so does busting the subscriber's cached events (see
+    BaseConnector.bust_cached_events). Only events that haven't ended yet, and start within the booking horizon, are
+    kept. The push notification channel is kept open by the renew-google-channels command, not on reads."""
+
+    # In seconds, how long a mirror we get push notifications for is trusted without asking Google
+    WATCHED_MAX_AGE = 3600
+
+    def __init__(
+        self,
+        redis_instance: Redis | RedisCluster,
+        google_client: GoogleClient,
+        google_token,
+        calendar_id: str,
+        key: str,
+        version_key: str | None = None,
+        version_fields: list[str] | None = None,
+        expiry=None,
+    ):
+        self.redis_instance = redis_instance
+        self.google_client = google_client
+        self.google_token = google_token
+        self.calendar_id = calendar_id
+        self.key = key
+        # Where the push notification channel is kept, apart from the mirror so starting over doesn't forget it
+        self.watch_key = f'{key}:watch'
+        # The cached events generation we're synced with, a bump means we need to refresh
+        self.version_key = version_key
+        self.version_fields = version_fields or []
+        # Mirrors nobody reads from for this long go away
+        self.expiry = int(expiry or os.getenv('GOOGLE_MIRROR_EXPIRE_SECONDS', 7 * 86400))
+        # In seconds, how long a mirror is trusted without asking Google what changed
+        self.max_age = int(os.getenv('GOOGLE_MIRROR_MAX_AGE', 60))
+        # In seconds, how often we start over to drop the events that ended since
+        self.resync_age = int(os.getenv('GOOGLE_MIRROR_RESYNC_AGE', 86400))
+        # In seconds, how far out we keep events, reads past that go to Google directly
+        self.horizon = int(os.getenv('GOOGLE_MIRROR_HORIZON_DAYS', 31)) * 86400
+        # Until when the mirror holds every event, as of the last refresh
+        self.synced_until = 0
+
+    def get_state(self) -> tuple[dict, bool, str, dict]:
+        """Returns the sync state, whether we were told the calendar changed, the current cached events generation,
+        and the push notification channel, in one round-trip"""
+        pipeline = self.redis_instance.pipeline()
+        pipeline.hmget(self.key, META_FIELD, DIRTY_FIELD)
+        pipeline.get(self.watch_key)
+        if self.version_key:
+            pipeline.hmget(self.version_key, *self.version_fields)
+        (meta, dirty), watch, *versions = pipeline.execute()
+
+        generation = '.'.join(version or '0' for version in versions[0]) if versions else ''
+        meta = json.loads(utils.decrypt(meta)) if meta else {}
+        # Another calendar ended up with this key, don't trust any of it
+        if meta.get('calendar_id') != self.calendar_id:
+            meta = {}
+        watch = json.loads(utils.decrypt(watch)) if watch else {}
+
+        return meta, dirty is not None or meta.get('generation', '') != generation, generation, watch
+
+    def get_meta(self) -> tuple[dict, bool]:
+        """Returns the sync state, and whether we were told the calendar changed"""
+        meta, dirty, _, _ = self.get_state()
+        return meta, dirty
+
+    def covers(self, end: date | datetime) -> bool:
+        """Whether the mirror held every event up to the given time at the last refresh"""
+        return as_timestamp(end) + FLOATING_SLACK <= self.synced_until
+
+    def refresh(self, force=False) -> int | None:
+        """Bring the mirror up to date if it's outdated, or always if forced.
+        Returns the number of events that were changed or removed, or None if the mirror was current enough."""
+        meta, dirty, generation, watch = self.get_state()
+
+        now = time.time()
+        max_age = self.WATCHED_MAX_AGE if watch.get('until', 0) > now else self.max_age
+        if not force and meta and not dirty and now - meta.get('t', 0) < max_age:
+            self.synced_until = meta.get('synced_until', 0)
+            return None
+
+        timer_boot = time.perf_counter_ns()
+
+        # Clear the flag before we ask, so a notification that arrives while we sync isn't lost
+        if dirty:
+            self.redis_instance.hdel(self.key, DIRTY_FIELD)
+
+        # Events that ended before this are of no use to us, all day events are stored in utc so they get some slack
+        history_start = now - FLOATING_SLACK
+        time_min = datetime.fromtimestamp(history_start, UTC).isoformat()
+        # Nobody can book further out than this, so we don't need to know about it
+        horizon_end = now + self.horizon
+        time_max = datetime.fromtimestamp(horizon_end, UTC).isoformat()
+
+        # Starting over every now and then drops the events that ended since, and moves the horizon along
+        reset = not meta.get('sync_token') or now - meta.get('synced_since', 0) > self.resync_age
+        try:
+            items, sync_token = self.google_client.sync_events(
+                self.calendar_id, None if reset else meta.get('sync_token'), self.google_token, time_min, time_max
+            )
+        except GoogleSyncTokenExpired:
+            # Google forgot our sync token, start over
+            reset = True
+            items, sync_token = self.google_client.sync_events(
+                self.calendar_id, None, self.google_token, time_min, time_max
+            )
+
+        # Changes aren't bounded by the range we first asked for, so keep the horizon we synced with until we start over
+        synced_until = horizon_end if reset else meta['synced_until']
+
+        mapping = {}
+        removed = []
+        for item in items:
+            event = google_event(item)
+            if event is None or as_timestamp(event.end) <= history_start or as_timestamp(event.start) >= synced_until:
+                removed.append(item['id'])
+                continue
+            mapping[item['id']] = utils.encrypt(json.dumps({
+                'event': event.model_dump(mode='json', include=STORED_EVENT_FIELDS),
+                'range': [as_timestamp(event.start), as_timestamp(event.end)],
+            }))
+
+        meta = {
+            'calendar_id': self.calendar_id,
+            'sync_token': sync_token,
+            'synced_since': now if reset else meta['synced_since'],
+            'synced_until': synced_until,
+            'generation': generation,
+            't': now,
+        }
+
+        pipeline = self.redis_instance.pipeline()
+        if reset:
+            pipeline.delete(self.key)
+        elif removed:
+            pipeline.hdel(self.key, *removed)
+        mapping[META_FIELD] = utils.encrypt(json.dumps(meta))
+        pipeline.hset(self.key, mapping=mapping)
+        pipeline.expire(self.key, self.expiry)
+        pipeline.execute()
+
+        sentry_sdk.set_measurement('google_mirror_refresh_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
+
+        self.synced_until = synced_until
+        return len(items)
+
+    def renew_watch(self) -> bool:
+        """Open a push notification channel for the mirror if it doesn't have one that stays open for a while, and stop
+        the one it replaces. Mirrors nobody reads from anymore lose their channel. Returns True if a channel was
+        opened."""
+        meta, _, _, watch = self.get_state()
+
+        if not meta:
+            self.unwatch(watch.get('channel'))
+            self.redis_instance.delete(self.watch_key)
+            return False
+
+        now = time.time()
+        if watch.get('until', 0) - WATCH_RENEW_MARGIN >= now:
+            return False
+
+        watched_until, channel = self.watch()
+        if not channel:
+            return False
+
+        # Don't keep getting notifications on the channel we're replacing
+        self.unwatch(watch.get('channel'))
+        self.redis_instance.set(
+            self.watch_key,
+            utils.encrypt(json.dumps({'until': watched_until, 'channel': channel})),
+            ex=max(1, int(watched_until - now)),
+        )
+        return True
+
+    def watch(self) -> tuple[float, list[str] | None]:
+        """Open a push notification channel for this calendar. Returns until when it's open and its [id, resource id],
+        or (0, None) if it couldn't be opened."""
+        channel_id = uuid.uuid4().hex
+        channel_token = secrets.token_urlsafe(32)
+        ttl = int(os.getenv('GOOGLE_WEBHOOK_TTL', 7 * 86400))
+
+        try:
+            channel = self.google_client.watch_events(
+                self.calendar_id, channel_id, os.getenv('GOOGLE_WEBHOOK_URL'), channel_token, ttl, self.google_token
+            )
+        except HttpError as e:
+            logging.warning(f'[mirror.watch] Could not watch calendar: {e.status_code}/{e.error_details}')
+            return 0, None
+
+        # Google hands back the expiration in milliseconds
+        watched_until = int(channel.get('expiration', (time.time() + ttl) * 1000)) / 1000
+        self.redis_instance.set(
+            f'{REDIS_GOOGLE_CHANNEL_KEY}:{channel_id}',
+            utils.encrypt(json.dumps({'key': self.key, 'token': channel_token})),
+            ex=max(1, int(watched_until - time.time())),
+        )
+        return watched_until, [channel_id, channel.get('resourceId')]
+
+    def unwatch(self, channel: list[str] | None):
+        """Stop a push notification channel opened by watch"""
+        if not channel:
+            return
+
+        channel_id, resource_id = channel
+        self.redis_instance.delete(f'{REDIS_GOOGLE_CHANNEL_KEY}:{channel_id}')
+        try:
+            self.google_client.stop_channel(channel_id, resource_id, self.google_token)
+        except HttpError as e:
+            # It runs out on its own eventually, and we don't know it anymore
+            logging.warning(f'[mirror.unwatch] Could not stop channel: {e.status_code}/{e.error_details}')
+
+    def events(self, start: datetime, end: datetime) -> list[schemas.Event]:
+        """Retrieve the events in the given range from the mirror"""
+        timer_boot = time.perf_counter_ns()
+
+        range_start = as_timestamp(start)
+        range_end = as_timestamp(end)
+
+        events = []
+        for event_id, value in self.redis_instance.hgetall(self.key).items():
+            if event_id in (META_FIELD, DIRTY_FIELD):
+                continue
+
+            stored = json.loads(utils.decrypt(value))
+            first, last = stored['range']
+            # All day events are stored in utc, but they're really in the calendar's timezone
+            slack = FLOATING_SLACK if stored['event']['all_day'] else 0
+            if first >= range_end + slack or last <= range_start - slack:
+                continue
+
+            events.append(schemas.Event(**stored['event']))
+
+        sentry_sdk.set_measurement('google_mirror_read_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
+
+        return sorted(events, key=lambda event: as_timestamp(event.start))
+
+
+def notify_google_channel(
+    redis_instance: Redis | RedisCluster | None, channel_id: str, channel_token: str, resource_state: str
+) -> bool:
+    """Handle a push notification from one of our channels by marking its mirror dirty.
+    Returns False if we don't know the channel or the token doesn't match."""
+    if redis_instance is None or not channel_id:
+        return False
+
+    channel = redis_instance.get(f'{REDIS_GOOGLE_CHANNEL_KEY}:{channel_id}')
+    if channel is None:
+        return False
+
+    channel = json.loads(utils.decrypt(channel))
+    if not channel_token or not secrets.compare_digest(channel['token'], channel_token):
+        return False
+
+    # Google says hello with a sync message when a channel opens, nothing changed yet
+    if resource_state != 'sync' and redis_instance.exists(channel['key']):
+        redis_instance.hset(channel['key'], DIRTY_FIELD, '1')
+
+    return True
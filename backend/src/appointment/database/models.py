@@ -6,15 +6,19 @@ Definitions of database tables and their relationships.
 import datetime
 import enum
 import hashlib
+import hmac
 import os
 import uuid
 import zoneinfo
 from functools import cached_property
 
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Enum, Boolean, JSON, Date, Time
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Enum, Boolean, JSON, Date, Time, event
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy_utils import StringEncryptedType, ChoiceType, UUIDType
 from sqlalchemy_utils.types.encrypted.encrypted_type import AesEngine
+from sqlalchemy_utils.types.encrypted.padding import InvalidPaddingError, PKCS5Padding
 from sqlalchemy.orm import relationship, as_declarative, declared_attr, Mapped
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql import func
 from appointment.defines import FALLBACK_LOCALE
 
@@ -103,11 +107,112 @@ def calculate_encrypted_length(length: int):
     return int((cipher_length + 2) / 3) << 2  # Base64 with padding
 
 
-def encrypted_type(column_type, length: int = 255, **kwargs) -> StringEncryptedType:
-    """Helper to reduce visual noise when creating model columns"""
-    return StringEncryptedType(
-        column_type, secret, AesEngine, 'pkcs5', length=calculate_encrypted_length(length), **kwargs
-    )
+class BytesPKCS5Padding(PKCS5Padding):
+    """PKCS5Padding that checks the padding bytes in one comparison instead of byte by byte."""
+
+    def unpad(self, value):
+        if not isinstance(value, bytes):
+            return super().unpad(value)
+        if not value or len(value) < self.block_size or len(value) % self.block_size != 0:
+            raise InvalidPaddingError()
+
+        padding_length = value[-1]
+        if padding_length == 0 or padding_length > self.block_size:
+            raise InvalidPaddingError()
+        if value[-padding_length:] != bytes((padding_length,)) * padding_length:
+            raise InvalidPaddingError()
+
+        return value[:-padding_length]
+
+
+class CachedKeyStringEncryptedType(StringEncryptedType):
+    """StringEncryptedType that only sets up its cipher again when the secret changes, instead of for every value."""
+
+    cache_ok = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if isinstance(getattr(self.engine, 'padding_engine', None), PKCS5Padding):
+            self.engine.padding_engine = BytesPKCS5Padding(self.engine.BLOCK_SIZE)
+
+    def _update_key(self):
+        key = self._key() if callable(self._key) else self._key
+        if key != getattr(self, '_current_key', None):
+            self.engine._update_key(key)
+            self._current_key = key
+
+    def process_result_value(self, value, dialect):
+        # Plain strings don't need any conversion after decryption
+        if value is not None and type(self.underlying_type) is String:
+            self._update_key()
+            return self.engine.decrypt(value)
+        return super().process_result_value(value, dialect)
+
+
+class EncryptedValue:
+    """A column value that has been loaded, but not decrypted yet. See decrypted_attribute."""
+
+    __slots__ = ('ciphertext', 'column_type', 'dialect')
+
+    def __init__(self, ciphertext: str, column_type: 'LazyStringEncryptedType', dialect):
+        self.ciphertext = ciphertext
+        self.column_type = column_type
+        self.dialect = dialect
+
+    def decrypt(self):
+        return CachedKeyStringEncryptedType.process_result_value(self.column_type, self.ciphertext, self.dialect)
+
+
+class LazyStringEncryptedType(CachedKeyStringEncryptedType):
+    """Loads values as EncryptedValue, they're only decrypted once they're accessed through a decrypted_attribute."""
+
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return EncryptedValue(value, self, dialect)
+
+
+def encrypted_type(column_type, length: int = 255, lazy=False, **kwargs) -> StringEncryptedType:
+    """Helper to reduce visual noise when creating model columns.
+    Lazy columns need to be mapped under a private name and exposed with decrypted_attribute."""
+    type_class = LazyStringEncryptedType if lazy else CachedKeyStringEncryptedType
+    return type_class(column_type, secret, AesEngine, 'pkcs5', length=calculate_encrypted_length(length), **kwargs)
+
+
+def decrypted_attribute(column_attribute: str) -> hybrid_property:
+    """Exposes a lazy encrypted column, the value is decrypted on first access and kept as the loaded value.
+    Queries can use it like the column itself."""
+
+    def fget(self):
+        value = getattr(self, column_attribute)
+        if isinstance(value, EncryptedValue):
+            value = value.decrypt()
+            # Swap in the decrypted value without marking the attribute as changed
+            set_committed_value(self, column_attribute, value)
+        return value
+
+    def fset(self, value):
+        setattr(self, column_attribute, value)
+
+    def expression(cls):
+        return getattr(cls, column_attribute)
+
+    return hybrid_property(fget, fset, expr=expression)
+
+
+def blind_index(value) -> str | None:
+    """Keyed hash of a value, lets us look up encrypted columns by equality without comparing ciphertexts."""
+    if value is None:
+        return None
+    key = hashlib.sha256(f'blind-index:{secret()}'.encode('utf-8')).digest()
+    return hmac.new(key, str(value).encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def blind_index_type() -> String:
+    """Helper for blind index columns, a hex encoded sha256 hmac"""
+    return String(64)
 
 
 @as_declarative()
@@ -129,6 +234,14 @@ class Base:
     time_updated = Column(DateTime, server_default=func.now(), default=func.now(), onupdate=func.now(), index=True)
 
 
+@event.listens_for(Base, 'before_insert', propagate=True)
+@event.listens_for(Base, 'before_update', propagate=True)
+def update_blind_indexes(mapper, connection, target):
+    """Keeps the blind index columns listed in a model's __blind_indexes__ in sync with their encrypted column"""
+    for index_column, column in getattr(target, '__blind_indexes__', {}).items():
+        setattr(target, index_column, blind_index(getattr(target, column)))
+
+
 class HasSoftDelete:
     """Mixing in a column to support deletion without removing the record"""
 
@@ -142,29 +255,48 @@ class HasSoftDelete:
 
 class Subscriber(HasSoftDelete, Base):
     __tablename__ = 'subscribers'
+    __blind_indexes__ = {'username_index': 'username', 'email_index': 'email'}
 
+    # Subscribers are loaded on every authenticated request, but most requests only need a few of their fields.
+    # So encrypted columns are mapped under a private name and only decrypted on first access.
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(encrypted_type(String), unique=True, index=True)
+    _username = Column('username', encrypted_type(String, lazy=True), unique=True, index=True)
+    username = decrypted_attribute('_username')
     # Encrypted (here) and hashed (by the associated hashing functions in routes/auth)
-    password = Column(encrypted_type(String), index=False)
+    _password = Column('password', encrypted_type(String, lazy=True), index=False)
+    password = decrypted_attribute('_password')
 
     # Use subscriber.preferred_email for any email, or other user-facing presence.
-    email = Column(encrypted_type(String), unique=True, index=True)
-    secondary_email = Column(encrypted_type(String), nullable=True, index=True)
+    _email = Column('email', encrypted_type(String, lazy=True), unique=True, index=True)
+    email = decrypted_attribute('_email')
+    _secondary_email = Column('secondary_email', encrypted_type(String, lazy=True), nullable=True, index=True)
+    secondary_email = decrypted_attribute('_secondary_email')
 
-    name = Column(encrypted_type(String), index=True)
+    # Blind indexes for username and email lookups
+    username_index = Column(blind_index_type(), index=True)
+    email_index = Column(blind_index_type(), index=True)
+
+    _name = Column('name', encrypted_type(String, lazy=True), index=True)
+    name = decrypted_attribute('_name')
     level = Column(Enum(SubscriberLevel), default=SubscriberLevel.basic, index=True)
-    avatar_url = Column(encrypted_type(String, length=2048), index=False)
-    short_link_hash = Column(encrypted_type(String), index=False)
+    _avatar_url = Column('avatar_url', encrypted_type(String, length=2048, lazy=True), index=False)
+    avatar_url = decrypted_attribute('_avatar_url')
+    _short_link_hash = Column('short_link_hash', encrypted_type(String, lazy=True), index=False)
+    short_link_hash = decrypted_attribute('_short_link_hash')
 
     # General settings
-    language = Column(encrypted_type(String), nullable=False, default=FALLBACK_LOCALE, index=True)
-    timezone = Column(encrypted_type(String), index=True)
+    _language = Column(
+        'language', encrypted_type(String, lazy=True), nullable=False, default=FALLBACK_LOCALE, index=True
+    )
+    language = decrypted_attribute('_language')
+    _timezone = Column('timezone', encrypted_type(String, lazy=True), index=True)
+    timezone = decrypted_attribute('_timezone')
     colour_scheme = Column(Enum(ColourScheme), default=ColourScheme.system, nullable=False, index=True)
     time_mode = Column(Enum(TimeMode), default=TimeMode.h12, nullable=False, index=True)
 
     # Only accept the times greater than the one specified in the `iat` claim of the jwt token
-    minimum_valid_iat_time = Column('minimum_valid_iat_time', encrypted_type(DateTime))
+    _minimum_valid_iat_time = Column('minimum_valid_iat_time', encrypted_type(DateTime, lazy=True))
+    minimum_valid_iat_time = decrypted_attribute('_minimum_valid_iat_time')
 
     ftue_level = Column(Integer, nullable=False, default=0, index=True)
 
@@ -221,6 +353,7 @@ class Subscriber(HasSoftDelete, Base):
 
 class Calendar(Base):
     __tablename__ = 'calendars'
+    __blind_indexes__ = {'url_index': 'url'}
 
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey('subscribers.id'))
@@ -228,6 +361,7 @@ class Calendar(Base):
     title = Column(encrypted_type(String), index=True)
     color = Column(encrypted_type(String, length=32), index=True)
     url = Column(encrypted_type(String, length=2048), index=False)
+    url_index = Column(blind_index_type(), index=True)
     user = Column(encrypted_type(String), index=True)
     password = Column(encrypted_type(String))
     connected = Column(Boolean, index=True, default=False)
@@ -339,12 +473,14 @@ class Schedule(Base):
     Date/DateTime we can safely ignore any unintended date matching.
     """
     __tablename__ = 'schedules'
+    __blind_indexes__ = {'slug_index': 'slug'}
 
     id: int = Column(Integer, primary_key=True, index=True)
     calendar_id: int = Column(Integer, ForeignKey('calendars.id'))
     active: bool = Column(Boolean, index=True, default=True)
     name: str = Column(encrypted_type(String), index=True)
     slug: str = Column(encrypted_type(String), index=True, unique=True)
+    slug_index: str = Column(blind_index_type(), index=True)
     location_type: LocationType = Column(Enum(LocationType), default=LocationType.inperson)
     location_url: str = Column(encrypted_type(String, length=2048))
     details: str = Column(encrypted_type(String))
@@ -427,12 +563,14 @@ class ExternalConnections(Base):
     """This table holds all external service connections to a subscriber."""
 
     __tablename__ = 'external_connections'
+    __blind_indexes__ = {'type_id_index': 'type_id'}
 
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey('subscribers.id'))
     name = Column(encrypted_type(String), index=False)
     type = Column(Enum(ExternalConnectionType), index=True)
     type_id = Column(encrypted_type(String), index=True)
+    type_id_index = Column(blind_index_type(), index=True)
     token = Column(encrypted_type(String, length=2048), index=False)
     owner: Mapped[Subscriber] = relationship('Subscriber', back_populates='external_connections')
 
@@ -444,11 +582,13 @@ class Invite(Base):
     """This table holds all invite codes for code based sign-ups."""
 
     __tablename__ = 'invites'
+    __blind_indexes__ = {'code_index': 'code'}
 
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey('subscribers.id'), nullable=True)
     subscriber_id = Column(Integer, ForeignKey('subscribers.id'))
     code = Column(encrypted_type(String), index=False)
+    code_index = Column(blind_index_type(), index=True)
     status = Column(Enum(InviteStatus), index=True)
 
     owner: Mapped['Subscriber'] = relationship(
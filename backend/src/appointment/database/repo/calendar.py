@@ -38,7 +38,7 @@ def is_connected(db: Session, calendar_id: int):
 
 def get_by_url(db: Session, url: str) -> models.Calendar|None:
     """retrieve calendar by calendar url"""
-    return db.query(models.Calendar).filter(models.Calendar.url == url).first()
+    return db.query(models.Calendar).filter(models.Calendar.url_index == models.blind_index(url)).first()
 
 
 def get_by_subscriber(db: Session, subscriber_id: int, include_unconnected: bool = True):
@@ -56,7 +56,7 @@ def get_by_type(
     )
 
     if type_id is not None:
-        query = query.filter(models.ExternalConnections.type_id == type_id)
+        query = query.filter(models.ExternalConnections.type_id_index == models.blind_index(type_id))
 
     result = query.all()
 
@@ -68,7 +68,7 @@ def get_subscriber_by_accounts_uuid(db: Session, uuid: str):
     query = (
         db.query(models.ExternalConnections)
         .filter(models.ExternalConnections.type == models.ExternalConnectionType.accounts)
-        .filter(models.ExternalConnections.type_id == uuid)
+        .filter(models.ExternalConnections.type_id_index == models.blind_index(uuid))
     )
 
     result = query.first()
@@ -84,7 +84,7 @@ def get_subscriber_by_fxa_uid(db: Session, type_id: str):
     query = (
         db.query(models.ExternalConnections)
         .filter(models.ExternalConnections.type == models.ExternalConnectionType.fxa)
-        .filter(models.ExternalConnections.type_id == type_id)
+        .filter(models.ExternalConnections.type_id_index == models.blind_index(type_id))
     )
 
     result = query.first()
@@ -100,7 +100,7 @@ def get_subscriber_by_zoom_user_id(db: Session, type_id: str):
     query = (
         db.query(models.ExternalConnections)
         .filter(models.ExternalConnections.type == models.ExternalConnectionType.zoom)
-        .filter(models.ExternalConnections.type_id == type_id)
+        .filter(models.ExternalConnections.type_id_index == models.blind_index(type_id))
     )
 
     result = query.first()
@@ -35,7 +35,7 @@ def get_by_owner(
 
 def get_by_code(db: Session, code: str) -> models.Invite:
     """retrieve invite by code"""
-    return db.query(models.Invite).filter(models.Invite.code == code).first()
+    return db.query(models.Invite).filter(models.Invite.code_index == models.blind_index(code)).first()
 
 
 def generate_codes(db: Session, n: int, owner_id: Optional[int] = None):
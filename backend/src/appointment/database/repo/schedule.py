@@ -31,7 +31,7 @@ def get_by_subscriber(db: Session, subscriber_id: int) -> list[models.Schedule]:
 def get_by_slug(db: Session, slug: str, subscriber_id: int) -> models.Schedule | None:
     """Get schedule by slug"""
     return (db.query(models.Schedule)
-            .filter(models.Schedule.slug == slug)
+            .filter(models.Schedule.slug_index == models.blind_index(slug))
             .join(models.Schedule.calendar)
             .filter(models.Calendar.owner_id == subscriber_id)
             .first())
@@ -6,10 +6,11 @@ Repository providing CRUD functions for subscriber database models.
 import datetime
 import secrets
 
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from .. import models, schemas
 from ... import utils
-from ...controller.auth import sign_url
+from ...controller.auth import sign_url, invalidate_cached_auth
 
 
 def get(db: Session, subscriber_id: int) -> models.Subscriber | None:
@@ -17,14 +18,27 @@ def get(db: Session, subscriber_id: int) -> models.Subscriber | None:
     return db.get(models.Subscriber, subscriber_id)
 
 
+def get_deferred(db: Session, subscriber_id: int) -> models.Subscriber:
+    """retrieve subscriber by id without querying the database, their columns are only loaded once they're used.
+    Only use this for subscribers that are known to exist."""
+    subscriber = db.identity_map.get(inspect(models.Subscriber).identity_key_from_primary_key((subscriber_id,)))
+    if subscriber is None:
+        subscriber = models.Subscriber(id=subscriber_id)
+        make_transient_to_detached(subscriber)
+        db.add(subscriber)
+    return subscriber
+
+
 def get_by_email(db: Session, email: str) -> models.Subscriber | None:
     """retrieve subscriber by email"""
-    return db.query(models.Subscriber).filter(models.Subscriber.email == email.lower()).first()
+    return (
+        db.query(models.Subscriber).filter(models.Subscriber.email_index == models.blind_index(email.lower())).first()
+    )
 
 
 def get_by_username(db: Session, username: str):
     """retrieve subscriber by username"""
-    return db.query(models.Subscriber).filter(models.Subscriber.username == username).first()
+    return db.query(models.Subscriber).filter(models.Subscriber.username_index == models.blind_index(username)).first()
 
 
 def get_by_appointment(db: Session, appointment_id: int):
@@ -90,6 +104,7 @@ def disable(db: Session, subscriber: models.Subscriber):
     subscriber.minimum_valid_iat_time = datetime.datetime.now(datetime.UTC)
     db.add(subscriber)
     db.commit()
+    invalidate_cached_auth(subscriber.id)
     db.refresh(subscriber)
     return subscriber
 
@@ -102,14 +117,17 @@ def enable(db: Session, subscriber: models.Subscriber):
     subscriber.minimum_valid_iat_time = datetime.datetime.now(datetime.UTC)
     db.add(subscriber)
     db.commit()
+    invalidate_cached_auth(subscriber.id)
     db.refresh(subscriber)
     return subscriber
 
 
 def hard_delete(db: Session, subscriber: models.Subscriber):
     """Delete a given subscriber by actually removing their record"""
+    subscriber_id = subscriber.id
     db.delete(subscriber)
     db.commit()
+    invalidate_cached_auth(subscriber_id)
     return True
 
 
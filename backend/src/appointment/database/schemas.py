@@ -32,13 +32,22 @@ from .models import (
 )
 from .. import utils, defines
 
+
+class FreeTextMarker:
+    """Marks a string field as free text written by a user. SanitizeMiddleware strips any html from these fields on the
+    way in, other fields are left alone."""
+
+
+FREE_TEXT = FreeTextMarker()
+FreeText = Annotated[str, FREE_TEXT]
+
 """ ATTENDEE model schemas
 """
 
 
 class AttendeeBase(BaseModel):
     email: str
-    name: str | None = None
+    name: FreeText | None = None
     timezone: str | None = None
 
 
@@ -92,8 +101,8 @@ class AvailabilitySlotAttendee(BaseModel):
 
 
 class AppointmentBase(BaseModel):
-    title: str
-    details: str | None = None
+    title: FreeText
+    details: FreeText | None = None
     slug: str | None = Field(default_factory=random_slug)
     # Needed for ical creation
     location_url: str | None = None
@@ -135,6 +144,8 @@ class AppointmentOut(AppointmentBase):
     slots: list[SlotBase | SlotOut] = []
     slot_duration: int
     booking_confirmation: bool
+    # Number of remote calendars that did not answer in time, their busy times are missing from slots
+    unavailable_calendars: int = 0
 
 
 """ SCHEDULE model schemas
@@ -162,12 +173,12 @@ class ScheduleBase(BaseModel):
     model_config = ConfigDict(json_encoders={time: lambda t: t.strftime('%H:%M')})
 
     active: bool | None = True
-    name: str = Field(min_length=1, max_length=128)
+    name: FreeText = Field(min_length=1, max_length=128)
     slug: Optional[str] = None
     calendar_id: int
     location_type: LocationType | None = LocationType.inperson
     location_url: Annotated[str | None, Field(max_length=2048)] = None
-    details: Annotated[str | None, Field(max_length=250)] = None
+    details: Annotated[FreeText | None, Field(max_length=250)] = None
     start_date: date | None = None
     end_date: date | None = None
     start_time: time | None = None
@@ -244,7 +255,7 @@ class ScheduleSlug(BaseModel):
 
 
 class CalendarBase(BaseModel):
-    title: str | None = None
+    title: FreeText | None = None
     color: str | None = DEFAULT_CALENDAR_COLOUR
     connected: bool | None = None
 
@@ -304,8 +315,8 @@ class InviteOut(BaseModel):
 
 class SubscriberIn(BaseModel):
     timezone: str | None = None
-    username: str = Field(min_length=1, max_length=128)
-    name: Optional[str] = Field(min_length=1, max_length=128, default=None)
+    username: FreeText = Field(min_length=1, max_length=128)
+    name: Optional[FreeText] = Field(min_length=1, max_length=128, default=None)
     avatar_url: str | None = None
     secondary_email: str | None = None
     language: str | None = FALLBACK_LOCALE
@@ -451,8 +462,8 @@ class ExternalConnectionOut(BaseModel):
 
 
 class SupportRequest(BaseModel):
-    topic: str
-    details: str
+    topic: FreeText
+    details: FreeText
 
 
 """Auth"""
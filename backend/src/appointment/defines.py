@@ -9,7 +9,22 @@ DATETIMEFMT = '%Y-%m-%dT%H:%M:%SZ'
 
 # list of redis keys
 REDIS_REMOTE_EVENTS_KEY = 'rmt_events'
+# Cache generations of a subscriber's remote events, a hash of calendar -> counter
+REDIS_REMOTE_EVENTS_VERSION_KEY = 'rmt_events_version'
+REDIS_AVAILABILITY_KEY = 'availability'
+REDIS_CALDAV_MIRROR_KEY = 'caldav_mirror'
+REDIS_GOOGLE_MIRROR_KEY = 'google_mirror'
+REDIS_GOOGLE_CHANNEL_KEY = 'google_channel'
+REDIS_RATE_LIMIT_KEY = 'rate_limit'
+# What we've checked of a subscriber's authentication, see controller.auth
+REDIS_AUTH_SUBSCRIBER_KEY = 'auth_subscriber'
+REDIS_AUTH_SESSION_KEY = 'auth_session'
 REDIS_USER_SESSION_PROFILE_KEY = ':1:tb_accounts_user_session'  # Used with shared redis cache
+# Job queue keys share a hash tag, so they live on the same node of a redis cluster
+REDIS_JOB_STREAM_KEY = '{jobs}:stream'
+REDIS_JOB_RETRY_KEY = '{jobs}:retry'
+REDIS_JOB_DEAD_KEY = '{jobs}:dead'
+REDIS_JOB_GROUP = 'workers'
 
 APP_ENV_DEV = 'dev'
 APP_ENV_TEST = 'test'
@@ -10,7 +10,10 @@ import jwt
 
 from sqlalchemy.orm import Session
 
+from redis import Redis, RedisCluster
+
 from .database import get_shared_redis
+from ..controller import auth
 from ..controller.apis.accounts_client import AccountsClient
 from ..database import repo, models
 from ..defines import AuthScheme, REDIS_USER_SESSION_PROFILE_KEY
@@ -21,11 +24,17 @@ from ..exceptions.validation import InvalidTokenException, InvalidPermissionLeve
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token', auto_error=False)
 
 
-def get_user_from_accounts_session(request, db):
+def get_user_from_accounts_session(request, db, redis_instance: Redis | RedisCluster | None = None):
     user_session_id = request.session.get('accounts_session')
     if not user_session_id:
         return None
 
+    # We've seen this session recently, so skip the trip to the shared redis and the database. The subscriber's
+    # entry is dropped when they're logged out, disabled or deleted, which sends us the long way around again.
+    subscriber_id = auth.get_cached_session(user_session_id, redis_instance)
+    if subscriber_id is not None and auth.get_cached_validity(subscriber_id, redis_instance) is not None:
+        return repo.subscriber.get_deferred(db, subscriber_id)
+
     shared_redis_cache = get_shared_redis()
     user_profile = shared_redis_cache.get(f'{REDIS_USER_SESSION_PROFILE_KEY}.{user_session_id}')
     if not user_profile:
@@ -34,10 +43,15 @@ def get_user_from_accounts_session(request, db):
     user_profile = json.loads(user_profile)
 
     # Look up the account data
-    return repo.external_connection.get_subscriber_by_accounts_uuid(db, user_profile.get('uuid'))
+    subscriber = repo.external_connection.get_subscriber_by_accounts_uuid(db, user_profile.get('uuid'))
+    if subscriber:
+        auth.put_cached_session(user_session_id, subscriber.id, redis_instance)
+        auth.put_cached_validity(subscriber, redis_instance)
+
+    return subscriber
 
 
-def get_user_from_token(db, token: str, require_jti=False):
+def get_user_from_token(db, token: str, require_jti=False, redis_instance: Redis | RedisCluster | None = None):
     try:
         payload = jwt.decode(token, os.getenv('JWT_SECRET'), algorithms=[os.getenv('JWT_ALGO')])
         sub = payload.get('sub')
@@ -48,32 +62,50 @@ def get_user_from_token(db, token: str, require_jti=False):
     except jwt.exceptions.InvalidTokenError:
         raise InvalidTokenException()
 
-    sub_id = sub.replace('uid-', '')
-    subscriber = repo.subscriber.get(db, int(sub_id))
+    sub_id = int(sub.replace('uid-', ''))
 
-    # Check this first as any doesn't short-circuit
-    if subscriber is None:
-        raise InvalidTokenException()
+    # One-time tokens change what's valid, so they're always checked against the database
+    validity = None if require_jti or jti else auth.get_cached_validity(sub_id, redis_instance)
+    if validity is None:
+        subscriber = repo.subscriber.get(db, sub_id)
+
+        # Check this first as any doesn't short-circuit
+        if subscriber is None:
+            raise InvalidTokenException()
+
+        minimum_valid_iat_time = subscriber.minimum_valid_iat_time
+        # We only need second resolution
+        validity = int(minimum_valid_iat_time.timestamp()) if minimum_valid_iat_time else None, subscriber.is_deleted
+    else:
+        subscriber = None
+
+    minimum_valid_iat, is_deleted = validity
 
     # Token has been expired by us - temp measure to avoid spinning a refresh system, or a deny list for this issue
     if any(
         [
-            subscriber.is_deleted,
-            subscriber.minimum_valid_iat_time and not iat,
-            # We only need second resolution
-            subscriber.minimum_valid_iat_time and int(subscriber.minimum_valid_iat_time.timestamp()) > int(iat),
+            is_deleted,
+            minimum_valid_iat and not iat,
+            minimum_valid_iat and minimum_valid_iat > int(iat),
             # If we require this token to be a one time token, then require the claim
             require_jti and not jti,
         ]
     ):
         raise InvalidTokenException()
 
+    if subscriber is None:
+        # The checks passed from cache, the subscriber's columns are loaded if and when the route needs them
+        subscriber = repo.subscriber.get_deferred(db, sub_id)
+    elif not jti:
+        auth.put_cached_validity(subscriber, redis_instance)
+
     # If we're a one-time token, set the minimum valid iat time to now!
     # Beats having to store them multiple times, and it's only used in post-login.
     if jti:
         subscriber.minimum_valid_iat_time = datetime.datetime.now(datetime.UTC)
         db.add(subscriber)
         db.commit()
+        auth.invalidate_cached_auth(subscriber.id, redis_instance=redis_instance)
 
     return subscriber
 
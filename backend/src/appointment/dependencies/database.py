@@ -4,27 +4,133 @@ import time
 from typing import Optional
 
 import sentry_sdk.metrics
-from redis import Redis, RedisCluster
+from redis import Redis, RedisCluster, ConnectionPool
+from redis.connection import Connection, SSLConnection
 from redis.backoff import ExponentialBackoff
 from redis.retry import Retry
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 
 _redis_instance: Optional[RedisCluster] = None
+_redis_pools: dict[int, ConnectionPool] = {}
+_engine: Optional[Engine] = None
+_session_local: Optional[sessionmaker] = None
 
 
-def get_engine_and_session():
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that keeps track of how often and how long callers had to wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ns = 0
+        self.max_wait_ns = 0
+
+    def _do_get(self):
+        timer_wait = time.perf_counter_ns()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter_ns() - timer_wait
+            self.checkouts += 1
+            self.total_wait_ns += wait
+            self.max_wait_ns = max(self.max_wait_ns, wait)
+            sentry_sdk.set_measurement('db_pool_wait_time', wait, 'nanosecond')
+
+
+def _env_flag(name: str, default=False) -> bool:
+    """Interpret an env variable as a boolean flag"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.lower() == 'true' or value == '1'
+
+
+def boot_database():
+    """Create the process-wide engine and its connection pool"""
+    global _engine, _session_local
+    if _engine is not None:
+        return _engine, _session_local
+
     database_url = os.getenv('DATABASE_URL')
     connect_args = {}
+    pool_args = {}
 
     if 'sqlite://' in database_url:
         connect_args = {'check_same_thread': False}
+    else:
+        pool_args = {
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': int(os.getenv('DATABASE_POOL_SIZE', 5)),
+            'max_overflow': int(os.getenv('DATABASE_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.getenv('DATABASE_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(os.getenv('DATABASE_POOL_RECYCLE', 3600)),
+            'pool_pre_ping': _env_flag('DATABASE_POOL_PRE_PING', default=True),
+        }
+
+    timer_boot = time.perf_counter_ns()
+
+    _engine = create_engine(database_url, connect_args=connect_args, **pool_args)
+    _session_local = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+
+    sentry_sdk.set_measurement('db_boot_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
+    logging.info('Created database engine')
+
+    return _engine, _session_local
+
+
+def close_database():
+    """Dispose of the process-wide engine and close any pooled connections"""
+    global _engine, _session_local
+    if _engine is None:
+        return None
 
-    engine = create_engine(database_url, connect_args=connect_args)
-    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    _engine.dispose()
+    _engine = None
+    _session_local = None
+    logging.info('Closed database connection pool')
 
-    return engine, session_local
+
+def get_engine_and_session():
+    """Retrieve the process-wide engine and session factory, booting them if needed"""
+    if _engine is None:
+        return boot_database()
+
+    return _engine, _session_local
+
+
+def get_database_pool_stats() -> dict | None:
+    """Returns connection pool statistics for the process-wide engine, or None if it hasn't been booted"""
+    if _engine is None:
+        return None
+
+    pool = _engine.pool
+    stats = {'status': pool.status()}
+
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            'checkouts': pool.checkouts,
+            'timeouts': pool.timeouts,
+            'total_wait_ns': pool.total_wait_ns,
+            'max_wait_ns': pool.max_wait_ns,
+        })
+
+    return stats
 
 
 def get_db():
@@ -47,12 +153,7 @@ def boot_redis_cluster():
     host = os.getenv('REDIS_URL')
     port = int(os.getenv('REDIS_PORT'))
     password = os.getenv('REDIS_PASSWORD')
-    ssl = (
-        True
-        if os.getenv('REDIS_USE_SSL')
-        and (os.getenv('REDIS_USE_SSL').lower() == 'true' or os.getenv('REDIS_USE_SSL').lower() == '1')
-        else False
-    )
+    ssl = _env_flag('REDIS_USE_SSL')
     timer_boot = time.perf_counter_ns()
 
     # Retry strategy
@@ -82,40 +183,81 @@ def close_redis_cluster():
     logging.info('Closed connection to redis cluster')
 
 
-def get_redis(db=None) -> Redis | RedisCluster | None:
-    """Retrieves a redis instance or None if redis isn't available."""
-    # TODO: Create pool and simply grab instance?
-    if os.getenv('REDIS_URL') is None:
-        return None
-
-    host = os.getenv('REDIS_URL')
-    port = int(os.getenv('REDIS_PORT'))
+def _get_redis_pool(db=None) -> ConnectionPool:
+    """Retrieve the connection pool for a logical redis db, creating it if it doesn't exist yet"""
     if db is None:
         db = os.getenv('REDIS_DB')
-    password = os.getenv('REDIS_PASSWORD')
-    ssl = (
-        True
-        if os.getenv('REDIS_USE_SSL')
-        and (os.getenv('REDIS_USE_SSL').lower() == 'true' or os.getenv('REDIS_USE_SSL').lower() == '1')
-        else False
-    )
+    db = int(db or 0)
 
-    timer_boot = time.perf_counter_ns()
+    pool = _redis_pools.get(db)
+    if pool is not None:
+        return pool
 
-    if os.getenv('REDIS_USE_CLUSTER'):
-        return _redis_instance
+    ssl = _env_flag('REDIS_USE_SSL')
+    max_connections = os.getenv('REDIS_MAX_CONNECTIONS')
 
-    redis = Redis(
-        host=host,
-        port=port,
+    timer_boot = time.perf_counter_ns()
+
+    pool = ConnectionPool(
+        connection_class=SSLConnection if ssl else Connection,
+        host=os.getenv('REDIS_URL'),
+        port=int(os.getenv('REDIS_PORT')),
         db=db,
-        password=password,
-        ssl=ssl,
+        password=os.getenv('REDIS_PASSWORD'),
         decode_responses=True,
+        max_connections=int(max_connections) if max_connections else None,
+        health_check_interval=int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30)),
     )
+    _redis_pools[db] = pool
 
     sentry_sdk.set_measurement('redis_boot_time', time.perf_counter_ns() - timer_boot, 'nanosecond')
-    return redis
+    return pool
+
+
+def boot_redis_pools():
+    """Create the connection pools for the app and shared redis dbs, only used for non-cluster deployments"""
+    if not os.getenv('REDIS_URL') or os.getenv('REDIS_USE_CLUSTER'):
+        return None
+
+    _get_redis_pool(os.getenv('REDIS_DB'))
+    _get_redis_pool(os.getenv('TB_ACCOUNTS_REDIS_DB'))
+    logging.info('Created redis connection pools')
+
+
+def close_redis_pools():
+    """Disconnect and drop all redis connection pools"""
+    if not _redis_pools:
+        return None
+
+    for pool in _redis_pools.values():
+        pool.disconnect()
+    _redis_pools.clear()
+    logging.info('Closed redis connection pools')
+
+
+def get_redis_pool_stats() -> dict[int, dict]:
+    """Returns connection statistics for each redis connection pool keyed by logical db"""
+    return {
+        db: {
+            'max_connections': pool.max_connections,
+            'created': pool._created_connections,
+            'available': len(pool._available_connections),
+            'in_use': len(pool._in_use_connections),
+        }
+        for db, pool in _redis_pools.items()
+    }
+
+
+def get_redis(db=None) -> Redis | RedisCluster | None:
+    """Retrieves a redis instance or None if redis isn't available."""
+    if not os.getenv('REDIS_URL'):
+        return None
+
+    if os.getenv('REDIS_USE_CLUSTER'):
+        return _redis_instance
+
+    # Clients are cheap, the connections are owned by the process-wide pool
+    return Redis(connection_pool=_get_redis_pool(db))
 
 
 def get_shared_redis() -> Redis | RedisCluster | None:
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import time
+
+from limits.storage import Storage, SlidingWindowCounterSupport
+from redis import Redis, RedisCluster
+from redis.exceptions import ConnectionError, NoScriptError, RedisError
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from .. import utils
+from ..defines import REDIS_RATE_LIMIT_KEY
+from .database import get_redis
+
+# Counts hits in a hash with a field per window, against the weighted count of the previous and current window.
+# Redis' clock is used so every process agrees on the window.
+# KEYS: the hash; ARGV: limit, expiry (seconds), amount
+ACQUIRE_SCRIPT = """
+-- Redis before 5 needs this to write after reading the clock
+redis.replicate_commands()
+local limit, expiry, amount = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local window = math.floor(now / expiry)
+local previous, current = tostring(window - 1), tostring(window)
+
+local counts = redis.call('HMGET', KEYS[1], previous, current)
+local weight = 1 - (now % expiry) / expiry
+if math.floor((tonumber(counts[1]) or 0) * weight + (tonumber(counts[2]) or 0)) + amount > limit then
+    return 0
+end
+
+redis.call('HINCRBY', KEYS[1], current, amount)
+for _, field in ipairs(redis.call('HKEYS', KEYS[1])) do
+    if field ~= previous and field ~= current then
+        redis.call('HDEL', KEYS[1], field)
+    end
+end
+redis.call('EXPIRE', KEYS[1], expiry * 2)
+return 1
+"""
+ACQUIRE_SCRIPT_SHA = hashlib.sha1(ACQUIRE_SCRIPT.encode()).hexdigest()
+
+# Returns the previous and current window's counts, and redis' clock (as a string, lua numbers are truncated)
+# KEYS: the hash; ARGV: expiry (seconds)
+WINDOW_SCRIPT = """
+local expiry = tonumber(ARGV[1])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local window = math.floor(now / expiry)
+local counts = redis.call('HMGET', KEYS[1], tostring(window - 1), tostring(window))
+return {tonumber(counts[1]) or 0, tonumber(counts[2]) or 0, tostring(now)}
+"""
+WINDOW_SCRIPT_SHA = hashlib.sha1(WINDOW_SCRIPT.encode()).hexdigest()
+
+
+class RedisSlidingWindowStorage(Storage, SlidingWindowCounterSupport):
+    """Rate limit storage on our own redis connection (see dependencies.database), so limits are shared between
+    workers and pods. Only the sliding window counter strategy is supported, each check is one script call."""
+
+    STORAGE_SCHEME = ['appointment-redis']
+
+    @property
+    def base_exceptions(self) -> type[Exception] | tuple[type[Exception], ...]:
+        return RedisError
+
+    @property
+    def redis(self) -> Redis | RedisCluster:
+        redis_instance = get_redis()
+        if redis_instance is None:
+            raise ConnectionError('Redis is not available')
+        return redis_instance
+
+    @staticmethod
+    def get_key(key: str) -> str:
+        # Limiter keys contain the client's ip address
+        return f'{REDIS_RATE_LIMIT_KEY}:{utils.obscure_key(key)}'
+
+    def run_script(self, script: str, sha: str, key: str, *args):
+        """Run a script by its hash, and only send it over if redis doesn't know about it yet"""
+        redis_instance = self.redis
+        try:
+            return redis_instance.evalsha(sha, 1, self.get_key(key), *args)
+        except NoScriptError:
+            return redis_instance.eval(script, 1, self.get_key(key), *args)
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        return bool(self.run_script(ACQUIRE_SCRIPT, ACQUIRE_SCRIPT_SHA, key, limit, expiry, amount))
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        previous_count, current_count, now = self.run_script(WINDOW_SCRIPT, WINDOW_SCRIPT_SHA, key, expiry)
+        now = float(now)
+
+        # Time until the previous and current window no longer count
+        previous_ttl = (1 - (now / expiry) % 1) * expiry if previous_count else 0.0
+        current_ttl = (1 - (now / expiry) % 1) * expiry + expiry
+        return int(previous_count), previous_ttl, int(current_count), current_ttl
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        self.clear(key)
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        pipeline = self.redis.pipeline()
+        pipeline.set(self.get_key(key), 0, ex=expiry, nx=True)
+        pipeline.incrby(self.get_key(key), amount)
+        return pipeline.execute()[1]
+
+    def get(self, key: str) -> int:
+        return int(self.redis.get(self.get_key(key)) or 0)
+
+    def get_expiry(self, key: str) -> float:
+        return time.time() + max(self.redis.ttl(self.get_key(key)), 0)
+
+    def check(self) -> bool:
+        try:
+            return bool(self.redis.ping())
+        except RedisError:
+            return False
+
+    def reset(self) -> int | None:
+        redis_instance = self.redis
+        keys = list(redis_instance.scan_iter(match=f'{REDIS_RATE_LIMIT_KEY}:*'))
+        return redis_instance.delete(*keys) if keys else 0
+
+    def clear(self, key: str) -> None:
+        self.redis.delete(self.get_key(key))
+
+
+def get_limiter() -> Limiter:
+    """Creates the limiter shared by all rate limited routes. Counts are kept in redis when it's configured,
+    and in memory (per process) while it's down or if it isn't."""
+    return Limiter(
+        key_func=get_remote_address,
+        strategy='sliding-window-counter',
+        storage_uri='appointment-redis://' if os.getenv('REDIS_URL') else 'memory://',
+        in_memory_fallback_enabled=True,
+    )
+
+
+limiter = get_limiter()
@@ -14,6 +14,12 @@ class GoogleInvalidCredentials(Exception):
     pass
 
 
+class GoogleSyncTokenExpired(Exception):
+    """Raise when Google API no longer accepts a sync token, a full sync is needed to get a new one."""
+
+    pass
+
+
 class APIGoogleRefreshError(APIException):
     """Raise when you need to signal to the end-user that they need to re-connect to Google."""
 
@@ -1,6 +1,9 @@
+from contextlib import contextmanager
 from typing import Union, Dict, Any
 
-from starlette_context import context, errors
+from starlette_context import context, errors, request_cycle_context
+
+from .defines import FALLBACK_LOCALE
 from .middleware.l10n import get_fluent
 
 
@@ -20,3 +23,20 @@ def l10n(msg_id: str, args: Union[Dict[str, Any], None] = None, lang: str = None
         return msg_id
 
     return context['l10n'](msg_id, args)
+
+
+def get_locales() -> list[str] | None:
+    """Returns the locales of the current request, or None if we're not in one"""
+    try:
+        fluent = context.get('l10n')
+    except errors.ContextDoesNotExistError:
+        return None
+
+    return getattr(fluent, 'locales', None)
+
+
+@contextmanager
+def l10n_context(locales: list[str] | None):
+    """Provides l10n with the given locales (or our fallback locale) outside of a request, like in the job worker"""
+    with request_cycle_context({'l10n': get_fluent(locales or [FALLBACK_LOCALE])}):
+        yield
@@ -4,6 +4,7 @@ Boot application, init database, authenticate user and provide all API endpoints
 
 """
 
+import re
 from contextlib import asynccontextmanager
 from urllib.parse import urlparse
 
@@ -16,8 +17,17 @@ from starlette_csrf import CSRFMiddleware
 
 from .defines import APP_ENV_DEV, APP_ENV_TEST, APP_ENV_STAGE, APP_ENV_PROD, AuthScheme
 from .exceptions.validation import APIRateLimitExceeded
-from .dependencies.database import boot_redis_cluster, close_redis_cluster
-from .middleware.l10n import L10n
+from .dependencies.database import (
+    boot_database,
+    close_database,
+    boot_redis_cluster,
+    close_redis_cluster,
+    boot_redis_pools,
+    close_redis_pools,
+)
+from .middleware.l10n import L10n, boot_l10n
+from .controller.mailer import boot_templates, close_smtp_pool
+from .controller.calendar import close_dav_clients
 from .middleware.SanitizeMiddleware import SanitizeMiddleware
 
 from google.auth.exceptions import RefreshError, DefaultCredentialsError
@@ -144,10 +154,19 @@ def server():
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        # Boot the redis cluster as the app starts up
+        # Boot the database connection pool and the redis cluster (or single-node pools) as the app starts up
+        boot_database()
         boot_redis_cluster()
+        boot_redis_pools()
+        # Parse our localization files and compile our email templates now instead of on the first requests
+        boot_l10n()
+        boot_templates()
         yield
+        close_dav_clients()
+        close_smtp_pool()
+        close_redis_pools()
         close_redis_cluster()
+        close_database()
 
     # init app
     app = FastAPI(openapi_url=openapi_url, lifespan=lifespan)
@@ -198,6 +217,8 @@ def server():
             cookie_domain=cookie_domain,
             cookie_secure=cookie_secure,
             header_name='X-CSRFToken',
+            # Google's push notifications can't know about our csrf token
+            exempt_urls=[re.compile(r'.*/webhooks/google-calendar$')],
         )
 
     # allow requests from own frontend running on a different port
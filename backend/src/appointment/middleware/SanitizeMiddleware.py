@@ -1,10 +1,99 @@
-import json
+import types
+import typing
+
 import nh3
-from starlette.types import ASGIApp, Scope, Receive, Send
-from ..utils import is_json
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from pydantic_core import from_json, to_json
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Scope, Receive, Send
+
+from ..database.schemas import FREE_TEXT
+
+# A tree of the body keys that lead to free text, True marks a free text leaf
+FreeTextTree = dict[str, typing.Union['FreeTextTree', bool]]
+
+
+def _free_text_tree_of_type(annotation, seen: frozenset) -> FreeTextTree | bool | None:
+    """Walks a type annotation and returns True if it's free text, a tree for models containing free text, or None"""
+    origin = typing.get_origin(annotation)
+
+    if origin is typing.Annotated:
+        base, *metadata = typing.get_args(annotation)
+        if any(item is FREE_TEXT for item in metadata):
+            return True
+        return _free_text_tree_of_type(base, seen)
+
+    if origin in (typing.Union, types.UnionType, list, set, tuple):
+        # Lists are walked transparently, so the tree only has to know about keys
+        trees = [_free_text_tree_of_type(arg, seen) for arg in typing.get_args(annotation)]
+        if True in trees:
+            return True
+        merged = {}
+        for tree in trees:
+            if tree:
+                merged.update(tree)
+        return merged or None
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return free_text_tree_of_model(annotation, seen) or None
+
+    return None
+
+
+def free_text_tree_of_model(model: type[BaseModel], seen: frozenset = frozenset()) -> FreeTextTree:
+    """Retrieves the free text fields of a pydantic model, keyed by their alias"""
+    if model in seen:
+        return {}
+    seen = seen | {model}
+
+    tree = {}
+    for name, field in model.model_fields.items():
+        if any(item is FREE_TEXT for item in field.metadata):
+            subtree = True
+        else:
+            subtree = _free_text_tree_of_type(field.annotation, seen)
+        if subtree:
+            tree[field.alias or name] = subtree
+    return tree
+
+
+# Routes aren't hashable, so they're cached by id alongside the route itself
+_route_trees: dict[int, tuple[APIRoute, FreeTextTree | bool | None]] = {}
+
+
+def free_text_tree_of_route(route: APIRoute) -> FreeTextTree | bool | None:
+    """Retrieves the free text fields of a route's request body, it's only worked out once per route"""
+    cached = _route_trees.get(id(route))
+    if cached and cached[0] is route:
+        return cached[1]
+
+    tree = _free_text_tree_of_body(route)
+    _route_trees[id(route)] = (route, tree)
+    return tree
+
+
+def _free_text_tree_of_body(route: APIRoute) -> FreeTextTree | bool | None:
+    body_params = route.dependant.body_params
+    if not body_params:
+        return None
+
+    # A single body parameter is the body itself, unless it's explicitly embedded
+    if len(body_params) == 1 and not getattr(body_params[0].field_info, 'embed', False):
+        return _free_text_tree_of_type(body_params[0].field_info.annotation, frozenset())
+
+    tree = {}
+    for param in body_params:
+        subtree = _free_text_tree_of_type(param.field_info.annotation, frozenset())
+        if subtree:
+            tree[param.alias] = subtree
+    return tree or None
 
 
 class SanitizeMiddleware:
+    """Strips html from the free text fields of json request bodies. Which fields are free text is looked up from the
+    pydantic schema of the route the request is headed to, requests to routes without any are passed through as is."""
+
     def __init__(self, app: ASGIApp) -> None:
         self.app = app
 
@@ -13,38 +102,80 @@ class SanitizeMiddleware:
         return nh3.clean(value, tags={''}) if isinstance(value, str) else value
 
     @staticmethod
-    def sanitize_dict(dict_value: str) -> str:
-        return {key: __class__.sanitize_str(value) for key, value in dict_value.items()}
+    def sanitize(value, tree: FreeTextTree | bool) -> tuple[typing.Any, bool]:
+        """Sanitize the free text in a parsed json value in place. Returns the value, and whether anything changed."""
+        if isinstance(value, list):
+            changed = False
+            for index, item in enumerate(value):
+                value[index], item_changed = __class__.sanitize(item, tree)
+                changed = changed or item_changed
+            return value, changed
+
+        if tree is True:
+            sanitized = __class__.sanitize_str(value)
+            return sanitized, sanitized != value
+
+        if isinstance(value, dict):
+            changed = False
+            for key, subtree in tree.items():
+                if key in value:
+                    value[key], item_changed = __class__.sanitize(value[key], subtree)
+                    changed = changed or item_changed
+            return value, changed
+
+        return value, False
 
     @staticmethod
-    def sanitize_list(list_values: list) -> list:
-        for index, value in enumerate(list_values):
-            if isinstance(value, dict):
-                list_values[index] = {key: __class__.sanitize_str(value) for key, value in value.items()}
-            else:
-                list_values[index] = __class__.sanitize_str(value)
-        return list_values
+    def sanitize_body(body: bytes, tree: FreeTextTree | bool) -> bytes:
+        """Sanitize a json body, untouched or non-json bodies are returned as they are"""
+        try:
+            json_body = from_json(body)
+        except ValueError:
+            return body
+
+        json_body, changed = __class__.sanitize(json_body, tree)
+        return to_json(json_body) if changed else body
+
+    @staticmethod
+    def free_text_tree(scope: Scope) -> FreeTextTree | bool | None:
+        router = getattr(scope.get('app'), 'router', None)
+        if router is None:
+            return None
+
+        for route in router.routes:
+            if isinstance(route, APIRoute) and route.matches(scope)[0] == Match.FULL:
+                return free_text_tree_of_route(route)
+        return None
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        if 'method' not in scope or scope['method'] in ('GET', 'HEAD', 'OPTIONS'):
+        if scope['type'] != 'http' or scope['method'] in ('GET', 'HEAD', 'OPTIONS'):
+            return await self.app(scope, receive, send)
+
+        tree = self.free_text_tree(scope)
+        if not tree:
             return await self.app(scope, receive, send)
 
-        async def sanitize_request_body():
+        # Buffer the whole body, it may arrive in more than one chunk
+        chunks = []
+        pending: list[Message] = []
+        while True:
             message = await receive()
-            body = message.get('body')
-            if not body or not isinstance(body, bytes):
-                return message
-            if is_json(body):
-                json_body = json.loads(body)
-                for key, value in json_body.items():
-                    if isinstance(value, dict):
-                        json_body[key] = __class__.sanitize_dict(value)
-                    elif isinstance(value, list):
-                        json_body[key] = __class__.sanitize_list(value)
-                    else:
-                        json_body[key] = __class__.sanitize_str(value)
-                message['body'] = bytes(json.dumps(json_body), encoding='utf-8')
-
-            return message
-
-        return await self.app(scope, sanitize_request_body, send)
+            if message['type'] != 'http.request':
+                # Client went away, let the app find out
+                pending.append(message)
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+
+        body = b''.join(chunks)
+        if body:
+            body = self.sanitize_body(body, tree)
+        pending.insert(0, {'type': 'http.request', 'body': body, 'more_body': False})
+
+        async def receive_sanitized() -> Message:
+            if pending:
+                return pending.pop(0)
+            return await receive()
+
+        return await self.app(scope, receive_sanitized, send)
@@ -1,23 +1,83 @@
+import threading
+from functools import cache, lru_cache
+
 from starlette_context.plugins import Plugin
 from fastapi import Request
 from fluent.runtime import FluentLocalization, FluentResourceLoader
 
 from ..defines import SUPPORTED_LOCALES, FALLBACK_LOCALE
 
+FLUENT_RESOURCES = ['main.ftl', 'email.ftl', 'fields.ftl']
+
+
+class CachedFluentResourceLoader(FluentResourceLoader):
+    """FluentResourceLoader that reads and parses each locale's resources only once per process"""
+
+    def __init__(self, roots):
+        super().__init__(roots)
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def resources(self, locale, resource_ids):
+        key = (locale, tuple(resource_ids))
+        with self._lock:
+            if key not in self._resources:
+                self._resources[key] = list(super().resources(locale, resource_ids))
+        yield from self._resources[key]
+
+
+@cache
+def get_resource_loader() -> CachedFluentResourceLoader:
+    base_url = 'src/appointment/l10n'
+    return CachedFluentResourceLoader(f'{base_url}/{{locale}}')
+
+
+@lru_cache(maxsize=64)
+def get_localization(locales: tuple[str, ...]) -> FluentLocalization:
+    """Retrieve the (shared) localization for a locale chain"""
+    fluent = FluentLocalization(list(locales), FLUENT_RESOURCES, get_resource_loader())
+
+    # Formatting an unknown message builds every bundle of the chain. Fluent builds them lazily with a generator,
+    # which can't be shared between threads, so we're done with that before anyone else gets a hold of it.
+    fluent.format_value('')
+
+    return fluent
+
 
 def get_fluent(locales: list[str]):
     """Provides fluent's format_value function for given locales"""
 
     # Make sure our fallback locale is always in locales
     if FALLBACK_LOCALE not in locales:
-        locales.append(FALLBACK_LOCALE)
+        locales = [*locales, FALLBACK_LOCALE]
 
-    base_url = 'src/appointment/l10n'
+    return get_localization(tuple(locales)).format_value
+
+
+def boot_l10n():
+    """Parse our resources and build the localizations for each supported locale ahead of the first request"""
+    for locale in SUPPORTED_LOCALES:
+        get_fluent([locale])
+
+
+class LazyFluent:
+    """Stands in for fluent's format_value function, only resolves the localization once it's actually called"""
+
+    __slots__ = ('plugin', 'accept_languages', 'format_value')
+
+    def __init__(self, plugin: 'L10n', accept_languages: str):
+        self.plugin = plugin
+        self.accept_languages = accept_languages
+        self.format_value = None
 
-    loader = FluentResourceLoader(f'{base_url}/{{locale}}')
-    fluent = FluentLocalization(locales, ['main.ftl', 'email.ftl', 'fields.ftl'], loader)
+    @property
+    def locales(self) -> list[str]:
+        return self.plugin.parse_accept_language(self.accept_languages)
 
-    return fluent.format_value
+    def __call__(self, msg_id, args=None):
+        if self.format_value is None:
+            self.format_value = self.plugin.get_fluent_with_header(self.accept_languages)
+        return self.format_value(msg_id, args)
 
 
 class L10n(Plugin):
@@ -53,4 +113,4 @@ class L10n(Plugin):
 
 
     async def process_request(self, request: Request):
-        return self.get_fluent_with_header(request.headers.get('accept-language', FALLBACK_LOCALE))
+        return LazyFluent(self, request.headers.get('accept-language', FALLBACK_LOCALE))
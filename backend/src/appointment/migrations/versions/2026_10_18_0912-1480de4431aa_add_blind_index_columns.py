@@ -0,0 +1,98 @@
+"""add blind index columns
+
+Revision ID: 1480de4431aa
+Revises: a3fc3cc13f56
+Create Date: 2026-10-18 09:12:41.204518
+
+"""
+import hashlib
+import hmac
+import os
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils import StringEncryptedType
+from sqlalchemy_utils.types.encrypted.encrypted_type import AesEngine
+
+
+def secret():
+    return os.getenv('DB_SECRET')
+
+
+# revision identifiers, used by Alembic.
+revision = '1480de4431aa'
+down_revision = 'a3fc3cc13f56'
+branch_labels = None
+depends_on = None
+
+
+# table -> blind index column -> encrypted column
+blind_indexes = {
+    'subscribers': {'username_index': 'username', 'email_index': 'email'},
+    'calendars': {'url_index': 'url'},
+    'schedules': {'slug_index': 'slug'},
+    'external_connections': {'type_id_index': 'type_id'},
+    'invites': {'code_index': 'code'},
+}
+
+
+def blind_index(value) -> str | None:
+    """Same as models.blind_index, but frozen as of this migration"""
+    if value is None:
+        return None
+    key = hashlib.sha256(f'blind-index:{secret()}'.encode('utf-8')).digest()
+    return hmac.new(key, str(value).encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def backfill(connection, batch_size: int = 500):
+    """Fill in the blind index columns of every existing row, one batch of rows at a time"""
+    encrypted_type = StringEncryptedType(sa.String, secret, AesEngine, 'pkcs5')
+    for table_name, columns in blind_indexes.items():
+        table = sa.table(
+            table_name,
+            sa.column('id', sa.Integer),
+            *[sa.column(column, encrypted_type) for column in columns.values()],
+            *[sa.column(index_column, sa.String) for index_column in columns],
+        )
+        update = (
+            sa.update(table)
+            .where(table.c.id == sa.bindparam('row_id'))
+            .values({index_column: sa.bindparam(f'new_{index_column}') for index_column in columns})
+        )
+
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                sa.select(table.c.id, *[table.c[column] for column in columns.values()])
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if len(rows) == 0:
+                break
+
+            connection.execute(update, [
+                {
+                    'row_id': row.id,
+                    **{f'new_{index}': blind_index(row._mapping[column]) for index, column in columns.items()},
+                }
+                for row in rows
+            ])
+            last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    for table, columns in blind_indexes.items():
+        for column in columns:
+            op.add_column(table, sa.Column(column, sa.String(64), nullable=True))
+            op.create_index(f'ix_{table}_{column}', table, [column])
+
+    # Lookups go through the blind indexes from now on, so fill them in right away
+    backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    for table, columns in blind_indexes.items():
+        for column in columns:
+            op.drop_index(f'ix_{table}_{column}', table)
+            op.drop_column(table, column)
@@ -22,11 +22,12 @@ from ..database.models import Subscriber, CalendarProvider, InviteStatus
 from ..defines import DEFAULT_CALENDAR_COLOUR
 from ..dependencies.google import get_google_client
 from ..dependencies.auth import get_subscriber
-from ..dependencies.database import get_db, get_redis
+from ..dependencies.database import get_db, get_redis, get_database_pool_stats, get_redis_pool_stats
 from ..exceptions import validation
 from ..exceptions.validation import RemoteCalendarConnectionError, APIException
 from ..l10n import l10n
 from ..tasks.emails import send_support_email
+from ..tasks.queue import enqueue
 
 router = APIRouter()
 
@@ -50,6 +51,14 @@ def health(db: Session = Depends(get_db)):
             sentry_sdk.capture_exception(ex)
             return JSONResponse(content=l10n('health-bad'), status_code=503)
 
+    # Health checks come in regularly, so they're a good place to keep an eye on our connection pools when debugging
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        database_pool_stats = get_database_pool_stats()
+        if database_pool_stats:
+            logging.debug(f'Database connection pool: {database_pool_stats}')
+        for redis_db, redis_pool_stats in get_redis_pool_stats().items():
+            logging.debug(f'Redis connection pool (db {redis_db}): {redis_pool_stats}')
+
     return JSONResponse(l10n('health-ok'), status_code=200)
 
 
@@ -461,7 +470,8 @@ def send_feedback(
             MESSAGE: {form_data.details}""")
         raise APIException()
 
-    background_tasks.add_task(
+    enqueue(
+        background_tasks,
         send_support_email,
         requestee_name=subscriber.name,
         requestee_email=subscriber.preferred_email,
@@ -568,6 +568,7 @@ def token(
 
 @router.get('/logout')
 def logout(
+    request: Request,
     db: Session = Depends(get_db),
     subscriber: Subscriber = Depends(get_subscriber),
     fxa_client: FxaClient = Depends(get_fxa_client),
@@ -587,7 +588,9 @@ def logout(
             auth_client = accounts_client
 
     # Don't set a minimum_valid_iat_time here.
-    auth.logout(db, subscriber, auth_client, deny_previous_tokens=False)
+    auth.logout(
+        db, subscriber, auth_client, deny_previous_tokens=False, session_id=request.session.get('accounts_session')
+    )
 
     return True
 
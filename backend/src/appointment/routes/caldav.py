@@ -36,7 +36,7 @@ def caldav_autodiscover_auth(
 
     secure_protocol = 'https://' in connection.url
 
-    dns_lookup_cache_key = f'dns:{utils.encrypt(connection.url)}'
+    dns_lookup_cache_key = f'dns:{utils.obscure_key(connection.url)}'
 
     # Check for an attempt to use Google CalDAV API
     # which we don't support because we use their API directly
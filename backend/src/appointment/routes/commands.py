@@ -4,7 +4,16 @@ from contextlib import contextmanager
 import os
 
 import typer
-from ..commands import update_db, download_legal, create_invite_codes, setup, generate_documentation_pages
+from ..commands import (
+    update_db,
+    download_legal,
+    create_invite_codes,
+    setup,
+    generate_documentation_pages,
+    backfill_blind_indexes,
+    worker,
+    renew_google_channels,
+)
 
 router = typer.Typer()
 
@@ -49,3 +58,21 @@ def create_app_invite_codes(n: int):
 @router.command('setup')
 def setup_app():
     setup.run()
+
+
+@router.command('backfill-blind-indexes')
+def backfill_app_blind_indexes(batch_size: int = 500):
+    backfill_blind_indexes.run(batch_size)
+
+
+@router.command('worker')
+def run_worker(concurrency: int = 4, max_attempts: int = 5, backoff: int = 30):
+    """Send queued emails until stopped"""
+    worker.run(concurrency, max_attempts, backoff)
+
+
+@router.command('renew-google-channels')
+def renew_app_google_channels():
+    """Keep the push notification channels of mirrored Google calendars open"""
+    with cron_lock('renew_google_channels'):
+        renew_google_channels.run()
@@ -13,6 +13,7 @@ from ..dependencies.database import get_db
 from ..exceptions import validation
 from ..exceptions.validation import CreateSubscriberFailedException, CreateSubscriberAlreadyExistsException
 from ..tasks.emails import send_invite_account_email
+from ..tasks.queue import enqueue
 
 router = APIRouter()
 
@@ -89,6 +90,8 @@ def send_invite_email(
     db.add(invite_code)
     db.commit()
 
-    background_tasks.add_task(send_invite_account_email, to=email, lang=subscriber.language)
+    enqueue(
+        background_tasks, send_invite_account_email, date=subscriber.time_created, to=email, lang=subscriber.language
+    )
 
     return invite_code
@@ -10,6 +10,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from .. import utils
+from ..controller import availability
 from ..controller.calendar import CalDavConnector, Tools, GoogleConnector
 from ..controller.apis.google_client import GoogleClient
 from ..controller.auth import signed_url_by_subscriber
@@ -26,6 +27,7 @@ from ..database.schemas import ExternalConnection
 from ..dependencies.auth import get_subscriber, get_subscriber_from_schedule_or_signed_url
 from ..dependencies.database import get_db, get_redis
 from ..dependencies.google import get_google_client
+from ..dependencies.limiter import limiter
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 
@@ -39,13 +41,11 @@ from ..tasks.emails import (
     send_zoom_meeting_failed_email,
     send_new_booking_email,
 )
+from ..tasks.queue import enqueue
 from ..l10n import l10n
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 from fastapi import APIRouter, Depends, BackgroundTasks, Request
 
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
 
 
 def is_this_a_valid_booking_time(schedule: models.Schedule, booking_slot: schemas.SlotBase) -> bool:
@@ -148,6 +148,7 @@ def update_schedule(
     id: int,
     schedule: schemas.ScheduleValidationIn,
     db: Session = Depends(get_db),
+    redis=Depends(get_redis),
     subscriber: Subscriber = Depends(get_subscriber),
 ):
     """endpoint to update an existing calendar connection for authenticated subscriber"""
@@ -170,7 +171,10 @@ def update_schedule(
             # A little extra, but things are a little out of place right now..
             raise validation.ScheduleCreationException()
 
-    return repo.schedule.update(db=db, schedule=schedule, schedule_id=id)
+    db_schedule = repo.schedule.update(db=db, schedule=schedule, schedule_id=id)
+    # The snapshot is voided by the changed schedule anyway, but there's no need to keep it around
+    availability.invalidate(subscriber.id, redis_instance=redis)
+    return db_schedule
 
 
 @router.post('/public/availability', response_model=schemas.AppointmentOut)
@@ -207,12 +211,11 @@ def read_schedule_availabilities(
     if not calendars or len(calendars) == 0:
         raise validation.CalendarNotFoundException()
 
-    # calculate theoretically possible slots from schedule config
-    available_slots = Tools.available_slots_from_schedule(schedule)
-
-    # get all events from all connected calendars in scheduled date range
-    existing_slots = Tools.existing_events_for_schedule(schedule, calendars, subscriber, google_client, db, redis)
-    actual_slots = Tools.events_roll_up_difference(available_slots, existing_slots)
+    # calculate theoretically possible slots from schedule config, and roll up the busy time from all connected
+    # calendars (served from the availability snapshot where possible)
+    actual_slots, unavailable_calendars = Tools.availability_for_schedule(
+        schedule, calendars, subscriber, google_client, db, redis
+    )
 
     if not actual_slots or len(actual_slots) == 0:
         raise validation.SlotNotFoundException()
@@ -225,6 +228,7 @@ def read_schedule_availabilities(
         slots=actual_slots,
         slot_duration=schedule.slot_duration,
         booking_confirmation=schedule.booking_confirmation,
+        unavailable_calendars=len(unavailable_calendars),
     )
 
 
@@ -328,9 +332,12 @@ def request_schedule_availability_slot(
     # Ok we need to clear the cache for all calendars, because we need to recheck them.
     con.bust_cached_events(True)
     calendars = repo.calendar.get_by_subscriber(db, subscriber.id, False)
-    existing_remote_events = Tools.existing_events_for_schedule(
+    existing_remote_events, unavailable_calendars = Tools.existing_events_for_schedule(
         schedule, calendars, subscriber, google_client, db, redis
     )
+    # We can't tell if the slot is free if a calendar didn't answer in time
+    if unavailable_calendars:
+        raise RemoteCalendarConnectionError()
     has_collision = Tools.events_roll_up_difference([slot], existing_remote_events)
     # If we only have booked entries in this list then it means our slot is not available.
     if all(evt.booking_status == BookingStatus.booked for evt in has_collision):
@@ -342,6 +349,7 @@ def request_schedule_availability_slot(
     slot.booking_expires_at = datetime.now() + timedelta(days=1)
     slot.booking_status = BookingStatus.requested
     slot = repo.slot.add_for_schedule(db, slot, schedule.id)
+    availability.invalidate_slot(schedule, slot.start, slot.duration, redis)
 
     # create attendee for this slot
     attendee = repo.slot.update(db, slot.id, s_a.attendee)
@@ -381,7 +389,8 @@ def request_schedule_availability_slot(
     # Create HOLD event in owners calender and send emails to owner for confirmation and attendee for information
     if schedule.booking_confirmation:
         # Sending confirmation email to owner
-        background_tasks.add_task(
+        enqueue(
+            background_tasks,
             send_confirmation_email,
             url=url,
             attendee_name=attendee.name,
@@ -423,7 +432,8 @@ def request_schedule_availability_slot(
         )
 
         # Notify the subscriber that they have a new confirmed booking
-        background_tasks.add_task(
+        enqueue(
+            background_tasks,
             send_new_booking_email,
             name=attendee.name,
             email=attendee.email,
@@ -518,6 +528,8 @@ def handle_schedule_availability_decision(
     if confirmed is False:
         # send rejection information to bookee
         Tools().send_cancel_vevent(background_tasks, appointment, slot, subscriber, slot.attendee)
+        # The requested slot no longer blocks its time
+        availability.invalidate_slot(schedule, slot.start, slot.duration, redis)
         repo.slot.delete(db, slot.id)
 
         if slot.appointment_id:
@@ -564,7 +576,8 @@ def handle_schedule_availability_decision(
                 capture_exception(err)
 
             # Notify the organizer that the meeting link could not be created!
-            background_tasks.add_task(
+            enqueue(
+                background_tasks,
                 send_zoom_meeting_failed_email, to=subscriber.preferred_email, appointment_title=schedule.name
             )
         except OAuth2Error as err:
@@ -573,7 +586,8 @@ def handle_schedule_availability_decision(
                 capture_exception(err)
 
             # Notify the organizer that the meeting link could not be created!
-            background_tasks.add_task(
+            enqueue(
+                background_tasks,
                 send_zoom_meeting_failed_email, to=subscriber.preferred_email, appointment_title=schedule.name
             )
         except SQLAlchemyError as err:  # Not fatal, but could make things tricky
@@ -602,6 +616,7 @@ def handle_schedule_availability_decision(
 
     # Book the slot at the end
     slot = repo.slot.book(db, slot.id)
+    availability.invalidate_slot(schedule, slot.start, slot.duration, redis)
 
     Tools().send_invitation_vevent(background_tasks, appointment, slot, subscriber, slot.attendee)
 
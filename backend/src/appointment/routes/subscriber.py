@@ -47,7 +47,7 @@ def get_all_subscriber(
     )
 
 
-@router.put('/disable/{id}')
+@router.put('/disable/{id}', response_model=schemas.SubscriberAdminItem)
 def disable_subscriber(
     id: str, db: Session = Depends(get_db), subscriber: Subscriber = Depends(get_admin_subscriber)
 ):
@@ -64,7 +64,7 @@ def disable_subscriber(
     return repo.subscriber.disable(db, subscriber_to_delete)
 
 
-@router.put('/enable/{id}')
+@router.put('/enable/{id}', response_model=schemas.SubscriberAdminItem)
 def enable_subscriber(id: str, db: Session = Depends(get_db), _: Subscriber = Depends(get_admin_subscriber)):
     """endpoint to enable a subscriber by id, needs admin permissions"""
     subscriber_to_enable = repo.subscriber.get(db, int(id))
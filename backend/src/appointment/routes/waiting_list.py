@@ -2,8 +2,6 @@ import math
 import os
 
 import sentry_sdk
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 from posthog import Posthog
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, Depends, BackgroundTasks, Request
@@ -11,15 +9,16 @@ from ..database import repo, schemas, models
 from ..dependencies.auth import get_admin_subscriber
 
 from ..dependencies.database import get_db
+from ..dependencies.limiter import limiter
 from ..dependencies.metrics import get_posthog
 from ..exceptions import validation
 from ..l10n import l10n
-from ..tasks.emails import send_confirm_email, send_invite_account_email
+from ..tasks.emails import send_confirm_email, send_invite_account_emails
+from ..tasks.queue import enqueue
 from itsdangerous import URLSafeSerializer, BadSignature
 from enum import Enum
 
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
 
 
 class WaitingListAction(Enum):
@@ -44,7 +43,8 @@ def join_the_waiting_list(
 
     # If they were added, send the email
     if added:
-        background_tasks.add_task(
+        enqueue(
+            background_tasks,
             send_confirm_email, to=email, confirm_token=confirm_token, decline_token=decline_token
         )
 
@@ -143,10 +143,12 @@ def invite_waiting_list_users(
         - If failed add the error msg, and skip to the next loop iteration
         - Create invite code
         - Attach the invite code to the subscriber and waiting list user
-        - Send the 'You're invited' email to the new user's email
-        - Done loop iteration!"""
+        - Queue the 'You're invited' email to the new user's email
+        - Done loop iteration!
+    Then send all queued 'You're invited' emails in one batch"""
     accepted = []
     errors = []
+    invites = []
 
     for id in data.id_list:
         # Look the user up!
@@ -186,14 +188,17 @@ def invite_waiting_list_users(
         db.add(invite_code)
         db.commit()
 
-        background_tasks.add_task(
-            send_invite_account_email,
-            date=waiting_list_user.time_created,
-            to=subscriber.email,
-            lang=subscriber.language,
-        )
+        invites.append({
+            'date': waiting_list_user.time_created,
+            'to': subscriber.email,
+            'lang': subscriber.language,
+        })
         accepted.append(waiting_list_user.id)
 
+    # Send the whole wave of invites over one smtp session
+    if invites:
+        enqueue(background_tasks, send_invite_account_emails, invites=invites)
+
     if posthog:
         posthog.capture(
             distinct_id=admin.unique_hash,
@@ -2,13 +2,14 @@ import logging
 
 import requests
 import sentry_sdk
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Header, Request
 from sqlalchemy.orm import Session
 
 from ..controller import auth, data, zoom
+from ..controller.mirror import notify_google_channel
 from ..controller.apis.fxa_client import FxaClient
 from ..database import repo, models, schemas
-from ..dependencies.database import get_db
+from ..dependencies.database import get_db, get_redis
 from ..dependencies.fxa import get_webhook_auth as get_webhook_auth_fxa, get_fxa_client
 from ..dependencies.zoom import get_webhook_auth as get_webhook_auth_zoom
 from ..exceptions.account_api import AccountDeletionSubscriberFail
@@ -115,3 +116,16 @@ def zoom_deauthorization(
     except Exception as ex:
         sentry_sdk.capture_exception(ex)
         logging.error(f'Error disconnecting zoom connection: {ex}')
+
+
+@router.post('/google-calendar')
+def google_calendar_notification(
+    x_goog_channel_id: str | None = Header(None),
+    x_goog_channel_token: str | None = Header(None),
+    x_goog_resource_state: str | None = Header(None),
+    redis=Depends(get_redis),
+):
+    """Push notifications for the Google calendars we mirror, they only tell us to refresh on the next read
+    Ref: https://developers.google.com/calendar/api/guides/push"""
+    if not notify_google_channel(redis, x_goog_channel_id, x_goog_channel_token, x_goog_resource_state):
+        logging.warning('Google calendar notification received for an unknown channel.')
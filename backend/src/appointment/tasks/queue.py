@@ -0,0 +1,289 @@
+"""Module: queue
+
+Durable job queue for work that shouldn't tie up the web workers, like sending emails. Routes enqueue a job onto a
+redis stream, and `run-command main worker` picks it up. Failed jobs are retried with an exponential backoff, and are
+moved to a dead-letter stream once they run out of attempts.
+"""
+
+import base64
+import functools
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from threading import Event
+from typing import Callable
+from zoneinfo import ZoneInfo
+
+import sentry_sdk
+from fastapi import BackgroundTasks
+from redis import Redis, RedisCluster
+from redis.exceptions import NoScriptError, RedisError, ResponseError
+
+from .. import utils
+from ..controller.mailer import Attachment
+from ..defines import APP_ENV_DEV, REDIS_JOB_STREAM_KEY, REDIS_JOB_RETRY_KEY, REDIS_JOB_DEAD_KEY, REDIS_JOB_GROUP
+from ..dependencies.database import get_redis
+from ..l10n import get_locales, l10n_context
+
+# Registered tasks by name, a job only carries the task name
+TASKS: dict[str, Callable] = {}
+
+# Moves due retries back onto the job stream in one go, so a retry is never lost or queued twice.
+# KEYS: retry zset, job stream (they share a hash tag); ARGV: now, max retries to move
+PROMOTE_SCRIPT = """
+local payloads = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, payload in ipairs(payloads) do
+    redis.call('ZREM', KEYS[1], payload)
+    redis.call('XADD', KEYS[2], '*', 'job', payload)
+end
+return #payloads
+"""
+PROMOTE_SCRIPT_SHA = hashlib.sha1(PROMOTE_SCRIPT.encode()).hexdigest()
+
+
+class RetryJob(Exception):
+    """Raised by a task that only partially succeeded. The job is retried with the given arguments, so the parts that
+    did succeed aren't repeated."""
+
+    def __init__(self, message: str, *args, **kwargs):
+        super().__init__(message)
+        self.retry_args = args
+        self.retry_kwargs = kwargs
+
+
+def report(e: Exception):
+    """Log and capture a task exception"""
+    if os.getenv('APP_ENV') == APP_ENV_DEV:
+        logging.error(f'[tasks.queue] An exception has occurred: {e}')
+        traceback.print_exc()
+    if os.getenv('SENTRY_DSN'):
+        sentry_sdk.capture_exception(e)
+
+
+def task(fn: Callable):
+    """Register a function as a queueable task. Called directly (e.g. as a background task) exceptions are reported and
+    swallowed, the worker runs the undecorated function instead so it can retry failed jobs."""
+    TASKS[fn.__name__] = fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            report(e)
+
+    return run
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        # Keep the named timezone around, emails show dates in the recipient's timezone
+        tz = value.tzinfo.key if isinstance(value.tzinfo, ZoneInfo) else None
+        return {'__datetime__': value.isoformat(), 'tz': tz}
+    if isinstance(value, Attachment):
+        return {'__attachment__': [value.mime_main, value.mime_sub, value.filename, value.data]}
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode()}
+    raise TypeError(f'Cannot queue a value of type {type(value).__name__}')
+
+
+def _decode_value(obj: dict):
+    if '__datetime__' in obj:
+        value = datetime.fromisoformat(obj['__datetime__'])
+        return value.astimezone(ZoneInfo(obj['tz'])) if obj['tz'] else value
+    if '__attachment__' in obj:
+        mime_main, mime_sub, filename, data = obj['__attachment__']
+        return Attachment(mime=(mime_main, mime_sub), filename=filename, data=data)
+    if '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+def encode_job(
+    name: str, args: tuple | list, kwargs: dict, attempt: int = 0, locales: list[str] | None = None
+) -> str:
+    """Serialize and encrypt a job, they contain email addresses and event details. The locales are those of the
+    request that queued it, the worker runs the task in them."""
+    job = json.dumps(
+        {'t': name, 'a': args, 'k': kwargs, 'n': attempt, 'l': locales}, default=_encode_value, separators=(',', ':')
+    )
+    return utils.encrypt(job)
+
+
+def decode_job(payload: str) -> tuple[str, list, dict, int, list[str] | None]:
+    """Decrypt and deserialize a job into its task name, args, kwargs, attempt number and locales"""
+    job = json.loads(utils.decrypt(payload), object_hook=_decode_value)
+    return job['t'], job['a'], job['k'], job['n'], job.get('l')
+
+
+def queue_enabled() -> bool:
+    value = os.getenv('JOB_QUEUE_ENABLED')
+    return not value or value.lower() == 'true' or value == '1'
+
+
+def enqueue(background_tasks: BackgroundTasks, fn: Callable, *args, **kwargs) -> bool:
+    """Queue a task for the worker, it runs in the current request's locales. If the queue is disabled or redis isn't
+    available the task runs as a background task of the current request instead. Returns True if the job was queued."""
+    redis_instance = get_redis() if queue_enabled() else None
+
+    if redis_instance is not None:
+        try:
+            redis_instance.xadd(REDIS_JOB_STREAM_KEY, {'job': encode_job(fn.__name__, args, kwargs, 0, get_locales())})
+            return True
+        except RedisError as e:
+            # Better to send it from here than not at all
+            logging.error(f'[tasks.queue] Could not queue {fn.__name__}, running it in process: {e}')
+            if os.getenv('SENTRY_DSN'):
+                sentry_sdk.capture_exception(e)
+
+    background_tasks.add_task(fn, *args, **kwargs)
+    return False
+
+
+class Worker:
+    """Consumes the job stream as part of a consumer group, so any number of workers can share the load. Jobs are only
+    acknowledged once they're done, retried or dead-lettered, jobs of a crashed worker are claimed by the others."""
+
+    def __init__(
+        self,
+        redis_instance: Redis | RedisCluster,
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        backoff: int = 30,
+        claim_idle: int = 300,
+        block: int = 5,
+        consumer: str | None = None,
+    ):
+        self.redis_instance = redis_instance
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        # In seconds, the delay of the first retry. Each following retry waits twice as long.
+        self.backoff = backoff
+        # In seconds, how long a job can go unacknowledged before another worker takes it over
+        self.claim_idle = claim_idle
+        # In seconds, how long to wait for new jobs before checking for retries again
+        self.block = block
+        self.consumer = consumer or f'{socket.gethostname()}-{os.getpid()}'
+        self._stopping = Event()
+
+    def ensure_group(self):
+        try:
+            self.redis_instance.xgroup_create(REDIS_JOB_STREAM_KEY, REDIS_JOB_GROUP, id='0', mkstream=True)
+        except ResponseError as e:
+            # Another worker beat us to it
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def stop(self):
+        """Stop picking up new jobs, the jobs in progress are finished first"""
+        self._stopping.set()
+
+    def promote_retries(self, now: float | None = None) -> int:
+        """Move retries whose backoff has passed back onto the job stream"""
+        now = now or time.time()
+        args = (2, REDIS_JOB_RETRY_KEY, REDIS_JOB_STREAM_KEY, now, 100)
+        try:
+            return self.redis_instance.evalsha(PROMOTE_SCRIPT_SHA, *args)
+        except NoScriptError:
+            return self.redis_instance.eval(PROMOTE_SCRIPT, *args)
+
+    def claim_stale(self, count: int) -> list[tuple[str, dict]]:
+        """Take over jobs another worker picked up but never acknowledged"""
+        _, entries, *_ = self.redis_instance.xautoclaim(
+            REDIS_JOB_STREAM_KEY, REDIS_JOB_GROUP, self.consumer, self.claim_idle * 1000, start_id='0-0', count=count
+        )
+        return entries
+
+    def read(self, count: int) -> list[tuple[str, dict]]:
+        response = self.redis_instance.xreadgroup(
+            REDIS_JOB_GROUP, self.consumer, {REDIS_JOB_STREAM_KEY: '>'}, count=count, block=self.block * 1000
+        )
+        return [entry for _, entries in response or [] for entry in entries]
+
+    def _done(self, entry_id: str, retry: tuple[str, float] | None = None, dead: dict | None = None):
+        pipeline = self.redis_instance.pipeline()
+        if retry:
+            payload, run_at = retry
+            pipeline.zadd(REDIS_JOB_RETRY_KEY, {payload: run_at})
+        if dead:
+            pipeline.xadd(REDIS_JOB_DEAD_KEY, dead, maxlen=10000, approximate=True)
+        pipeline.xack(REDIS_JOB_STREAM_KEY, REDIS_JOB_GROUP, entry_id)
+        pipeline.xdel(REDIS_JOB_STREAM_KEY, entry_id)
+        pipeline.execute()
+
+    def handle(self, entry_id: str, fields: dict):
+        """Run a single job, then acknowledge, retry or dead-letter it"""
+        payload = fields.get('job') if fields else None
+
+        try:
+            name, args, kwargs, attempt, locales = decode_job(payload)
+            fn = TASKS[name]
+        except Exception as e:
+            # We'll never be able to run this one
+            logging.error(f'[tasks.queue] Dropping unreadable job {entry_id}: {e}')
+            self._done(entry_id, dead={'job': payload or '', 'error': repr(e)[:1000]})
+            return
+
+        timer_boot = time.perf_counter_ns()
+        try:
+            # There's no request here, so emails would come out untranslated
+            with l10n_context(locales):
+                fn(*args, **kwargs)
+        except Exception as e:
+            if isinstance(e, RetryJob):
+                args, kwargs = e.retry_args, e.retry_kwargs
+
+            if attempt + 1 >= self.max_attempts:
+                logging.error(f'[tasks.queue] Job {name} failed for good after {attempt + 1} attempts: {e}')
+                report(e)
+                dead = {'job': encode_job(name, args, kwargs, attempt + 1, locales), 'error': repr(e)[:1000]}
+                self._done(entry_id, dead=dead)
+            else:
+                delay = self.backoff * 2**attempt
+                logging.warning(f'[tasks.queue] Job {name} failed, retrying in {delay}s: {e}')
+                retry = encode_job(name, args, kwargs, attempt + 1, locales)
+                self._done(entry_id, retry=(retry, time.time() + delay))
+            return
+
+        logging.info(f'[tasks.queue] Job {name} done in {(time.perf_counter_ns() - timer_boot) / 1e6:.1f}ms')
+        self._done(entry_id)
+
+    def run(self):
+        """Process jobs until stopped, at most `concurrency` at once"""
+        self.ensure_group()
+
+        in_flight = set()
+        last_claim = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job') as executor:
+            while not self._stopping.is_set():
+                if len(in_flight) >= self.concurrency:
+                    _, in_flight = wait(in_flight, timeout=self.block, return_when=FIRST_COMPLETED)
+                    continue
+
+                try:
+                    self.promote_retries()
+
+                    free = self.concurrency - len(in_flight)
+                    entries = []
+                    if time.monotonic() - last_claim > self.claim_idle / 2:
+                        entries = self.claim_stale(free)
+                        last_claim = time.monotonic()
+                    if not entries:
+                        entries = self.read(free)
+                except RedisError as e:
+                    logging.error(f'[tasks.queue] Could not reach redis: {e}')
+                    self._stopping.wait(self.block)
+                    continue
+
+                for entry_id, fields in entries:
+                    in_flight.add(executor.submit(self.handle, entry_id, fields))
+                in_flight = {future for future in in_flight if not future.done()}
+
+            # Let the jobs in progress finish up
+            wait(in_flight)
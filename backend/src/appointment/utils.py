@@ -1,9 +1,12 @@
+import base64
+import hashlib
+import hmac
 import json
 import os
 import urllib.parse
 from urllib import parse
 
-from functools import cache
+from functools import cache, lru_cache
 
 from argon2 import PasswordHasher
 from sqlalchemy_utils.types.encrypted.encrypted_type import AesEngine
@@ -58,6 +61,33 @@ def decrypt(value):
     return setup_encryption_engine().decrypt(value)
 
 
+@cache
+def obscure_key_secret() -> bytes:
+    """The key we obscure (cache) keys with, derived from our secret so it's not the encryption key itself"""
+    return hashlib.sha256(b'appointment-cache-key:' + secret().encode()).digest()
+
+
+@lru_cache(maxsize=4096)
+def obscure_key(value) -> str:
+    """Deterministically obscure part of a (cache) key with a keyed hash, so it can't be reversed or guessed"""
+    return hmac.new(obscure_key_secret(), str(value).encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def encrypt_bytes(value: bytes) -> str:
+    """Encrypt binary data with the same engine as encrypt, without going through a string first"""
+    engine = setup_encryption_engine()
+    encryptor = engine.cipher.encryptor()
+    encrypted = encryptor.update(engine.padding_engine.pad(value)) + encryptor.finalize()
+    return base64.b64encode(encrypted).decode()
+
+
+def decrypt_bytes(value: str) -> bytes:
+    engine = setup_encryption_engine()
+    decryptor = engine.cipher.decryptor()
+    decrypted = decryptor.update(base64.b64decode(value)) + decryptor.finalize()
+    return engine.padding_engine.unpad(decrypted)
+
+
 def retrieve_user_url_data(url):
     """URL Decodes, and retrieves username, signature, and main url from /<username>/<signature>/"""
     parsed_url = parse.urlparse(url)
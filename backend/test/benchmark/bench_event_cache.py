@@ -0,0 +1,81 @@
+"""Benchmark for the cached events payload
+
+Compares the single encrypted envelope against the previous format (every event encrypted on its own, in a json
+list) for a calendar with 500 events: packing, unpacking and the size that ends up in redis. Run from the backend
+folder:
+
+    python test/benchmark/bench_event_cache.py
+"""
+
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, UTC
+
+os.environ.setdefault('DB_SECRET', 'benchmark-secret')
+
+from appointment.controller.calendar import pack_events, unpack_rows, row_event  # noqa: E402
+from appointment.database import schemas  # noqa: E402
+
+
+def legacy_pack(events: list[schemas.Event]) -> str:
+    """The previous format, kept around for comparison"""
+    return json.dumps([event.model_dump_redis() for event in events])
+
+
+def legacy_unpack(payload: str) -> list[schemas.Event]:
+    return [schemas.Event.model_load_redis(blob) for blob in json.loads(payload)]
+
+
+def envelope_unpack(envelope: str) -> list[schemas.Event]:
+    return [row_event(row) for row in unpack_rows(envelope)]
+
+
+def make_events(count=500, seed=42):
+    """Generates a couple of months of events, like a remote calendar would hand us"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 9, tzinfo=UTC)
+
+    events = []
+    for i in range(count):
+        event_start = start + timedelta(minutes=rng.randrange(0, 60 * 24 * 60, 15))
+        events.append(
+            schemas.Event(
+                title=f'Meeting {i}',
+                start=event_start,
+                end=event_start + timedelta(minutes=rng.choice([15, 30, 60, 90])),
+                tentative=rng.random() < 0.1,
+                description=rng.choice(['', 'Weekly sync about the roadmap', 'Call with the team']),
+            )
+        )
+    return events
+
+
+def main(repeat=5):
+    events = make_events()
+    print(f'{len(events)} events')
+
+    legacy = legacy_pack(events)
+    envelope = pack_events(events)
+    assert [e.model_dump() for e in legacy_unpack(legacy)] == [e.model_dump() for e in envelope_unpack(envelope)], (
+        'Outputs differ!'
+    )
+
+    timings = {
+        'legacy pack': min(timeit.repeat(lambda: legacy_pack(events), number=10, repeat=repeat)) / 10,
+        'envelope pack': min(timeit.repeat(lambda: pack_events(events), number=10, repeat=repeat)) / 10,
+        'legacy unpack': min(timeit.repeat(lambda: legacy_unpack(legacy), number=10, repeat=repeat)) / 10,
+        'envelope unpack': min(timeit.repeat(lambda: envelope_unpack(envelope), number=10, repeat=repeat)) / 10,
+    }
+    for name, timing in timings.items():
+        print(f'{name + ":":17} {timing * 1000:8.2f} ms')
+
+    print(f'legacy size:      {len(legacy):8} bytes')
+    print(f'envelope size:    {len(envelope):8} bytes')
+    print(f'unpack speedup:   {timings["legacy unpack"] / timings["envelope unpack"]:8.1f}x')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
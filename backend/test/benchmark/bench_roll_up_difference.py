@@ -0,0 +1,66 @@
+"""Benchmark for Tools.events_roll_up_difference
+
+Compares the sweep-line implementation against the previous slots x events implementation for a schedule with a
+2-month booking window and a busy calendar. Run from the backend folder:
+
+    PYTHONPATH=test python test/benchmark/bench_roll_up_difference.py
+"""
+
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, UTC
+
+from appointment.controller.calendar import Tools
+from appointment.database import schemas
+from legacy_tools import legacy_events_roll_up_difference
+
+
+def make_data(days=60, slot_duration=15, events_per_day=8, seed=42):
+    """Generates 9am - 5pm slots for every day of the window and a handful of random busy events per day"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 9, tzinfo=UTC)
+
+    slots = []
+    events = []
+    for day in range(days):
+        day_start = start + timedelta(days=day)
+        slots += [
+            schemas.SlotBase(start=day_start + timedelta(minutes=minute), duration=slot_duration)
+            for minute in range(0, 8 * 60, slot_duration)
+        ]
+        for _ in range(events_per_day):
+            event_start = day_start + timedelta(minutes=rng.randrange(-60, 9 * 60, 5))
+            event_end = event_start + timedelta(minutes=rng.choice([15, 30, 60]))
+            events.append(schemas.Event(title='Busy', start=event_start, end=event_end))
+
+    return slots, events
+
+
+def copy_slots(slots):
+    # Roll up mutates collision durations, so hand each run its own slots
+    return [slot.model_copy() for slot in slots]
+
+
+def main(repeat=3):
+    slots, events = make_data()
+    print(f'{len(slots)} slots x {len(events)} events')
+
+    legacy = legacy_events_roll_up_difference(copy_slots(slots), events)
+    current = Tools.events_roll_up_difference(copy_slots(slots), events)
+    assert [s.model_dump() for s in legacy] == [s.model_dump() for s in current], 'Outputs differ!'
+
+    legacy_time = min(
+        timeit.repeat(lambda: legacy_events_roll_up_difference(copy_slots(slots), events), number=1, repeat=repeat)
+    )
+    current_time = min(
+        timeit.repeat(lambda: Tools.events_roll_up_difference(copy_slots(slots), events), number=1, repeat=repeat)
+    )
+
+    print(f'legacy:     {legacy_time * 1000:10.2f} ms')
+    print(f'sweep-line: {current_time * 1000:10.2f} ms')
+    print(f'speedup:    {legacy_time / current_time:10.1f}x')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
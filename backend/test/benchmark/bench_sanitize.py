@@ -0,0 +1,88 @@
+"""Benchmark for SanitizeMiddleware
+
+Compares the schema driven, single parse sanitizer against the previous parse twice, clean every string and always
+re-serialize implementation on a schedule update body. Run from the backend folder:
+
+    python test/benchmark/bench_sanitize.py
+"""
+
+import json
+import sys
+import timeit
+
+import nh3
+from fastapi import FastAPI
+
+from appointment.database import schemas
+from appointment.middleware.SanitizeMiddleware import SanitizeMiddleware
+from appointment.utils import is_json
+
+
+def legacy_sanitize(body: bytes) -> bytes:
+    """The previous SanitizeMiddleware body handling, kept around for comparison"""
+
+    def sanitize_str(value):
+        return nh3.clean(value, tags={''}) if isinstance(value, str) else value
+
+    if is_json(body):
+        json_body = json.loads(body)
+        for key, value in json_body.items():
+            if isinstance(value, dict):
+                json_body[key] = {k: sanitize_str(v) for k, v in value.items()}
+            elif isinstance(value, list):
+                json_body[key] = [sanitize_str(v) for v in value]
+            else:
+                json_body[key] = sanitize_str(value)
+        body = bytes(json.dumps(json_body), encoding='utf-8')
+    return body
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.put('/schedule/{id}')
+    def update_schedule(id: int, schedule: schemas.ScheduleValidationIn):
+        return schedule
+
+    return app
+
+
+BODY = json.dumps({
+    'calendar_id': 1,
+    'name': 'Weekly office hours',
+    'slug': 'office-hours',
+    'location_type': 2,
+    'location_url': 'https://example.org/meet?id=1234&pwd=abcd',
+    'details': 'Bring your questions about the roadmap, the release schedule and anything else.',
+    'start_date': '2025-01-01',
+    'start_time': '09:00',
+    'end_time': '17:00',
+    'earliest_booking': 1440,
+    'farthest_booking': 20160,
+    'weekdays': [1, 2, 3, 4, 5],
+    'slot_duration': 30,
+    'timezone': 'Europe/Berlin',
+}).encode()
+
+
+def current_sanitize(app):
+    middleware = SanitizeMiddleware(None)
+    scope = {'type': 'http', 'method': 'PUT', 'path': '/schedule/1', 'root_path': '', 'app': app, 'headers': []}
+
+    return lambda: middleware.sanitize_body(BODY, middleware.free_text_tree(scope))
+
+
+def main(number=2000, repeat=3):
+    app = make_app()
+    current = current_sanitize(app)
+
+    legacy_time = min(timeit.repeat(lambda: legacy_sanitize(BODY), number=number, repeat=repeat)) / number
+    current_time = min(timeit.repeat(current, number=number, repeat=repeat)) / number
+
+    print(f'legacy:  {legacy_time * 1e6:10.1f} us')
+    print(f'current: {current_time * 1e6:10.1f} us')
+    print(f'speedup: {legacy_time / current_time:10.1f}x')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
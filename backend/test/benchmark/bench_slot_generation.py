@@ -0,0 +1,64 @@
+"""Benchmark for Tools.slot_arrays_from_schedule
+
+Compares generating a schedule's availability (slots rolled up against busy time) as int64 arrays against the
+previous implementation, which created one pydantic slot per candidate slot and rolled up those. Uses a 6-month booking
+window with 10-minute slots. Run from the backend folder:
+
+    PYTHONPATH=test python test/benchmark/bench_slot_generation.py
+"""
+
+import random
+import sys
+import timeit
+import zoneinfo
+from datetime import timedelta
+
+from appointment.controller.calendar import Tools
+from legacy_tools import legacy_available_slots_from_schedule, make_schedule_stand_in
+
+
+def make_busy(slots, events_per_day=6, seed=42):
+    """A handful of random busy intervals for every day covered by the slots"""
+    rng = random.Random(seed)
+    first_day = slots[0].start.replace(hour=0, minute=0)
+    busy = []
+    for day in range((slots[-1].start - first_day).days + 1):
+        for _ in range(events_per_day):
+            event_start = first_day + timedelta(days=day, minutes=rng.randrange(8 * 60, 18 * 60, 5))
+            event_end = event_start + timedelta(minutes=rng.choice([15, 30, 60]))
+            busy.append((event_start.timestamp(), event_end.timestamp()))
+    return busy
+
+
+def legacy_availability(schedule, busy):
+    return Tools.busy_roll_up_difference(legacy_available_slots_from_schedule(schedule), busy)
+
+
+def current_availability(schedule, busy):
+    starts, durations = Tools.slot_arrays_from_schedule(schedule)
+    starts, durations, booked = Tools.busy_roll_up_arrays(starts, durations, busy)
+    timezone = zoneinfo.ZoneInfo(schedule.calendar.owner.timezone)
+    return Tools.slots_from_arrays(starts, durations, booked, timezone)
+
+
+def main(repeat=3):
+    schedule = make_schedule_stand_in()
+    busy = make_busy(legacy_available_slots_from_schedule(schedule))
+
+    legacy = legacy_availability(schedule, busy)
+    current = current_availability(schedule, busy)
+    print(f'{len(legacy)} slots after roll up, {len(busy)} busy intervals')
+    assert [(s.start, s.duration, s.booking_status) for s in legacy] == [
+        (s.start, s.duration, s.booking_status) for s in current
+    ], 'Outputs differ!'
+
+    legacy_time = min(timeit.repeat(lambda: legacy_availability(schedule, busy), number=1, repeat=repeat))
+    current_time = min(timeit.repeat(lambda: current_availability(schedule, busy), number=1, repeat=repeat))
+
+    print(f'legacy: {legacy_time * 1000:10.2f} ms')
+    print(f'arrays: {current_time * 1000:10.2f} ms')
+    print(f'speedup:{legacy_time / current_time:10.1f}x')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Benchmark for the pooled smtp sender
+
+Compares opening a connection per email (the previous Mailer.send) against the kept alive pool and a single batch,
+sending an invite wave to a local debugging smtp server. The local server has no TLS or login, so real servers see a
+much larger difference. Run from the backend folder:
+
+    PYTHONPATH=test python test/benchmark/bench_smtp_pool.py
+"""
+
+import smtplib
+import sys
+import timeit
+from email.message import EmailMessage
+
+from appointment.controller.mailer import SmtpPool
+from factory.smtp_factory import DebuggingSmtpServer
+
+
+def legacy_send(port: int, message: EmailMessage):
+    """The previous connect, send, quit flow of Mailer.send"""
+    server = smtplib.SMTP('127.0.0.1', port)
+    try:
+        server.send_message(message, to_addrs=message['To'])
+    finally:
+        server.quit()
+
+
+def make_messages(count=200):
+    messages = []
+    for i in range(count):
+        message = EmailMessage()
+        message['Subject'] = "You've been invited"
+        message['From'] = 'no-reply@example.org'
+        message['To'] = f'invitee{i}@example.org'
+        message.set_content('Hello, you are invited!')
+        messages.append(message)
+    return messages
+
+
+def main(repeat=3):
+    server = DebuggingSmtpServer().start()
+    messages = make_messages()
+    print(f'{len(messages)} emails')
+
+    pool = SmtpPool(host='127.0.0.1', port=server.port)
+
+    legacy_time = min(
+        timeit.repeat(lambda: [legacy_send(server.port, m) for m in messages], number=1, repeat=repeat)
+    )
+    pooled_time = min(timeit.repeat(lambda: [pool.send(m, m['To']) for m in messages], number=1, repeat=repeat))
+    batch_time = min(
+        timeit.repeat(lambda: pool.send_batch([(m, m['To']) for m in messages]), number=1, repeat=repeat)
+    )
+
+    pool.close()
+    server.stop()
+
+    print(f'connection per email: {legacy_time * 1000:10.2f} ms')
+    print(f'pooled:               {pooled_time * 1000:10.2f} ms')
+    print(f'batch:                {batch_time * 1000:10.2f} ms')
+    print(f'speedup:              {legacy_time / batch_time:10.1f}x')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
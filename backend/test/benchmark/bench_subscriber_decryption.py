@@ -0,0 +1,75 @@
+"""Benchmark for loading subscribers with encrypted columns
+
+Measures the admin subscriber list (one page of 50, serialized like the route does) and the auth path (load a
+subscriber by id and run the token checks) against an in-memory sqlite database. Run from the backend folder:
+
+    python test/benchmark/bench_subscriber_decryption.py
+"""
+
+import os
+import sys
+import timeit
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, joinedload
+from sqlalchemy.pool import StaticPool
+
+os.environ.setdefault('DB_SECRET', 'benchmark-secret')
+
+from appointment.database import models, repo, schemas  # noqa: E402
+
+
+def make_db(subscribers=500):
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)
+
+    with session() as db:
+        for i in range(subscribers):
+            db.add(
+                models.Subscriber(
+                    username=f'user{i}',
+                    email=f'user{i}@example.org',
+                    secondary_email=f'other{i}@example.org',
+                    name=f'User {i}',
+                    password='not-a-real-password-hash',
+                    avatar_url=f'https://example.org/avatar/{i}.png',
+                    short_link_hash=f'hash{i}',
+                    timezone='America/Vancouver',
+                )
+            )
+        db.commit()
+
+    return session
+
+
+def admin_list(session):
+    with session() as db:
+        subscribers = (
+            db.query(models.Subscriber)
+            .options(joinedload(models.Subscriber.invite))
+            .order_by('time_created')
+            .limit(50)
+            .all()
+        )
+        return [schemas.SubscriberAdminItem.model_validate(subscriber) for subscriber in subscribers]
+
+
+def auth(session, subscriber_id=1):
+    with session() as db:
+        subscriber = repo.subscriber.get(db, subscriber_id)
+        return subscriber.is_deleted or subscriber.minimum_valid_iat_time
+
+
+def main(repeat=20):
+    session = make_db()
+
+    admin_time = min(timeit.repeat(lambda: admin_list(session), number=10, repeat=repeat)) / 10
+    auth_time = min(timeit.repeat(lambda: auth(session), number=200, repeat=repeat)) / 200
+
+    print(f'admin list (50): {admin_time * 1000:8.2f} ms')
+    print(f'auth:            {auth_time * 1000:8.3f} ms')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,6 +22,10 @@ from factory.slot_factory import make_appointment_slot  # noqa: F401
 from factory.subscriber_factory import make_subscriber, make_basic_subscriber, make_pro_subscriber  # noqa: F401
 from factory.invite_factory import make_invite  # noqa: F401
 from factory.waiting_list_factory import make_waiting_list  # noqa: F401
+from factory.smtp_factory import with_smtp_server  # noqa: F401
+from factory.google_factory import with_fake_google  # noqa: F401
+from factory.caldav_factory import with_caldav_server  # noqa: F401
+from factory.redis_factory import with_fake_redis  # noqa: F401
 
 # Load our env
 load_dotenv(find_dotenv('.env.test'), override=True)
@@ -86,9 +90,14 @@ def _patch_mailer(monkeypatch):
         def send(self):
             return
 
+        @staticmethod
+        def send_batch(mails):
+            return [None] * len(mails)
+
     from appointment.controller.mailer import Mailer
 
     monkeypatch.setattr(Mailer, 'send', MockMailer.send)
+    monkeypatch.setattr(Mailer, 'send_batch', MockMailer.send_batch)
 
 
 def _patch_fxa_client(monkeypatch):
@@ -0,0 +1,191 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+import pytest
+from lxml import etree
+
+PRINCIPAL = '/principals/user/'
+HOME = '/calendars/user/'
+
+MULTISTATUS = '<?xml version="1.0" encoding="utf-8"?>\n<d:multistatus xmlns:d="DAV:" ' \
+    'xmlns:c="urn:ietf:params:xml:ns:caldav">{}</d:multistatus>'
+RESPONSE = '<d:response><d:href>{}</d:href><d:propstat><d:prop>{}</d:prop>' \
+    '<d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>'
+NOT_FOUND = '<d:response><d:href>{}</d:href><d:status>HTTP/1.1 404 Not Found</d:status></d:response>'
+
+
+class FakeCaldavServer(ThreadingHTTPServer):
+    """A bare-bones local CalDAV server with one principal and a couple of calendars. It answers the discovery
+    PROPFINDs, calendar-multiget and (unless sync_collection is turned off) sync-collection reports with keep-alive,
+    and records every request and connection it gets, and the calendar objects it sent."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), FakeCaldavHandler)
+        # calendar name -> display name
+        self.calendars = {'work': 'Work', 'home': 'Home'}
+        # calendar name -> object href -> (etag, calendar data)
+        self.objects = {name: {} for name in self.calendars}
+        # Every change as (calendar name, object href), a sync token is the number of changes seen
+        self.changes = []
+        self.sync_collection = True
+        self.requests = []
+        self.transferred = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/'
+
+    def calendar_url(self, name):
+        return f'{self.url.rstrip("/")}{HOME}{name}/'
+
+    def put_object(self, calendar, uid, ical) -> str:
+        href = f'{HOME}{calendar}/{uid}.ics'
+        with self.lock:
+            self.changes.append((calendar, href))
+            self.objects[calendar][href] = (f'"{len(self.changes)}"', ical)
+        return href
+
+    def delete_object(self, calendar, uid):
+        href = f'{HOME}{calendar}/{uid}.ics'
+        with self.lock:
+            self.changes.append((calendar, href))
+            del self.objects[calendar][href]
+
+    def ctag(self, calendar) -> str:
+        return f'"{len([change for change in self.changes if change[0] == calendar])}"'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def propfind(self, path: str, depth: str) -> str | None:
+        """Returns the multistatus body for a PROPFIND, or None if there's nothing at that path"""
+        calendar = '<d:resourcetype><d:collection/><c:calendar/></d:resourcetype>' \
+            '<c:supported-calendar-component-set><c:comp name="VEVENT"/></c:supported-calendar-component-set>' \
+            '<d:displayname>{}</d:displayname>'
+
+        if path in ('/', PRINCIPAL):
+            props = f'<d:current-user-principal><d:href>{PRINCIPAL}</d:href></d:current-user-principal>' \
+                f'<c:calendar-home-set><d:href>{HOME}</d:href></c:calendar-home-set>' \
+                '<d:resourcetype><d:collection/></d:resourcetype>'
+            return MULTISTATUS.format(RESPONSE.format(path, props))
+
+        if path == HOME:
+            responses = [RESPONSE.format(HOME, '<d:resourcetype><d:collection/></d:resourcetype>')]
+            if depth == '1':
+                responses += [
+                    RESPONSE.format(f'{HOME}{name}/', calendar.format(title))
+                    for name, title in self.calendars.items()
+                ]
+            return MULTISTATUS.format(''.join(responses))
+
+        for name, title in self.calendars.items():
+            if path == f'{HOME}{name}/':
+                props = calendar.format(title) + f'<cs:getctag xmlns:cs="http://calendarserver.org/ns/">' \
+                    f'{escape(self.ctag(name))}</cs:getctag>'
+                responses = [RESPONSE.format(path, props)]
+                if depth == '1':
+                    responses += [
+                        RESPONSE.format(href, f'<d:getetag>{escape(etag)}</d:getetag><d:resourcetype/>')
+                        for href, (etag, _) in self.objects[name].items()
+                    ]
+                return MULTISTATUS.format(''.join(responses))
+
+        return None
+
+    def report(self, path: str, body: bytes) -> tuple[int, str]:
+        """Returns the status and body for a REPORT"""
+        name = next((name for name in self.calendars if path == f'{HOME}{name}/'), None)
+        if name is None:
+            return 404, ''
+
+        query = etree.fromstring(body)
+        objects = self.objects[name]
+
+        if query.tag == '{urn:ietf:params:xml:ns:caldav}calendar-multiget':
+            responses = []
+            for href in query.iter('{DAV:}href'):
+                if href.text not in objects:
+                    responses.append(NOT_FOUND.format(href.text))
+                    continue
+                etag, ical = objects[href.text]
+                self.transferred.append(href.text)
+                responses.append(RESPONSE.format(
+                    href.text,
+                    f'<d:getetag>{escape(etag)}</d:getetag><c:calendar-data>{escape(ical)}</c:calendar-data>'
+                ))
+            return 207, MULTISTATUS.format(''.join(responses))
+
+        if query.tag == '{DAV:}sync-collection' and self.sync_collection:
+            token = query.findtext('{DAV:}sync-token') or ''
+            seen = int(token.rsplit('/', 1)[-1]) if token else 0
+            if token and not token.startswith('http://fake/sync/') or seen > len(self.changes):
+                return 403, '<d:error xmlns:d="DAV:"><d:valid-sync-token/></d:error>'
+
+            responses = []
+            for href in dict.fromkeys(href for calendar, href in self.changes[seen:] if calendar == name):
+                if href in objects:
+                    responses.append(RESPONSE.format(href, f'<d:getetag>{escape(objects[href][0])}</d:getetag>'))
+                else:
+                    responses.append(NOT_FOUND.format(href))
+            sync_token = f'<d:sync-token>http://fake/sync/{len(self.changes)}</d:sync-token>'
+            return 207, MULTISTATUS.format(''.join(responses) + sync_token)
+
+        return 501, ''
+
+
+class FakeCaldavHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status: int, body: str = ''):
+        content = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_PROPFIND(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.lock:
+            self.server.requests.append(('PROPFIND', self.path))
+
+        body = self.server.propfind(self.path, self.headers.get('Depth', '0'))
+        if body is None:
+            return self.reply(404)
+        self.reply(207, body)
+
+    def do_REPORT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.lock:
+            self.server.requests.append(('REPORT', self.path))
+            status, content = self.server.report(self.path, body)
+        self.reply(status, content)
+
+
+@pytest.fixture
+def with_caldav_server():
+    """Runs a local CalDAV server"""
+    server = FakeCaldavServer().start()
+
+    yield server
+
+    server.stop()
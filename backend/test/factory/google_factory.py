@@ -0,0 +1,207 @@
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, UTC
+from email.parser import BytesParser
+from urllib.parse import urlparse, unquote, parse_qs
+
+import httplib2
+import pytest
+
+
+class FakeGoogleServer:
+    """An in-process stand-in for the parts of the Google Calendar API we use. It answers FreeBusy queries, event
+    listing (by time range or sync token), deletes, watches, channel stops and batch requests, while recording
+    every round-trip that reaches it. Like the real thing, it refuses FreeBusy queries and batches that go over the API
+    limits, and sync tokens it doesn't know."""
+
+    FREE_BUSY_LIMIT = 50
+    BATCH_LIMIT = 50
+    PAGE_SIZE = 250
+
+    def __init__(self):
+        # calendar id -> list of {start, end} strings
+        self.busy = {}
+        # calendar id -> event id -> event
+        self.events = {}
+        # Every change as (calendar id, event id), a sync token is the number of changes seen
+        self.changes = []
+        # calendar id -> list of watch request bodies, of the channels that weren't stopped
+        self.channels = {}
+        # One (method, path) per round-trip, batched requests are recorded in batched
+        self.requests = []
+        self.batched = []
+        self.lock = threading.Lock()
+
+    @property
+    def round_trips(self):
+        return len(self.requests)
+
+    def http(self):
+        return FakeGoogleHttp(self)
+
+    def add_event(self, calendar_id, start, end, event_id=None, **fields):
+        event_id = event_id or uuid.uuid4().hex
+        with self.lock:
+            self.events.setdefault(calendar_id, {})[event_id] = {
+                'id': event_id,
+                'status': 'confirmed',
+                'start': {'dateTime': start},
+                'end': {'dateTime': end},
+                **fields,
+            }
+            self.changes.append((calendar_id, event_id))
+        return event_id
+
+    def remove_event(self, calendar_id, event_id):
+        with self.lock:
+            del self.events[calendar_id][event_id]
+            self.changes.append((calendar_id, event_id))
+
+    @staticmethod
+    def as_datetime(value: dict) -> datetime:
+        value = datetime.fromisoformat(value.get('dateTime') or value['date'])
+        return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+    def in_range(self, event, query) -> bool:
+        """Whether the event ends after timeMin and starts before timeMax, if given"""
+        if 'timeMin' in query and self.as_datetime(event['end']) <= datetime.fromisoformat(query['timeMin'][0]):
+            return False
+        if 'timeMax' in query and self.as_datetime(event['start']) >= datetime.fromisoformat(query['timeMax'][0]):
+            return False
+        return True
+
+    def sync(self, calendar_id, query) -> tuple[int, dict]:
+        """Answer an events listing by sync token, everything (in the time range) is sent if there's no token"""
+        sync_token = query.get('syncToken', [''])[0]
+        if sync_token and not sync_token.startswith('sync-') or int(sync_token[5:] or 0) > len(self.changes):
+            return 410, {'error': {'code': 410, 'message': 'Sync token is no longer valid, a full sync is required.'}}
+
+        seen = int(sync_token[5:]) if sync_token else 0
+        events = self.events.get(calendar_id, {})
+        if sync_token:
+            changed = dict.fromkeys(event_id for calendar, event_id in self.changes[seen:] if calendar == calendar_id)
+            items = [events.get(event_id, {'id': event_id, 'status': 'cancelled'}) for event_id in changed]
+        else:
+            items = [event for event in events.values() if self.in_range(event, query)]
+
+        offset = int(query.get('pageToken', [0])[0])
+        page = items[offset:offset + self.PAGE_SIZE]
+        if offset + self.PAGE_SIZE < len(items):
+            return 200, {'items': page, 'nextPageToken': str(offset + self.PAGE_SIZE)}
+        return 200, {'items': page, 'nextSyncToken': f'sync-{len(self.changes)}'}
+
+    def handle(self, method: str, uri: str, body: bytes | None) -> tuple[int, dict | None]:
+        """Answer a single api request, returns the status and json response"""
+        url = urlparse(uri)
+        path = [unquote(part) for part in url.path.split('/') if part]
+        body = json.loads(body) if body else None
+
+        match method, path:
+            case 'POST', ['calendar', 'v3', 'freeBusy']:
+                if len(body['items']) > self.FREE_BUSY_LIMIT:
+                    return 400, {'error': {'code': 400, 'message': 'tooManyCalendarsRequested'}}
+                return 200, {
+                    'calendars': {item['id']: {'busy': self.busy.get(item['id'], [])} for item in body['items']}
+                }
+            case 'GET', ['calendar', 'v3', 'calendars', calendar_id, 'events']:
+                query = parse_qs(url.query)
+                # Only the plain listing is ordered, syncing can't be
+                if 'orderBy' not in query:
+                    return self.sync(calendar_id, query)
+                time_min, time_max = query['timeMin'][0], query['timeMax'][0]
+                items = [
+                    event for event in self.events.get(calendar_id, {}).values()
+                    if time_min <= event['start']['dateTime'] < time_max
+                ]
+                return 200, {'items': items}
+            case 'POST', ['calendar', 'v3', 'calendars', calendar_id, 'events', 'watch']:
+                with self.lock:
+                    self.channels.setdefault(calendar_id, []).append(body)
+                expiration = (time.time() + int(body['params']['ttl'])) * 1000
+                return 200, {
+                    'kind': 'api#channel',
+                    'id': body['id'],
+                    'resourceId': f'resource-{calendar_id}',
+                    'expiration': str(int(expiration)),
+                }
+            case 'POST', ['calendar', 'v3', 'channels', 'stop']:
+                with self.lock:
+                    for calendar_id, channels in self.channels.items():
+                        if body['resourceId'] == f'resource-{calendar_id}':
+                            channels[:] = [channel for channel in channels if channel['id'] != body['id']]
+                return 204, None
+            case 'DELETE', ['calendar', 'v3', 'calendars', calendar_id, 'events', event_id]:
+                with self.lock:
+                    if self.events.get(calendar_id, {}).pop(event_id, None) is None:
+                        return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+                    self.changes.append((calendar_id, event_id))
+                return 204, None
+
+        return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+
+    def handle_batch(self, content_type: str, body: bytes) -> tuple[int, dict, bytes]:
+        """Answer a multipart/mixed batch request, each part holds a complete http request"""
+        message = BytesParser().parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+        parts = message.get_payload()
+        if len(parts) > self.BATCH_LIMIT:
+            return 400, {'content-type': 'application/json'}, b'{"error": {"code": 400}}'
+
+        boundary = f'batch_{uuid.uuid4().hex}'
+        response = b''
+        for part in parts:
+            request = part.get_payload(decode=False).replace('\r\n', '\n')
+            head, _, part_body = request.partition('\n\n')
+            method, path, _ = head.split('\n')[0].split(' ')
+            status, data = self.handle(method, f'https://www.googleapis.com{path}', part_body.encode() or None)
+            with self.lock:
+                self.batched.append((method, urlparse(path).path))
+
+            content = json.dumps(data) if data is not None else ''
+            response += (
+                f'--{boundary}\r\n'
+                f'Content-Type: application/http\r\n'
+                f'Content-ID: <response-{part["Content-ID"][1:-1]}>\r\n\r\n'
+                f'HTTP/1.1 {status} {"OK" if status < 400 else "Error"}\r\n'
+                f'Content-Type: application/json\r\n\r\n'
+                f'{content}\r\n'
+            ).encode()
+        response += f'--{boundary}--\r\n'.encode()
+
+        return 200, {'content-type': f'multipart/mixed; boundary={boundary}'}, response
+
+
+class FakeGoogleHttp:
+    """Just enough of httplib2.Http to send requests to a FakeGoogleServer"""
+
+    def __init__(self, server: FakeGoogleServer):
+        self.server = server
+        self.connections = {}
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        headers = headers or {}
+        body = body.encode() if isinstance(body, str) else body
+
+        with self.server.lock:
+            self.server.requests.append((method, urlparse(uri).path))
+
+        if urlparse(uri).path.startswith('/batch/'):
+            status, response_headers, content = self.server.handle_batch(headers['content-type'], body)
+        else:
+            status, data = self.server.handle(method, uri, body)
+            response_headers = {'content-type': 'application/json'}
+            content = json.dumps(data).encode() if data is not None else b''
+
+        return httplib2.Response({'status': str(status), **response_headers}), content
+
+
+@pytest.fixture
+def with_fake_google(monkeypatch):
+    """Points the google client at an in-process fake of the Google Calendar API"""
+    from appointment.controller.apis import google_client
+
+    server = FakeGoogleServer()
+    monkeypatch.setattr(google_client, 'get_http', server.http)
+
+    return server
@@ -0,0 +1,144 @@
+import fnmatch
+import time
+
+import pytest
+
+
+def parse_score(bound):
+    """Returns (score, exclusive) for a redis score bound like 5, '(5', '-inf' or '+inf'"""
+    if isinstance(bound, str) and bound.startswith('('):
+        return float(bound[1:]), True
+    return float(bound), False
+
+
+class FakeRedis:
+    """An in-memory stand-in for the parts of redis we use: strings, hashes and sorted sets with expiry, and
+    pipelines. Values are kept as given, like decode_responses would."""
+
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+
+    def _get(self, key, default=None):
+        if key in self.expires and self.expires[key] <= time.time():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return self.values.get(key, default)
+
+    # Keys
+    def exists(self, *keys):
+        return sum(self._get(key) is not None for key in keys)
+
+    def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            deleted += self._get(key) is not None
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return deleted
+
+    def expire(self, key, seconds):
+        if self._get(key) is None:
+            return False
+        self.expires[key] = time.time() + int(seconds)
+        return True
+
+    def scan(self, cursor=0, match=None, count=None):
+        return 0, [key for key in list(self.values) if self._get(key) is not None and fnmatch.fnmatch(key, match)]
+
+    # Strings
+    def get(self, key):
+        return self._get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.expires.pop(key, None)
+        if ex:
+            self.expire(key, ex)
+        return True
+
+    def incr(self, key, amount=1):
+        self.values[key] = str(int(self._get(key, 0)) + amount)
+        return int(self.values[key])
+
+    # Hashes
+    def hget(self, key, field):
+        return self._get(key, {}).get(field)
+
+    def hmget(self, key, *fields):
+        return [self._get(key, {}).get(field) for field in fields]
+
+    def hgetall(self, key):
+        return dict(self._get(key, {}))
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        values = self.values.setdefault(key, self._get(key, {}))
+        values.update(mapping or {field: value})
+
+    def hkeys(self, key):
+        return list(self._get(key, {}))
+
+    def hincrby(self, key, field, amount=1):
+        values = self.values.setdefault(key, self._get(key, {}))
+        values[field] = str(int(values.get(field, 0)) + amount)
+        return int(values[field])
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self._get(key, {}).pop(field, None)
+
+    # Sorted sets
+    def zadd(self, key, mapping):
+        values = self.values.setdefault(key, self._get(key, {}))
+        added = len(set(mapping) - set(values))
+        values.update({member: float(score) for member, score in mapping.items()})
+        return added
+
+    def zrem(self, key, *members):
+        values = self._get(key, {})
+        return sum(values.pop(member, None) is not None for member in members)
+
+    def zrangebyscore(self, key, min, max):
+        (low, low_exclusive), (high, high_exclusive) = parse_score(min), parse_score(max)
+        return [
+            member for member, score in sorted(self._get(key, {}).items(), key=lambda item: (item[1], item[0]))
+            if (score > low if low_exclusive else score >= low) and (score < high if high_exclusive else score <= high)
+        ]
+
+    def zremrangebyscore(self, key, min, max):
+        members = self.zrangebyscore(key, min, max)
+        return self.zrem(key, *members) if members else 0
+
+    def zcard(self, key):
+        return len(self._get(key, {}))
+
+    # Pipelines
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Runs each command as it comes, and hands back their results on execute"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, name)
+
+        def queue(*args, **kwargs):
+            self.results.append(command(*args, **kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+
+@pytest.fixture
+def with_fake_redis():
+    """An in-memory redis"""
+    return FakeRedis()
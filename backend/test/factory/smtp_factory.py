@@ -0,0 +1,105 @@
+import socket
+import socketserver
+import threading
+from email import message_from_bytes
+
+import pytest
+
+
+class DebuggingSmtpServer(socketserver.ThreadingTCPServer):
+    """A bare-bones local smtp server that keeps every message it receives in memory.
+    Recipients containing 'reject' are refused, and drop_connections() hangs up on every connected client."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), DebuggingSmtpHandler)
+        self.messages = []
+        self.connections = 0
+        self._sockets = set()
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.drop_connections()
+        self.server_close()
+
+    def drop_connections(self):
+        with self._lock:
+            for sock in self._sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._sockets.clear()
+
+
+class DebuggingSmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        with self.server._lock:
+            self.server.connections += 1
+            self.server._sockets.add(self.connection)
+
+        self.reply('220 localhost debugging smtp server')
+        recipients = []
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb in ('MAIL', 'RSET'):
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                if 'reject' in command:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(command[command.index(':') + 1 :].strip(' <>'))
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = b''
+                while (data_line := self.rfile.readline()) not in (b'.\r\n', b''):
+                    data += data_line
+                with self.server._lock:
+                    self.server.messages.append((recipients, message_from_bytes(data)))
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                break
+            else:
+                self.reply('502 Command not implemented')
+
+
+@pytest.fixture
+def with_smtp_server(monkeypatch):
+    """Runs a local debugging smtp server and points the mailer at it"""
+    from appointment.controller import mailer
+
+    server = DebuggingSmtpServer().start()
+
+    monkeypatch.setenv('SMTP_SECURITY', 'NONE')
+    monkeypatch.setenv('SMTP_URL', '127.0.0.1')
+    monkeypatch.setenv('SMTP_PORT', str(server.port))
+    mailer.close_smtp_pool()
+
+    yield server
+
+    mailer.close_smtp_pool()
+    server.stop()
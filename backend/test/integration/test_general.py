@@ -1,5 +1,7 @@
+import logging
 import os
 import pytest
+from unittest import mock
 from defines import DAY1, DAY5, auth_headers
 
 
@@ -19,6 +21,27 @@ class TestGeneral:
         response = with_client.get('/abcdefg')
         assert response.status_code == 404
 
+    def test_health_logs_pool_stats(self, with_client, caplog):
+        stats = {'status': 'Pool size: 5', 'checked_out': 1}
+        redis_stats = {'max_connections': None, 'created': 2, 'available': 1, 'in_use': 1}
+        with (
+            mock.patch('appointment.routes.api.get_database_pool_stats', return_value=stats),
+            mock.patch('appointment.routes.api.get_redis_pool_stats', return_value={0: redis_stats}),
+        ):
+            # Not on every probe...
+            with caplog.at_level(logging.INFO):
+                response = with_client.get('/')
+            assert response.status_code == 200
+            assert not any('connection pool' in message for message in caplog.messages)
+
+            # ...only when debugging
+            with caplog.at_level(logging.DEBUG):
+                response = with_client.get('/')
+
+        assert response.status_code == 200
+        assert f'Database connection pool: {stats}' in caplog.messages
+        assert f'Redis connection pool (db 0): {redis_stats}' in caplog.messages
+
     def test_health_for_locale(self, with_client):
         # Try english first
         response = with_client.get('/', headers={'accept-language': 'en'})
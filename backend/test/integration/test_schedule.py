@@ -1,3 +1,4 @@
+import time as pytime
 import zoneinfo
 from datetime import date, time, datetime, timedelta, timezone, UTC
 from unittest.mock import patch
@@ -7,11 +8,14 @@ from freezegun import freeze_time
 
 from appointment import defines
 from appointment.tasks import emails as email_tasks
+from appointment.controller import availability
 from appointment.controller.auth import signed_url_by_subscriber
 from appointment.controller.calendar import CalDavConnector
 from appointment.database import schemas, models, repo
+from appointment.dependencies.database import get_redis
 from appointment.exceptions import validation
-from defines import DAY1, DAY5, DAY14, auth_headers, DAY2
+from defines import DAY1, DAY5, DAY14, TEST_USER_ID, auth_headers, DAY2
+from factory.redis_factory import FakeRedis
 
 
 class TestSchedule:
@@ -241,6 +245,21 @@ class TestSchedule:
         assert weekdays == [2, 4, 6]
         assert data['slot_duration'] == 60
 
+    def test_update_drops_availability_snapshot(self, with_client, make_schedule, schedule_input):
+        generated_schedule = make_schedule()
+        redis = FakeRedis()
+        redis.hset(availability.get_key(TEST_USER_ID), mapping={'meta': 'snapshot'})
+        with_client.app.dependency_overrides[get_redis] = lambda: redis
+
+        response = with_client.put(
+            f'/schedule/{generated_schedule.id}',
+            json={**schedule_input, 'calendar_id': generated_schedule.calendar_id},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200, response.text
+        assert not redis.exists(availability.get_key(TEST_USER_ID))
+
     def test_update_existing_schedule_with_html(self, with_client, make_schedule):
         generated_schedule = make_schedule()
 
@@ -678,7 +697,10 @@ class TestRequestScheduleAvailability:
             attendee=schemas.AttendeeBase(email='hello@example.org', name='Greg', timezone='Europe/Berlin'),
         ).model_dump(mode='json')
 
-        with patch('fastapi.BackgroundTasks.add_task') as mock:
+        with (
+            patch('fastapi.BackgroundTasks.add_task') as mock,
+            patch('appointment.controller.availability.invalidate_slot') as invalidate_slot,
+        ):
             # Check availability at the start of the schedule
             # This should work
             response = with_client.put(
@@ -701,6 +723,9 @@ class TestRequestScheduleAvailability:
                 slot = repo.slot.get(db, slot_id)
                 assert slot.appointment_id
 
+            # The slot's days were dropped from the availability snapshot when it was requested, and again when booked
+            assert invalidate_slot.call_count == 2
+
             # Ensure we sent out an invite email and a new booking email
             assert mock.call_count == 2
             send_invite_email_call, send_new_booking_email_call = mock.call_args_list
@@ -709,6 +734,30 @@ class TestRequestScheduleAvailability:
             assert email_tasks.send_invite_email in send_invite_email_call[0]
             assert email_tasks.send_new_booking_email in send_new_booking_email_call[0]
 
+    def test_fail_on_slow_calendar(self, monkeypatch, with_client, mock_connector, setup_schedule):
+        """Ensure we don't book over busy time we couldn't check because a calendar didn't answer in time"""
+        monkeypatch.setenv('REMOTE_CALENDAR_TIMEOUT', '0.1')
+
+        def get_busy_time(self, calendar_ids, start, end):
+            pytime.sleep(0.5)
+            return []
+
+        monkeypatch.setattr(CalDavConnector, 'get_busy_time', get_busy_time)
+
+        slot_availability = schemas.AvailabilitySlotAttendee(
+            slot=schemas.SlotBase(start=datetime.combine(self.start_date, self.start_time), duration=30),
+            attendee=schemas.AttendeeBase(email='hello@example.org', name='Greg', timezone='Europe/Berlin'),
+        ).model_dump(mode='json')
+
+        response = with_client.put(
+            '/schedule/public/availability/request',
+            json={'s_a': slot_availability, 'url': self.signed_url},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 400, response.text
+        assert response.json()['detail']['id'] == validation.RemoteCalendarConnectionError.id_code
+
     def test_fail_not_utc(self, with_client, mock_connector, setup_schedule):
         """Ensure we fail validation because we submitted a non-utc booking time"""
         booking_time = datetime.combine(self.start_date, self.start_time, tzinfo=zoneinfo.ZoneInfo('America/Vancouver'))
@@ -9,7 +9,7 @@ from unittest.mock import patch
 from appointment.exceptions.validation import APIRateLimitExceeded
 from appointment.routes import waiting_list
 from appointment.routes.waiting_list import WaitingListAction
-from appointment.tasks.emails import send_invite_account_email
+from appointment.tasks.emails import send_invite_account_emails
 from defines import auth_headers
 
 
@@ -357,11 +357,15 @@ class TestWaitingListAdminInvite:
             # Ensure we sent out an email
             mock.assert_called_once()
             # Triple access D:, one for ArgList, one for Call<Function, Args...>), and then the function is in a tuple?!
-            assert mock.call_args_list[0][0][0] == send_invite_account_email
+            assert mock.call_args_list[0][0][0] == send_invite_account_emails
             assert mock.call_args_list[0].kwargs == {
-                'date': waiting_list_user.time_created,
-                'lang': 'en',
-                'to': waiting_list_user.email,
+                'invites': [
+                    {
+                        'date': waiting_list_user.time_created,
+                        'lang': 'en',
+                        'to': waiting_list_user.email,
+                    }
+                ]
             }
 
         with with_db() as db:
@@ -393,8 +397,11 @@ class TestWaitingListAdminInvite:
             for i, id in enumerate(waiting_list_users):
                 assert data['accepted'][i] == id
 
-            # Ensure we sent out an email
-            mock.assert_called()
+            # Ensure we sent out all emails in one batch
+            mock.assert_called_once()
+            assert mock.call_args_list[0][0][0] == send_invite_account_emails
+            invites = mock.call_args_list[0].kwargs['invites']
+            assert len(invites) == len(waiting_list_users)
 
             with with_db() as db:
                 for i, id in enumerate(waiting_list_users):
@@ -405,8 +412,7 @@ class TestWaitingListAdminInvite:
                     assert waiting_list_user.invite.subscriber_id
                     assert waiting_list_user.invite.subscriber.email == waiting_list_user.email
 
-                    assert mock.call_args_list[i][0][0] == send_invite_account_email
-                    assert mock.call_args_list[i].kwargs == {
+                    assert invites[i] == {
                         'date': waiting_list_user.time_created,
                         'lang': 'en',
                         'to': waiting_list_user.email,
@@ -457,12 +463,18 @@ class TestWaitingListAdminInvite:
             assert len(data['accepted']) == len(waiting_list_users) - 1
             assert len(data['errors']) == 1
 
+            # Ensure we sent out all emails in one batch
+            mock.assert_called_once()
+            assert mock.call_args_list[0][0][0] == send_invite_account_emails
+            invites = mock.call_args_list[0].kwargs['invites']
+            assert len(invites) == len(waiting_list_users) - 1
+
             for i, id in enumerate(waiting_list_users):
                 # Last entry was an error!
                 if i == 10:
-                    # Should be in the error list, and it shouldn't have called add_task
+                    # Should be in the error list, and it shouldn't have been invited
                     assert sub.email in data['errors'][0]
-                    assert i not in mock.call_args_list
+                    assert sub.email not in [invite['to'] for invite in invites]
                 else:
                     assert data['accepted'][i] == id
 
@@ -470,8 +482,7 @@ class TestWaitingListAdminInvite:
                         waiting_list_user = db.query(models.WaitingList).filter(models.WaitingList.id == id).first()
 
                         assert waiting_list_user
-                        assert mock.call_args_list[i][0][0] == send_invite_account_email
-                        assert mock.call_args_list[i].kwargs == {
+                        assert invites[i] == {
                             'date': waiting_list_user.time_created,
                             'lang': 'en',
                             'to': waiting_list_user.email,
@@ -1,13 +1,17 @@
 import datetime
+import json
 import os
 
 import pytest
 from freezegun import freeze_time
+from appointment import utils
 from appointment.database import models, repo
+from appointment.dependencies.database import get_redis
 from appointment.database.models import ExternalConnectionType
 
 from appointment.dependencies.fxa import get_webhook_auth
 from defines import FXA_CLIENT_PATCH
+from factory.redis_factory import FakeRedis
 
 
 class TestFXAWebhooks:
@@ -319,3 +323,40 @@ class TestZoomWebhooks:
 
             assert subscriber
             assert external_connection
+
+
+class TestGoogleWebhooks:
+    @pytest.fixture
+    def redis(self, with_client):
+        channel = utils.encrypt(json.dumps({'key': 'google_mirror:abc:def', 'token': 'channel-token'}))
+        redis = FakeRedis()
+        redis.set('google_channel:channel-id', channel)
+        redis.hset('google_mirror:abc:def', 'meta', 'encrypted-meta')
+        with_client.app.dependency_overrides[get_redis] = lambda: redis
+        return redis
+
+    def notify(self, client, channel_id='channel-id', token='channel-token', state='exists'):
+        return client.post(
+            '/webhooks/google-calendar',
+            headers={
+                'x-goog-channel-id': channel_id,
+                'x-goog-channel-token': token,
+                'x-goog-resource-state': state,
+                'x-goog-resource-id': 'resource-id',
+            },
+        )
+
+    def test_notification_marks_mirror_dirty(self, with_client, redis):
+        response = self.notify(with_client, state='sync')
+        assert response.status_code == 200, response.text
+        assert redis.hget('google_mirror:abc:def', 'dirty') is None
+
+        response = self.notify(with_client)
+        assert response.status_code == 200, response.text
+        assert redis.hget('google_mirror:abc:def', 'dirty') == '1'
+
+    @pytest.mark.parametrize('channel_id,token', [('channel-id', 'wrong-token'), ('unknown', 'channel-token')])
+    def test_unknown_channel_is_ignored(self, with_client, redis, channel_id, token):
+        response = self.notify(with_client, channel_id, token)
+        assert response.status_code == 200, response.text
+        assert redis.hget('google_mirror:abc:def', 'dirty') is None
@@ -0,0 +1,132 @@
+"""Reference implementations of calendar tools we've since optimised, the tests compare the current ones against
+these and so do the benchmarks (see test/benchmark)."""
+
+import json
+import zoneinfo
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+
+from appointment.database import schemas
+from appointment.database.models import BookingStatus
+
+
+def legacy_events_roll_up_difference(
+    a_list: list[schemas.SlotBase], b_list: list[schemas.Event]
+) -> list[schemas.SlotBase]:
+    """The previous O(slots x events) implementation, kept around for comparison"""
+
+    def is_blocker(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datetime):
+        return a_start.timestamp() < b_end.timestamp() and a_end.timestamp() > b_start.timestamp()
+
+    available_slots = []
+    collisions = []
+
+    for slot in a_list:
+        slot_start = slot.start
+        slot_end = slot.start + timedelta(minutes=slot.duration)
+
+        if any([is_blocker(slot_start, slot_end, event.start, event.end) for event in b_list]):
+            previous_collision_end = (
+                collisions[-1].start + timedelta(minutes=collisions[-1].duration) if len(collisions) else None
+            )
+
+            if previous_collision_end and previous_collision_end.timestamp() == slot_start.timestamp():
+                collisions[-1].duration += slot.duration
+            else:
+                collisions.append(
+                    schemas.SlotBase(start=slot_start, duration=slot.duration, booking_status=BookingStatus.booked)
+                )
+        else:
+            available_slots.append(slot)
+
+    available_slots = available_slots + collisions
+
+    return sorted(available_slots, key=lambda slot: slot.start.timestamp())
+
+
+def legacy_available_slots_from_schedule(schedule) -> list[schemas.SlotBase]:
+    """The previous one model per slot implementation, kept around for comparison"""
+    slots = []
+
+    now = datetime.now()
+
+    subscriber = schedule.calendar.owner
+    timezone = zoneinfo.ZoneInfo(subscriber.timezone)
+
+    now_tz = datetime.now(tz=timezone)
+    not_tz_midnight = now_tz.replace(hour=0, minute=0, second=0, microsecond=0)
+    now_tz_total_seconds = now_tz.timestamp() - not_tz_midnight.timestamp()
+
+    start_time_local = schedule.start_time_local
+    end_time_local = schedule.end_time_local
+
+    earliest_booking = now + timedelta(minutes=schedule.earliest_booking)
+    farthest_booking = now + timedelta(days=1, minutes=schedule.farthest_booking)
+
+    schedule_start = max([datetime.combine(schedule.start_date, start_time_local), earliest_booking])
+    schedule_end = (
+        min([datetime.combine(schedule.end_date, end_time_local), farthest_booking])
+        if schedule.end_date
+        else farthest_booking
+    )
+
+    start_time = datetime.combine(now.min, start_time_local) - datetime.min
+    end_time = datetime.combine(now.min, end_time_local) - datetime.min
+
+    if start_time > end_time:
+        end_time += timedelta(days=1)
+
+    weekdays = schedule.weekdays if isinstance(schedule.weekdays, list) else json.loads(schedule.weekdays)
+    if not weekdays or len(weekdays) == 0:
+        weekdays = [1, 2, 3, 4, 5]
+
+    total_time = int(end_time.total_seconds()) - int(start_time.total_seconds())
+
+    slot_duration_seconds = schedule.slot_duration * 60
+
+    for ordinal in range(schedule_start.toordinal(), schedule_end.toordinal()):
+        time_start = 0
+
+        if now_tz.toordinal() == ordinal and now_tz_total_seconds > start_time.total_seconds():
+            time_start = int(now_tz_total_seconds - start_time.total_seconds())
+            time_start -= time_start % slot_duration_seconds
+            time_start += slot_duration_seconds
+
+        date = datetime.fromordinal(ordinal)
+        current_datetime = datetime(
+            year=date.year,
+            month=date.month,
+            day=date.day,
+            hour=start_time_local.hour,
+            minute=start_time_local.minute,
+            tzinfo=timezone,
+        )
+        if current_datetime.isoweekday() in weekdays:
+            slots += [
+                schemas.SlotBase(start=current_datetime + timedelta(seconds=time), duration=schedule.slot_duration)
+                for time in range(time_start, total_time, slot_duration_seconds)
+            ]
+
+    return slots
+
+
+def make_schedule_stand_in(
+    timezone='UTC',
+    start_time=time(9),
+    end_time=time(17),
+    slot_duration=10,
+    farthest_booking=60 * 24 * 182,
+    weekdays=(1, 2, 3, 4, 5),
+):
+    """A stand-in for models.Schedule with just the fields slot generation needs"""
+    return SimpleNamespace(
+        calendar=SimpleNamespace(owner=SimpleNamespace(timezone=timezone)),
+        start_time_local=start_time,
+        end_time_local=end_time,
+        start_date=date(2000, 1, 1),
+        end_date=None,
+        earliest_booking=60,
+        farthest_booking=farthest_booking,
+        weekdays=list(weekdays),
+        slot_duration=slot_duration,
+    )
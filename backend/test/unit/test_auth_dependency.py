@@ -8,6 +8,8 @@ from unittest import mock
 
 from starlette.requests import Request
 
+from appointment import utils
+from appointment.controller import auth
 from appointment.controller.auth import signed_url_by_subscriber
 from appointment.database import repo, models
 from appointment.defines import REDIS_USER_SESSION_PROFILE_KEY
@@ -203,3 +205,137 @@ class TestAuthDependency:
 
         assert retrieved_subscriber.id == subscriber.id
         assert retrieved_subscriber.email == subscriber.email
+
+
+class TestAuthCache:
+    def test_token_check_is_cached(self, with_db, with_l10n, make_pro_subscriber, with_fake_redis):
+        redis = with_fake_redis
+        subscriber = make_pro_subscriber()
+        access_token = create_access_token(data={'sub': f'uid-{subscriber.id}'})
+
+        with with_db() as db:
+            assert get_user_from_token(db, access_token, redis_instance=redis).id == subscriber.id
+            assert auth.get_cached_validity(subscriber.id, redis) == (None, False)
+
+            # A deleted subscriber still gets through until the cache expires
+            subscriber = repo.subscriber.get(db, subscriber.id)
+            subscriber.time_deleted = datetime.datetime.now(datetime.UTC)
+            db.add(subscriber)
+            db.commit()
+            assert get_user_from_token(db, access_token, redis_instance=redis).id == subscriber.id
+
+            # The cached check is honoured
+            redis.set(
+                f'auth_subscriber:{utils.obscure_key(subscriber.id)}', json.dumps({'iat': None, 'deleted': True})
+            )
+            with pytest.raises(InvalidTokenException):
+                get_user_from_token(db, access_token, redis_instance=redis)
+
+    def test_disabled_cache(self, with_db, with_l10n, make_pro_subscriber, with_fake_redis, monkeypatch):
+        monkeypatch.setenv('AUTH_CACHE_TTL', '0')
+        subscriber = make_pro_subscriber()
+        access_token = create_access_token(data={'sub': f'uid-{subscriber.id}'})
+
+        with with_db() as db:
+            assert get_user_from_token(db, access_token, redis_instance=with_fake_redis)
+        assert with_fake_redis.values == {}
+
+    def test_one_time_token_is_not_cached(self, with_db, with_l10n, make_pro_subscriber, with_fake_redis):
+        redis = with_fake_redis
+        subscriber = make_pro_subscriber()
+        access_token = create_access_token(data={'sub': f'uid-{subscriber.id}', 'jti': 'abc'})
+
+        with with_db() as db:
+            auth.put_cached_validity(subscriber, redis)
+
+            # The one-time token is checked against the database, and drops the cached check it outdates
+            subscriber = get_user_from_token(db, access_token, require_jti=True, redis_instance=redis)
+            assert subscriber.minimum_valid_iat_time is not None
+            assert redis.values == {}
+
+    def test_invalidated_on_change(self, with_db, with_l10n, make_pro_subscriber, with_fake_redis, monkeypatch):
+        redis = with_fake_redis
+        monkeypatch.setattr('appointment.controller.auth.get_redis', lambda: redis)
+        subscriber = make_pro_subscriber()
+        access_token = create_access_token(data={'sub': f'uid-{subscriber.id}'})
+
+        with with_db() as db:
+            get_user_from_token(db, access_token)
+            assert auth.get_cached_validity(subscriber.id) is not None
+
+            subscriber = repo.subscriber.disable(db, repo.subscriber.get(db, subscriber.id))
+            assert auth.get_cached_validity(subscriber.id) is None
+
+            auth.put_cached_validity(subscriber)
+            repo.subscriber.enable(db, subscriber)
+            assert auth.get_cached_validity(subscriber.id) is None
+
+            auth.put_cached_validity(subscriber)
+            auth.put_cached_session('abc123', subscriber.id)
+            auth.logout(db, subscriber, None, deny_previous_tokens=False, session_id='abc123')
+            assert auth.get_cached_validity(subscriber.id) is None
+            assert auth.get_cached_session('abc123') is None
+
+    def test_cache_hit_skips_the_database(self, with_db, with_l10n, make_pro_subscriber, with_fake_redis):
+        redis = with_fake_redis
+        subscriber = make_pro_subscriber()
+        access_token = create_access_token(data={'sub': f'uid-{subscriber.id}'})
+
+        with with_db() as db:
+            get_user_from_token(db, access_token, redis_instance=redis)
+
+        with with_db() as db:
+            with mock.patch.object(repo.subscriber, 'get', side_effect=AssertionError):
+                cached_subscriber = get_user_from_token(db, access_token, redis_instance=redis)
+            assert cached_subscriber.id == subscriber.id
+
+            # Its columns are still there once they're needed
+            assert cached_subscriber.email == subscriber.email
+
+    def test_rejected_after_disable_or_logout(self, with_db, with_l10n, make_pro_subscriber, with_fake_redis,
+                                              monkeypatch):
+        redis = with_fake_redis
+        monkeypatch.setattr('appointment.controller.auth.get_redis', lambda: redis)
+        subscriber = make_pro_subscriber()
+
+        # All within the same cache ttl
+        with freeze_time('Jan 9th 2024 10:00:00'):
+            access_token = create_access_token(data={'sub': f'uid-{subscriber.id}'})
+
+        with freeze_time('Jan 9th 2024 10:00:10'):
+            with with_db() as db:
+                assert get_user_from_token(db, access_token)
+                repo.subscriber.disable(db, repo.subscriber.get(db, subscriber.id))
+                with pytest.raises(InvalidTokenException):
+                    get_user_from_token(db, access_token)
+
+                repo.subscriber.enable(db, repo.subscriber.get(db, subscriber.id))
+
+        with freeze_time('Jan 9th 2024 10:00:20'):
+            access_token = create_access_token(data={'sub': f'uid-{subscriber.id}'})
+
+        with freeze_time('Jan 9th 2024 10:00:30'):
+            with with_db() as db:
+                assert get_user_from_token(db, access_token)
+                auth.logout(db, repo.subscriber.get(db, subscriber.id), None)
+                with pytest.raises(InvalidTokenException):
+                    get_user_from_token(db, access_token)
+
+    def test_accounts_session_is_cached(self, with_db, with_l10n, make_pro_subscriber, with_fake_redis):
+        subscriber = make_pro_subscriber()
+        request = Request({'type': 'http', 'session': {'accounts_session': 'abc123'}})
+        auth.put_cached_session('abc123', subscriber.id, with_fake_redis)
+        auth.put_cached_validity(subscriber, with_fake_redis)
+
+        # Neither the shared redis nor the database are touched
+        with mock.patch('appointment.dependencies.auth.get_shared_redis', side_effect=AssertionError):
+            with with_db() as db:
+                with mock.patch.object(repo.subscriber, 'get', side_effect=AssertionError):
+                    assert get_user_from_accounts_session(request, db, with_fake_redis).id == subscriber.id
+
+        # Once the subscriber's entry is dropped the session is looked up again
+        auth.invalidate_cached_auth(subscriber.id, redis_instance=with_fake_redis)
+        with mock.patch('appointment.dependencies.auth.get_shared_redis', side_effect=AssertionError):
+            with with_db() as db:
+                with pytest.raises(AssertionError):
+                    get_user_from_accounts_session(request, db, with_fake_redis)
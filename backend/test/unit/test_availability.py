@@ -0,0 +1,64 @@
+from datetime import date, datetime, UTC
+from unittest import mock
+
+from appointment.controller import availability
+
+
+class FakeRedis:
+    """Just enough of a redis hash for the availability snapshot"""
+
+    def __init__(self):
+        self.store = {}
+
+    def hmget(self, key, *fields):
+        return [self.store.get(key, {}).get(field) for field in fields]
+
+    def hset(self, key, mapping):
+        self.store.setdefault(key, {}).update(mapping)
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.store.get(key, {}).pop(field, None)
+
+    def delete(self, key):
+        self.store.pop(key, None)
+
+    def expire(self, key, seconds):
+        pass
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+
+class TestAvailabilitySnapshot:
+    def test_utc_days(self):
+        start = datetime(2025, 1, 1, 22, tzinfo=UTC).timestamp()
+        assert availability.utc_days(start, start + 3600) == [date(2025, 1, 1)]
+        assert availability.utc_days(start, start + 2 * 3600) == [date(2025, 1, 1)]
+        assert availability.utc_days(start, start + 3 * 3600) == [date(2025, 1, 1), date(2025, 1, 2)]
+
+    def test_snapshot_round_trip(self):
+        redis = FakeRedis()
+        schedule = mock.Mock(id=1, time_updated=datetime(2025, 1, 1, tzinfo=UTC))
+        calendars = [mock.Mock(id=2), mock.Mock(id=3)]
+        days = [date(2025, 1, 1), date(2025, 1, 2)]
+        busy = [(1735722000.0, 1735725600.0)]
+
+        snapshot = availability.AvailabilitySnapshot(redis, 1, schedule, calendars)
+        assert snapshot.get_days(days) == {days[0]: None, days[1]: None}
+
+        snapshot.put_days({days[0]: busy, days[1]: []})
+        assert snapshot.get_days(days) == {days[0]: busy, days[1]: []}
+
+        # Dropping a single day keeps the rest of the snapshot
+        availability.invalidate(1, [days[0]], redis_instance=redis)
+        assert snapshot.get_days(days) == {days[0]: None, days[1]: []}
+
+        # A changed schedule voids the snapshot
+        schedule.time_updated = datetime(2025, 1, 2, tzinfo=UTC)
+        updated_snapshot = availability.AvailabilitySnapshot(redis, 1, schedule, calendars)
+        assert updated_snapshot.get_days(days) == {days[0]: None, days[1]: None}
+        assert updated_snapshot.outdated
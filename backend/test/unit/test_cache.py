@@ -1,6 +1,23 @@
 import datetime
+import json
+import time
+import uuid
+from unittest import mock
 
-from appointment.database.schemas import Event
+import pytest
+
+from appointment import utils
+from appointment.controller.calendar import (
+    BaseConnector,
+    uncovered_ranges,
+    pack_events,
+    unpack_rows,
+    row_event,
+    CACHED_RANGES_FIELD,
+    ENVELOPE_ZLIB,
+    EVENT_CACHE_FORMAT,
+)
+from appointment.database.schemas import Event, EventLocation
 
 
 class TestEncrypt:
@@ -27,3 +44,213 @@ class TestEncrypt:
         # Ensure individual accessors are not encrypted
         assert new_event_cached.title == title
         assert new_event_cached.description == description
+
+
+class RecordingConnector(BaseConnector):
+    """A connector with a fixed set of remote events, that remembers which ranges it was asked for"""
+
+    def __init__(self, redis_instance, events):
+        super().__init__(subscriber_id=1, calendar_id=1, redis_instance=redis_instance)
+        self.remote_events = events
+        self.fetched = []
+
+    def fetch_events(self, ranges):
+        self.fetched += ranges
+        return [
+            [event for event in self.remote_events if event.start < end and event.end > start]
+            for start, end in ranges
+        ]
+
+
+def make_event(title, start, hours=1):
+    return Event(title=title, start=start, end=start + datetime.timedelta(hours=hours))
+
+
+class TestEventCache:
+    @pytest.fixture
+    def connector(self, with_fake_redis):
+        return RecordingConnector(with_fake_redis, [
+            make_event('Monday', datetime.datetime(2025, 1, 6, 9)),
+            make_event('Overnight', datetime.datetime(2025, 1, 7, 20), hours=8),
+            make_event('Friday', datetime.datetime(2025, 1, 10, 9)),
+            make_event('Next week', datetime.datetime(2025, 1, 14, 9)),
+        ])
+
+    def titles(self, events):
+        return [event.title for event in events]
+
+    def test_shifted_windows_only_fetch_gaps(self, connector):
+        assert self.titles(connector.list_events('2025-01-06', '2025-01-09')) == ['Monday', 'Overnight']
+        assert connector.fetched == [(datetime.datetime(2025, 1, 6), datetime.datetime(2025, 1, 9))]
+
+        # Inside what we've got, nothing to fetch
+        connector.fetched.clear()
+        assert self.titles(connector.list_events('2025-01-07', '2025-01-08')) == ['Overnight']
+        assert connector.fetched == []
+
+        # The window moved along, only the new days are fetched
+        assert self.titles(connector.list_events('2025-01-08', '2025-01-15')) == ['Overnight', 'Friday', 'Next week']
+        assert connector.fetched == [(datetime.datetime(2025, 1, 9), datetime.datetime(2025, 1, 15))]
+
+        # Gaps on either side of what we have
+        connector.fetched.clear()
+        assert self.titles(connector.list_events('2025-01-05', '2025-01-16')) == [
+            'Monday', 'Overnight', 'Friday', 'Next week'
+        ]
+        assert connector.fetched == [
+            (datetime.datetime(2025, 1, 5), datetime.datetime(2025, 1, 6)),
+            (datetime.datetime(2025, 1, 15), datetime.datetime(2025, 1, 16)),
+        ]
+
+    def test_refetched_ranges_replace_cached_events(self, connector, with_fake_redis):
+        connector.list_events('2025-01-06', '2025-01-12')
+
+        # Moved on the remote calendar, and our cache for these days ran out
+        connector.remote_events[0] = make_event('Monday moved', datetime.datetime(2025, 1, 6, 14))
+        connector.put_cached_events(
+            datetime.datetime(2025, 1, 6), datetime.datetime(2025, 1, 7), connector.remote_events[:1]
+        )
+
+        assert self.titles(connector.list_events('2025-01-06', '2025-01-12')) == ['Monday moved', 'Overnight', 'Friday']
+        # The first envelope still covers the rest of the week
+        key = connector.get_cached_key()
+        assert len(with_fake_redis.hkeys(key)) == 3
+
+        # ...until that's replaced as well
+        connector.put_cached_events(
+            datetime.datetime(2025, 1, 6), datetime.datetime(2025, 1, 12), connector.remote_events[:3]
+        )
+        assert len(with_fake_redis.hkeys(key)) == 2
+
+    def test_expired_ranges_are_fetched_again(self, connector, monkeypatch):
+        monkeypatch.setenv('REDIS_EVENT_EXPIRE_SECONDS', '60')
+        connector.list_events('2025-01-06', '2025-01-09')
+        connector.fetched.clear()
+
+        with mock.patch('time.time', return_value=time.time() + 61):
+            assert self.titles(connector.list_events('2025-01-06', '2025-01-09')) == ['Monday', 'Overnight']
+
+        assert connector.fetched == [(datetime.datetime(2025, 1, 6), datetime.datetime(2025, 1, 9))]
+
+    def test_busting_bumps_the_generation(self, connector, with_fake_redis):
+        other = RecordingConnector(with_fake_redis, connector.remote_events)
+        other.calendar_id = 2
+        connector.list_events('2025-01-06', '2025-01-09')
+        other.list_events('2025-01-06', '2025-01-09')
+        old_key = connector.get_cached_key()
+
+        # Only this calendar is fetched again
+        connector.bust_cached_events()
+        assert connector.get_cached_key() != old_key
+        connector.list_events('2025-01-06', '2025-01-09')
+        other.list_events('2025-01-06', '2025-01-09')
+        assert len(connector.fetched) == 2
+        assert len(other.fetched) == 1
+
+        # ...or every calendar of the subscriber
+        other.bust_cached_events(all_calendars=True)
+        connector.list_events('2025-01-06', '2025-01-09')
+        other.list_events('2025-01-06', '2025-01-09')
+        assert len(connector.fetched) == 3
+        assert len(other.fetched) == 2
+
+        # The old generation is left to expire
+        assert with_fake_redis.exists(old_key)
+
+    def test_busting_while_fetching(self, connector):
+        """Events fetched from before a bust shouldn't end up in the new generation"""
+        fetch_events = connector.fetch_events
+
+        def busting_fetch(ranges):
+            results = fetch_events(ranges)
+            connector.bust_cached_events()
+            return results
+
+        with mock.patch.object(connector, 'fetch_events', busting_fetch):
+            connector.list_events('2025-01-06', '2025-01-09')
+
+        connector.list_events('2025-01-06', '2025-01-09')
+        assert len(connector.fetched) == 2
+
+    def test_connectors_must_fetch_events(self):
+        class IncompleteConnector(BaseConnector):
+            pass
+
+        with pytest.raises(TypeError):
+            IncompleteConnector(subscriber_id=1, calendar_id=1)
+
+    def test_without_redis(self, connector):
+        connector.redis_instance = None
+        assert self.titles(connector.list_events('2025-01-06', '2025-01-09')) == ['Monday', 'Overnight']
+        assert self.titles(connector.list_events('2025-01-06', '2025-01-09')) == ['Monday', 'Overnight']
+        assert len(connector.fetched) == 2
+
+    def test_unknown_envelopes_are_not_cached(self, connector, with_fake_redis):
+        connector.list_events('2025-01-06', '2025-01-09')
+        key = connector.get_cached_key()
+        for field in with_fake_redis.hkeys(key):
+            if field != CACHED_RANGES_FIELD:
+                with_fake_redis.hset(key, field, '1:' + with_fake_redis.hget(key, field).partition(':')[2])
+
+        assert self.titles(connector.list_events('2025-01-06', '2025-01-09')) == ['Monday', 'Overnight']
+        assert len(connector.fetched) == 2
+
+    @pytest.mark.parametrize('ranges,gaps', [
+        ([], [(0, 10)]),
+        ([(0, 10)], []),
+        ([(2, 4), (3, 6), (8, 12)], [(0, 2), (6, 8)]),
+        ([(-5, 1), (12, 20)], [(1, 10)]),
+    ])
+    def test_uncovered_ranges(self, ranges, gaps):
+        assert uncovered_ranges(0, 10, ranges) == gaps
+
+
+class TestEventEnvelope:
+    def make_events(self, count):
+        start = datetime.datetime(2025, 1, 6, 9, tzinfo=datetime.UTC)
+        hour = datetime.timedelta(hours=1)
+        return [Event(title=f'Event {i}', start=start + i * hour, end=start + (i + 1) * hour) for i in range(count)]
+
+    def unpack(self, envelope):
+        return [row_event(row) for row in unpack_rows(envelope)]
+
+    def test_round_trip(self):
+        pacific = datetime.timezone(datetime.timedelta(hours=-8))
+        events = [
+            Event(
+                title='Aware',
+                start=datetime.datetime(2025, 1, 6, 9, 30, tzinfo=pacific),
+                end=datetime.datetime(2025, 1, 6, 10, 0, 0, 123456, tzinfo=pacific),
+                tentative=True,
+                description='Secret stuff',
+            ),
+            Event(title='Naive', start=datetime.datetime(2025, 1, 6, 9), end=datetime.datetime(2025, 1, 6, 10)),
+            Event(title='All day', start=datetime.date(2025, 1, 7), end=datetime.date(2025, 1, 8), all_day=True),
+            Event(
+                title='Extra',
+                start=datetime.datetime(2025, 1, 8, 9, tzinfo=datetime.UTC),
+                end=datetime.datetime(2025, 1, 8, 10, tzinfo=datetime.UTC),
+                calendar_color='#123456',
+                location=EventLocation(url='https://example.org'),
+                uuid=uuid.UUID('c7b9f3a0-4b5e-4f4e-9c1d-1f2e3d4c5b6a'),
+            ),
+        ]
+
+        envelope = pack_events(events)
+
+        assert 'Secret stuff' not in envelope
+        assert envelope.startswith(f'{EVENT_CACHE_FORMAT}:')
+        assert [event.model_dump() for event in self.unpack(envelope)] == [event.model_dump() for event in events]
+        assert self.unpack(envelope)[0].start.utcoffset() == datetime.timedelta(hours=-8)
+        assert self.unpack(envelope)[1].start.tzinfo is None
+
+    def test_large_payloads_are_compressed(self):
+        events = self.make_events(500)
+        envelope = pack_events(events)
+
+        flags = utils.decrypt_bytes(envelope.partition(':')[2])[0]
+        assert flags & ENVELOPE_ZLIB
+        assert len(envelope) < len(json.dumps([event.model_dump_redis() for event in events])) / 5
+        assert [event.title for event in self.unpack(envelope)] == [event.title for event in events]
+
+        assert not utils.decrypt_bytes(pack_events(events[:1]).partition(':')[2])[0] & ENVELOPE_ZLIB
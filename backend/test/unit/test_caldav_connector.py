@@ -0,0 +1,90 @@
+from unittest import mock
+
+import pytest
+from caldav import Principal
+
+from appointment.controller import calendar
+from appointment.controller.calendar import CalDavConnector, get_dav_client, get_dav_session, close_dav_clients
+
+
+def make_connector(url, user='user', password='password'):
+    return CalDavConnector(
+        db=None, subscriber_id=1, calendar_id=1, redis_instance=None, url=url, user=user, password=password
+    )
+
+
+class TestCaldavSessions:
+    @pytest.fixture(autouse=True)
+    def reset(self):
+        close_dav_clients()
+        yield
+        close_dav_clients()
+
+    def test_sessions_are_shared(self):
+        session = get_dav_session('https://example.org/dav/', 'user', 'password')
+        assert get_dav_session('https://example.org/dav/', 'user', 'password') is session
+        assert get_dav_session('https://example.org/dav/', 'other', 'password') is not session
+
+        # A new password gets a new session
+        replaced = get_dav_session('https://example.org/dav/', 'user', 'new-password')
+        assert replaced is not session
+        assert get_dav_session('https://example.org/dav/', 'user', 'new-password') is replaced
+
+    def test_least_recently_used_sessions_are_closed(self, monkeypatch):
+        monkeypatch.setenv('CALDAV_SESSION_POOL_SIZE', '2')
+        first = get_dav_session('https://one.example.org/', 'user', 'password')
+        get_dav_session('https://two.example.org/', 'user', 'password')
+
+        with mock.patch.object(first, 'close') as close:
+            get_dav_session('https://three.example.org/', 'user', 'password')
+            close.assert_called_once()
+
+        assert get_dav_session('https://one.example.org/', 'user', 'password') is not first
+
+    def test_clients_only_share_the_session(self):
+        client = get_dav_client('https://example.org/dav/', 'user', 'password')
+        other = get_dav_client('https://example.org/dav/', 'user', 'password')
+        assert other is not client
+        assert other.session is client.session
+
+        # A calendar home on another host moves the client over, but not the others on the same session
+        principal = Principal(client=client, url='https://example.org/dav/principals/user/')
+        principal.calendar_home_set = 'https://p01.example.org/dav/calendars/user/'
+        assert client.url.hostname == 'p01.example.org'
+        assert other.url.hostname == 'example.org'
+
+    def test_discovery_is_cached(self, with_caldav_server):
+        titles = [c.title for c in make_connector(with_caldav_server.url).list_calendars()]
+        assert titles == ['Work', 'Home']
+        discovery = list(with_caldav_server.requests)
+
+        # Principal and calendar home discovery is skipped the next time around
+        with_caldav_server.requests.clear()
+        titles = [c.title for c in make_connector(with_caldav_server.url).list_calendars()]
+        assert titles == ['Work', 'Home']
+        assert with_caldav_server.requests == [('PROPFIND', '/calendars/user/')]
+        assert len(discovery) == 3
+
+        # ...and everything went over the one kept-alive connection
+        assert with_caldav_server.connections == 1
+
+    def test_discovery_expires(self, with_caldav_server, monkeypatch):
+        monkeypatch.setenv('CALDAV_DISCOVERY_TTL', '60')
+        make_connector(with_caldav_server.url).list_calendars()
+
+        with_caldav_server.requests.clear()
+        with mock.patch('time.monotonic', return_value=calendar.time.monotonic() + 61):
+            make_connector(with_caldav_server.url).list_calendars()
+
+        assert len(with_caldav_server.requests) == 3
+
+    def test_moved_calendar_home_is_rediscovered(self, with_caldav_server):
+        make_connector(with_caldav_server.url).list_calendars()
+        key = (with_caldav_server.url, 'user')
+        principal, _, expires = calendar._dav_discovery[key]
+        calendar._dav_discovery[key] = (principal, f'{with_caldav_server.url}gone/', expires)
+
+        titles = [c.title for c in make_connector(with_caldav_server.url).list_calendars()]
+
+        assert titles == ['Work', 'Home']
+        assert calendar._dav_discovery[key][1].endswith('/calendars/user/')
@@ -0,0 +1,147 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from appointment import utils
+from appointment.controller.calendar import CalDavConnector, close_dav_clients
+from appointment.controller.mirror import CalDavMirror, SyncMode
+from factory.redis_factory import FakeRedis
+
+
+def make_ical(uid, start, end, summary='Busy', extra=''):
+    return (
+        'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\nBEGIN:VEVENT\r\n'
+        f'UID:{uid}\r\nDTSTAMP:20250101T000000Z\r\nDTSTART:{start}\r\nDTEND:{end}\r\nSUMMARY:{summary}\r\n{extra}'
+        'END:VEVENT\r\nEND:VCALENDAR\r\n'
+    )
+
+
+@pytest.fixture
+def mirror(with_caldav_server):
+    close_dav_clients()
+    connector = CalDavConnector(
+        db=None,
+        subscriber_id=1,
+        calendar_id=1,
+        redis_instance=FakeRedis(),
+        url=with_caldav_server.calendar_url('work'),
+        user='user',
+        password='password',
+    )
+    yield connector.mirror()
+    close_dav_clients()
+
+
+def titles(mirror: CalDavMirror, start='2025-01-01', end='2025-01-08'):
+    return [event.title for event in mirror.events(datetime.fromisoformat(start), datetime.fromisoformat(end))]
+
+
+class TestCalDavMirror:
+    def test_refresh_only_transfers_changes(self, with_caldav_server, mirror):
+        server = with_caldav_server
+        server.put_object('work', 'one', make_ical('one', '20250102T090000Z', '20250102T100000Z', 'One'))
+        server.put_object('work', 'two', make_ical('two', '20250103T090000Z', '20250103T100000Z', 'Two'))
+        server.put_object('home', 'other', make_ical('other', '20250103T090000Z', '20250103T100000Z', 'Other'))
+
+        assert mirror.refresh() == 2
+        assert titles(mirror) == ['One', 'Two']
+        assert mirror.get_meta()['mode'] == SyncMode.SYNC_TOKEN
+
+        # Nothing changed, so it's just the one sync report
+        server.requests.clear()
+        server.transferred.clear()
+        assert mirror.refresh() == 0
+        assert server.requests == [('REPORT', '/calendars/user/work/')]
+        assert server.transferred == []
+
+        # Only the changed object comes over the wire
+        server.put_object('work', 'two', make_ical('two', '20250104T090000Z', '20250104T100000Z', 'Two moved'))
+        server.put_object('work', 'three', make_ical('three', '20250105T090000Z', '20250105T100000Z', 'Three'))
+        server.delete_object('work', 'one')
+        assert mirror.refresh() == 3
+        assert sorted(server.transferred) == ['/calendars/user/work/three.ics', '/calendars/user/work/two.ics']
+        assert titles(mirror) == ['Two moved', 'Three']
+
+    def test_events(self, with_caldav_server, mirror):
+        server = with_caldav_server
+        server.put_object('work', 'weekly', make_ical(
+            'weekly', '20241230T090000Z', '20241230T100000Z', 'Weekly', 'RRULE:FREQ=DAILY;INTERVAL=3\r\n'
+        ))
+        server.put_object('work', 'free', make_ical(
+            'free', '20250102T090000Z', '20250102T100000Z', 'Free', 'TRANSP:TRANSPARENT\r\n'
+        ))
+        server.put_object('work', 'cancelled', make_ical(
+            'cancelled', '20250102T090000Z', '20250102T100000Z', 'Cancelled', 'STATUS:CANCELLED\r\n'
+        ))
+        server.put_object('work', 'maybe', make_ical(
+            'maybe', '20250104T090000Z', '20250104T100000Z', 'Maybe', 'STATUS:TENTATIVE\r\n'
+        ))
+        server.put_object('work', 'later', make_ical('later', '20250301T090000Z', '20250301T100000Z', 'Later'))
+        server.put_object('work', 'holiday', (
+            'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\nBEGIN:VEVENT\r\nUID:holiday\r\n'
+            'DTSTAMP:20250101T000000Z\r\nDTSTART;VALUE=DATE:20250106\r\nDTEND;VALUE=DATE:20250107\r\n'
+            'SUMMARY:Holiday\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n'
+        ))
+        mirror.refresh()
+
+        events = mirror.events(datetime(2025, 1, 1), datetime(2025, 1, 8))
+
+        assert [(event.title, event.start.day) for event in events] == [
+            ('Weekly', 2), ('Maybe', 4), ('Weekly', 5), ('Holiday', 6)
+        ]
+        assert events[1].tentative
+        assert events[3].all_day
+
+    def test_expired_sync_token_starts_over(self, with_caldav_server, mirror):
+        server = with_caldav_server
+        server.put_object('work', 'one', make_ical('one', '20250102T090000Z', '20250102T100000Z', 'One'))
+        mirror.refresh()
+
+        # Pretend the server forgot about our token
+        meta = mirror.get_meta()
+        meta['token'] = 'http://fake/sync/1000'
+        mirror.redis_instance.hset(mirror.key, mapping={'meta': utils.encrypt(json.dumps(meta))})
+        server.put_object('work', 'two', make_ical('two', '20250103T090000Z', '20250103T100000Z', 'Two'))
+
+        assert mirror.refresh() == 2
+        assert titles(mirror) == ['One', 'Two']
+
+    def test_etag_comparison_without_sync_collection(self, with_caldav_server, mirror):
+        server = with_caldav_server
+        server.sync_collection = False
+        server.put_object('work', 'one', make_ical('one', '20250102T090000Z', '20250102T100000Z', 'One'))
+        server.put_object('work', 'two', make_ical('two', '20250103T090000Z', '20250103T100000Z', 'Two'))
+
+        assert mirror.refresh() == 2
+        assert mirror.get_meta()['mode'] == SyncMode.ETAG
+
+        # The ctag didn't change, so we don't even list the etags
+        server.requests.clear()
+        assert mirror.refresh() == 0
+        assert server.requests == [('PROPFIND', '/calendars/user/work/')]
+
+        server.transferred.clear()
+        server.put_object('work', 'two', make_ical('two', '20250104T090000Z', '20250104T100000Z', 'Two moved'))
+        server.delete_object('work', 'one')
+        assert mirror.refresh() == 2
+        assert server.transferred == ['/calendars/user/work/two.ics']
+        assert titles(mirror) == ['Two moved']
+
+    def test_connector_reads_from_mirror(self, with_caldav_server, mirror):
+        with_caldav_server.put_object('work', 'one', make_ical('one', '20250102T090000Z', '20250102T100000Z', 'One'))
+        connector = CalDavConnector(
+            db=None,
+            subscriber_id=1,
+            calendar_id=1,
+            redis_instance=mirror.redis_instance,
+            url=with_caldav_server.calendar_url('work'),
+            user='user',
+            password='password',
+        )
+
+        busy = connector.get_busy_time([connector.url], '2025-01-01', '2025-01-08')
+
+        assert [(item['start'].hour, item['end'].hour) for item in busy] == [(9, 10)]
+        assert ('REPORT', '/calendars/user/work/') in with_caldav_server.requests
+        assert titles(mirror) == ['One']
@@ -1,6 +1,15 @@
-from appointment.controller.calendar import Tools
-from appointment.database import schemas, models
-from datetime import datetime, timedelta
+import random
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+from freezegun import freeze_time
+
+from appointment.controller.calendar import Tools, CalDavConnector
+from appointment.database import schemas, models, repo
+from datetime import datetime, time as dt_time, timedelta, UTC
+from legacy_tools import legacy_events_roll_up_difference, legacy_available_slots_from_schedule, make_schedule_stand_in
 
 
 class TestTools:
@@ -57,6 +66,154 @@ class TestTools:
         assert rolled_up_slots[1].booking_status == models.BookingStatus.requested
         assert rolled_up_slots[2].booking_status == models.BookingStatus.booked
 
+    def test_events_roll_up_difference_matches_legacy(self):
+        """Ensure the sweep-line roll up gives the exact same output as the previous implementation,
+        including unsorted slots, touching events and overlapping events."""
+        rng = random.Random(1234)
+        start = datetime(2025, 1, 1, 9)
+
+        for _ in range(50):
+            slots = [
+                schemas.SlotBase(
+                    start=start + timedelta(minutes=rng.randrange(0, 600, 15)), duration=rng.choice([15, 30])
+                )
+                for _ in range(rng.randrange(0, 40))
+            ]
+            events = []
+            for _ in range(rng.randrange(0, 15)):
+                event_start = start + timedelta(minutes=rng.randrange(-30, 630, 5))
+                event_end = event_start + timedelta(minutes=rng.randrange(0, 90, 15))
+                events.append(schemas.Event(title='Busy', start=event_start, end=event_end))
+
+            legacy = legacy_events_roll_up_difference([slot.model_copy() for slot in slots], events)
+            current = Tools.events_roll_up_difference([slot.model_copy() for slot in slots], events)
+
+            assert [slot.model_dump() for slot in current] == [slot.model_dump() for slot in legacy]
+
+    def test_slot_arrays_match_legacy(self):
+        """Ensure the array backed slot generation and roll up give the same slots as the previous implementation,
+        across timezones, dst changes and end times wrapping around midnight."""
+        rng = random.Random(1234)
+        timezones = ['UTC', 'America/Vancouver', 'Europe/Berlin', 'Asia/Kolkata', 'Australia/Lord_Howe']
+
+        for now in ['2025-03-07 17:32:00', '2025-10-24 03:05:00', '2025-06-01 12:00:00']:
+            with freeze_time(now):
+                for _ in range(20):
+                    schedule = make_schedule_stand_in(
+                        timezone=rng.choice(timezones),
+                        start_time=dt_time(rng.randrange(24), rng.choice([0, 30])),
+                        end_time=dt_time(rng.randrange(24), rng.choice([0, 30])),
+                        slot_duration=rng.choice([10, 15, 30, 60]),
+                        farthest_booking=60 * 24 * rng.randrange(1, 21),
+                        weekdays=rng.sample(range(1, 8), rng.randrange(1, 8)),
+                    )
+
+                    legacy_slots = legacy_available_slots_from_schedule(schedule)
+                    starts, durations = Tools.slot_arrays_from_schedule(schedule)
+                    assert starts.tolist() == [int(slot.start.timestamp()) for slot in legacy_slots]
+                    assert durations.tolist() == [slot.duration for slot in legacy_slots]
+
+                    busy = []
+                    for _ in range(rng.randrange(0, 30)):
+                        busy_start = starts[0] + rng.randrange(-3600, 14 * 86400, 300) if len(starts) else 0
+                        busy.append((float(busy_start), float(busy_start + rng.randrange(0, 7200, 900))))
+
+                    # The previous roll up measured slot ends on the wall clock, which is off by the dst change
+                    if any(
+                        (slot.start + timedelta(minutes=slot.duration)).timestamp()
+                        != slot.start.timestamp() + slot.duration * 60
+                        for slot in legacy_slots
+                    ):
+                        continue
+
+                    legacy = Tools.busy_roll_up_difference(legacy_slots, busy)
+                    current = Tools.slots_from_arrays(*Tools.busy_roll_up_arrays(starts, durations, busy))
+                    assert [(slot.start.timestamp(), slot.duration, slot.booking_status) for slot in current] == [
+                        (slot.start.timestamp(), slot.duration, slot.booking_status) for slot in legacy
+                    ]
+
+
+class TestExistingEventsForSchedule:
+    def test_slow_calendar_does_not_block(
+        self, monkeypatch, with_db, make_pro_subscriber, make_caldav_calendar, make_schedule
+    ):
+        """Ensure remote calendars are queried concurrently and a slow calendar is reported instead of waited on"""
+        subscriber = make_pro_subscriber()
+        fast_calendars = [make_caldav_calendar(subscriber.id, connected=True) for _ in range(3)]
+        slow_calendar = make_caldav_calendar(subscriber.id, connected=True)
+        schedule = make_schedule(calendar_id=fast_calendars[0].id, active=True, end_date=None)
+
+        busy_start = datetime.now() + timedelta(days=1)
+        release_slow_calendar = threading.Event()
+
+        class MockCaldavConnector:
+            @staticmethod
+            def __init__(self, db, redis_instance, url, user, password, subscriber_id, calendar_id):
+                """We don't want to initialize a client"""
+                pass
+
+            @staticmethod
+            def get_busy_time(self, calendar_ids, start, end):
+                if calendar_ids[0] == slow_calendar.url:
+                    release_slow_calendar.wait(5)
+                else:
+                    # Each fast calendar takes a bit, if we ran them one by one we would blow our budget
+                    time.sleep(0.2)
+                return [{'start': busy_start, 'end': busy_start + timedelta(minutes=30)}]
+
+        monkeypatch.setattr(CalDavConnector, '__init__', MockCaldavConnector.__init__)
+        monkeypatch.setattr(CalDavConnector, 'get_busy_time', MockCaldavConnector.get_busy_time)
+        monkeypatch.setenv('REMOTE_CALENDAR_TIMEOUT', '0.5')
+
+        with with_db() as db:
+            schedule = repo.schedule.get(db, schedule.id)
+            calendars = repo.calendar.get_by_subscriber(db, subscriber.id, False)
+
+            perf_start = time.perf_counter()
+            events, timed_out = Tools.existing_events_for_schedule(schedule, calendars, subscriber, None, db)
+            elapsed = time.perf_counter() - perf_start
+
+        release_slow_calendar.set()
+
+        assert elapsed < 2
+        assert timed_out == [slow_calendar.id]
+        assert len(events) == len(fast_calendars)
+        assert all(event.start == busy_start for event in events)
+
+
+    def test_availability_queries_missing_days_at_once(self, monkeypatch):
+        """A weekday-only schedule misses every weekend, the remote calendars should still only be asked once"""
+        # Two weeks of one 9:00 utc slot per weekday, starting on a monday
+        first_day = datetime(2025, 1, 6, 9, tzinfo=UTC)
+        starts = np.array([
+            int((first_day + timedelta(days=day)).timestamp()) for day in range(14) if day % 7 < 5
+        ], dtype=np.int64)
+        durations = np.full(len(starts), 30, dtype=np.int64)
+        monkeypatch.setattr(Tools, 'slot_arrays_from_schedule', lambda schedule: (starts, durations))
+
+        queries = []
+
+        def existing_events_for_schedule(schedule, calendars, subscriber, google_client, db, redis, start, end):
+            queries.append((start, end))
+            # Busy on the first and last tuesday
+            busy_starts = [first_day + timedelta(days=day) for day in (1, 8)]
+            events = [
+                schemas.Event(title='Busy', start=start, end=start + timedelta(minutes=30)) for start in busy_starts
+            ]
+            return events, []
+
+        monkeypatch.setattr(Tools, 'existing_events_for_schedule', existing_events_for_schedule)
+
+        schedule = mock.Mock(id=1, time_updated=None, calendar=mock.Mock(owner=mock.Mock(timezone='UTC')))
+        slots, unavailable_calendars = Tools.availability_for_schedule(
+            schedule, [mock.Mock(id=1)], mock.Mock(id=1), None, None
+        )
+
+        assert queries == [(datetime(2025, 1, 6), datetime(2025, 1, 18))]
+        assert unavailable_calendars == []
+        booked = [slot.start.day for slot in slots if slot.booking_status == models.BookingStatus.booked]
+        assert booked == [7, 14]
+        assert len(slots) == 10
 
 class TestVCreate:
     def test_meeting_url_in_location(
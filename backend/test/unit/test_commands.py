@@ -1,8 +1,16 @@
+import json
 import os
 
 import pytest
+from freezegun import freeze_time
 
+from appointment.commands.renew_google_channels import renew
+from appointment.controller.apis.google_client import GoogleClient
+from appointment.controller.calendar import GoogleConnector
+from appointment.database import models
 from appointment.routes.commands import cron_lock
+from defines import TEST_USER_ID
+from factory.redis_factory import FakeRedis
 
 
 def test_cron_lock():
@@ -29,3 +37,42 @@ def test_cron_lock():
 
     # Remove the lock file we manually created
     os.remove(test_lock_file_name)
+
+
+@freeze_time('2025-01-01')
+def test_renew_google_channels(
+    with_db, with_fake_google, make_google_calendar, make_external_connections, monkeypatch
+):
+    monkeypatch.setenv('GOOGLE_MIRROR_ENABLED', 'True')
+    monkeypatch.setenv('GOOGLE_WEBHOOK_URL', 'https://example.org/webhooks/google-calendar')
+    google = with_fake_google
+    redis = FakeRedis()
+    client = GoogleClient('id', 'secret', 'project', 'http://localhost/callback')
+    token = json.dumps({
+        'token': 'access-token',
+        'expiry': '2025-01-02T00:00:00Z',
+        'refresh_token': 'refresh-token',
+        'client_id': 'id',
+        'client_secret': 'secret',
+    })
+    make_external_connections(TEST_USER_ID, type=models.ExternalConnectionType.google.value, token=token)
+    calendar = make_google_calendar(id='primary', connected=True)
+    make_google_calendar(id='unconnected')
+
+    with with_db() as db:
+        # Only mirrors somebody reads from get a channel
+        assert renew(db, redis, client) == 0
+        GoogleConnector(
+            db=db,
+            redis_instance=redis,
+            google_client=client,
+            remote_calendar_id='primary',
+            subscriber_id=TEST_USER_ID,
+            calendar_id=calendar.id,
+            google_tkn=token,
+        ).mirror().refresh()
+
+        assert renew(db, redis, client) == 1
+        assert renew(db, redis, client) == 0
+
+    assert list(google.channels) == ['primary']
@@ -0,0 +1,83 @@
+import os
+from unittest import mock
+
+from sqlalchemy import text
+
+from appointment.dependencies import database
+
+
+class TestDatabasePool:
+    def test_engine_is_reused(self):
+        """Ensure we only build one engine per process and get_db pulls sessions from it"""
+        database.close_database()
+
+        engine, session = database.get_engine_and_session()
+        engine_again, session_again = database.get_engine_and_session()
+
+        assert engine is engine_again
+        assert session is session_again
+
+        db_gen = database.get_db()
+        db = next(db_gen)
+        assert db.get_bind() is engine
+        db_gen.close()
+
+        database.close_database()
+        assert database.get_database_pool_stats() is None
+
+        # A fresh boot after closing gives us a new engine
+        new_engine, _ = database.get_engine_and_session()
+        assert new_engine is not engine
+        database.close_database()
+
+    def test_pool_stats(self):
+        """Ensure the instrumented pool reports checkouts and wait times"""
+        database.close_database()
+
+        # Swap in a queue pool backed engine, sqlite would otherwise get its own pool class
+        database._engine = database.create_engine(
+            'sqlite://', poolclass=database.InstrumentedQueuePool, pool_size=2, max_overflow=0
+        )
+        database._session_local = database.sessionmaker(bind=database._engine)
+
+        _, session = database.get_engine_and_session()
+        with session() as db:
+            db.execute(text('SELECT 1'))
+
+        stats = database.get_database_pool_stats()
+        assert stats['size'] == 2
+        assert stats['checked_out'] == 0
+        assert stats['checkouts'] == 1
+        assert stats['timeouts'] == 0
+        assert stats['max_wait_ns'] >= 0
+
+        database.close_database()
+
+
+class TestRedisPool:
+    def test_clients_share_pool(self):
+        """Ensure redis clients for the same logical db share one connection pool"""
+        database.close_redis_pools()
+
+        with mock.patch.dict(
+            'os.environ', {'REDIS_URL': 'localhost', 'REDIS_PORT': '6379', 'REDIS_DB': '0', 'TB_ACCOUNTS_REDIS_DB': '1'}
+        ):
+            os.environ.pop('REDIS_USE_CLUSTER', None)
+            database.boot_redis_pools()
+
+            stats = database.get_redis_pool_stats()
+            assert set(stats.keys()) == {0, 1}
+
+            redis = database.get_redis()
+            redis_again = database.get_redis()
+            shared_redis = database.get_shared_redis()
+
+            assert redis.connection_pool is redis_again.connection_pool
+            assert redis.connection_pool is not shared_redis.connection_pool
+            assert shared_redis.connection_pool.connection_kwargs.get('db') == 1
+
+            # We're not connected to anything yet
+            assert stats[0]['created'] == 0
+
+            database.close_redis_pools()
+            assert database.get_redis_pool_stats() == {}
@@ -0,0 +1,129 @@
+import json
+import threading
+from unittest import mock
+
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.http import HttpMockSequence
+
+from appointment.controller.apis import google_client
+from appointment.controller.apis.google_client import GoogleClient, get_http, get_service
+from appointment.controller.calendar import GoogleConnector
+from appointment.exceptions.calendar import EventNotDeletedException
+
+
+class TestGoogleClient:
+    def test_service_is_built_once(self):
+        """Ensure service objects are shared, and aren't bound to any credentials"""
+        assert get_service('calendar', 'v3') is get_service('calendar', 'v3')
+        assert get_service('oauth2', 'v2') is not get_service('calendar', 'v3')
+
+    def test_transport_is_kept_per_thread(self):
+        """Ensure each thread keeps reusing its own transport"""
+        assert get_http() is get_http()
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_http()))
+        thread.start()
+        thread.join()
+        assert other[0] is not get_http()
+
+    def test_free_busy(self):
+        """Ensure a free busy query is a single authorized request over the shared transport"""
+        client = GoogleClient('id', 'secret', 'project', 'http://localhost/callback')
+        token = Credentials(token='access-token')
+        response = {
+            'calendars': {
+                'primary': {'busy': [{'start': '2025-01-01T09:00:00Z', 'end': '2025-01-01T10:00:00Z'}]},
+                'other': {'errors': [{'domain': 'global', 'reason': 'notFound'}]},
+            }
+        }
+        http = HttpMockSequence([({'status': '200'}, json.dumps(response))])
+
+        with mock.patch.object(google_client, 'get_http', return_value=http):
+            items = client.get_free_busy(['primary', 'other'], '2025-01-01T00:00:00Z', '2025-01-02T00:00:00Z', token)
+
+        assert len(items) == 1
+        assert items[0]['start'].hour == 9
+        assert items[0]['end'].hour == 10
+        # The mock sequence would raise if we'd sent more than one request
+        assert http._iterable == []
+
+    def test_list_events_pages(self):
+        """Ensure paginated requests all go out with the token bound to the same transport"""
+        client = GoogleClient('id', 'secret', 'project', 'http://localhost/callback')
+        token = Credentials(token='access-token')
+        http = HttpMockSequence([
+            ({'status': '200'}, json.dumps({'items': [{'id': '1'}], 'nextPageToken': 'next'})),
+            ({'status': '200'}, json.dumps({'items': [{'id': '2'}]})),
+        ])
+        requests = []
+        original_request = http.request
+
+        def request(uri, method='GET', body=None, headers=None, *args, **kwargs):
+            requests.append((uri, headers))
+            return original_request(uri, method, body, headers, *args, **kwargs)
+
+        http.request = request
+
+        with mock.patch.object(google_client, 'get_http', return_value=http):
+            items = client.list_events('primary', '2025-01-01T00:00:00Z', '2025-01-02T00:00:00Z', token)
+
+        assert [item['id'] for item in items] == ['1', '2']
+        assert len(requests) == 2
+        assert 'pageToken=next' in requests[1][0]
+        assert all(headers['authorization'] == 'Bearer access-token' for _, headers in requests)
+
+
+class TestGoogleRoundTrips:
+    @staticmethod
+    def make_connector():
+        client = GoogleClient('id', 'secret', 'project', 'http://localhost/callback')
+        connector = GoogleConnector(
+            subscriber_id=1,
+            calendar_id=1,
+            redis_instance=None,
+            db=None,
+            remote_calendar_id='primary',
+            google_client=client,
+        )
+        connector.google_token = Credentials(token='access-token')
+        return connector
+
+    def test_free_busy_chunks(self, with_fake_google):
+        """Ensure we ask for as many calendars as the api allows per request, and send the chunks concurrently"""
+        calendar_ids = [f'calendar-{i}@example.org' for i in range(120)]
+        for calendar_id in calendar_ids:
+            with_fake_google.busy[calendar_id] = [{'start': '2025-01-01T09:00:00Z', 'end': '2025-01-01T10:00:00Z'}]
+
+        busy = self.make_connector().get_busy_time(calendar_ids, '2025-01-01', '2025-01-02')
+
+        assert len(busy) == 120
+        assert with_fake_google.requests == [('POST', '/calendar/v3/freeBusy')] * 3
+
+    def test_delete_events_are_batched(self, with_fake_google):
+        event_ids = [
+            with_fake_google.add_event('primary', f'2025-01-01T{i % 24:02}:00:00Z', '2025-01-02T00:00:00Z')
+            for i in range(60)
+        ]
+        with_fake_google.add_event('primary', '2025-01-02T09:00:00Z', '2025-01-02T10:00:00Z', event_id='keep')
+
+        assert self.make_connector().delete_events('2025-01-01') == 60
+
+        # One listing, and two batches for the 60 deletes
+        assert with_fake_google.round_trips == 3
+        assert [path for _, path in with_fake_google.requests[1:]] == ['/batch/calendar/v3'] * 2
+        assert len(with_fake_google.batched) == 60
+        assert list(with_fake_google.events['primary']) == ['keep']
+        assert not set(event_ids) & set(with_fake_google.events['primary'])
+
+    def test_delete_events_reports_failures(self, with_fake_google):
+        client = GoogleClient('id', 'secret', 'project', 'http://localhost/callback')
+        event_id = with_fake_google.add_event('primary', '2025-01-01T09:00:00Z', '2025-01-01T10:00:00Z')
+
+        with pytest.raises(EventNotDeletedException):
+            client.delete_events('primary', [event_id, 'missing'], Credentials(token='access-token'))
+
+        # The one that could be deleted still was
+        assert with_fake_google.round_trips == 1
+        assert with_fake_google.events['primary'] == {}
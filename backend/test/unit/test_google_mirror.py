@@ -0,0 +1,283 @@
+from datetime import datetime
+from unittest import mock
+
+import pytest
+from freezegun import freeze_time
+from google.oauth2.credentials import Credentials
+
+from appointment.controller.apis.google_client import GoogleClient
+from appointment.controller.calendar import GoogleConnector
+from appointment.controller.mirror import notify_google_channel, DIRTY_FIELD
+from factory.redis_factory import FakeRedis
+
+
+def make_connector(redis=None, remote_calendar_id='primary'):
+    connector = GoogleConnector(
+        subscriber_id=1,
+        calendar_id=1,
+        redis_instance=redis if redis is not None else FakeRedis(),
+        db=None,
+        remote_calendar_id=remote_calendar_id,
+        google_client=GoogleClient('id', 'secret', 'project', 'http://localhost/callback'),
+    )
+    connector.google_token = Credentials(token='access-token')
+    return connector
+
+
+@pytest.fixture(autouse=True)
+def mirror_enabled(monkeypatch):
+    monkeypatch.setenv('GOOGLE_MIRROR_ENABLED', 'True')
+
+
+def titles(mirror):
+    return [event.title for event in mirror.events(datetime(2025, 1, 1), datetime(2025, 1, 8))]
+
+
+@freeze_time('2025-01-01')
+class TestGoogleMirror:
+    def test_refresh_only_transfers_changes(self, with_fake_google):
+        google = with_fake_google
+        google.add_event('primary', '2025-01-02T09:00:00Z', '2025-01-02T10:00:00Z', 'one', summary='One')
+        google.add_event('primary', '2025-01-03T09:00:00Z', '2025-01-03T10:00:00Z', 'two', summary='Two')
+        google.add_event('primary', '2025-01-03T11:00:00Z', '2025-01-03T12:00:00Z', 'free', transparency='transparent')
+        google.add_event('primary', '2025-01-03T13:00:00Z', '2025-01-03T14:00:00Z', 'nope', attendees=[
+            {'self': True, 'responseStatus': 'declined'}
+        ])
+        google.add_event('primary', '2025-01-04T00:00:00Z', '2025-01-04T01:00:00Z', 'maybe', summary='Maybe',
+                         attendees=[{'self': True, 'responseStatus': 'tentative'}])
+        google.add_event('primary', '2025-01-20T09:00:00Z', '2025-01-20T10:00:00Z', 'later', summary='Later')
+        google.add_event('primary', '2025-03-01T09:00:00Z', '2025-03-01T10:00:00Z', 'beyond', summary='Beyond')
+        mirror = make_connector().mirror()
+
+        # Nobody can book past the horizon, so that isn't even sent over
+        assert mirror.refresh() == 6
+        assert titles(mirror) == ['One', 'Two', 'Maybe']
+        assert 'later' in mirror.redis_instance.hkeys(mirror.key)
+        assert 'beyond' not in mirror.redis_instance.hkeys(mirror.key)
+        assert mirror.events(datetime(2025, 1, 1), datetime(2025, 1, 8))[2].tentative
+
+        # Recently synced, so we don't even ask
+        google.requests.clear()
+        assert mirror.refresh() is None
+        assert google.requests == []
+
+        # Only what changed comes over the wire
+        google.add_event('primary', '2025-01-05T09:00:00Z', '2025-01-05T10:00:00Z', 'two', summary='Two moved')
+        google.remove_event('primary', 'one')
+        assert mirror.refresh(force=True) == 2
+        assert google.requests == [('GET', '/calendar/v3/calendars/primary/events')]
+        assert titles(mirror) == ['Maybe', 'Two moved']
+
+    def test_changes_past_the_horizon_are_dropped(self, with_fake_google, monkeypatch):
+        monkeypatch.setenv('GOOGLE_MIRROR_HORIZON_DAYS', '31')
+        google = with_fake_google
+        google.add_event('primary', '2025-01-02T09:00:00Z', '2025-01-02T10:00:00Z', 'one', summary='One')
+        mirror = make_connector().mirror()
+        mirror.refresh()
+
+        assert mirror.covers(datetime(2025, 1, 31))
+        assert not mirror.covers(datetime(2025, 2, 1))
+
+        # Changes come in unbounded, but moving out of reach is as good as gone
+        google.add_event('primary', '2025-03-02T09:00:00Z', '2025-03-02T10:00:00Z', 'one', summary='One')
+        google.add_event('primary', '2025-03-03T09:00:00Z', '2025-03-03T10:00:00Z', 'two', summary='Two')
+        assert mirror.refresh(force=True) == 2
+        assert mirror.redis_instance.hkeys(mirror.key) == ['meta']
+
+        # Starting over moves the horizon along
+        with freeze_time('2025-01-31'):
+            mirror.refresh(force=True)
+            assert mirror.covers(datetime(2025, 3, 1))
+        assert sorted(mirror.redis_instance.hkeys(mirror.key)) == ['meta', 'one']
+
+    def test_refreshes_once_outdated(self, with_fake_google, monkeypatch):
+        monkeypatch.setenv('GOOGLE_MIRROR_MAX_AGE', '60')
+        mirror = make_connector().mirror()
+        mirror.refresh()
+
+        with mock.patch('time.time', return_value=datetime.now().timestamp() + 61):
+            assert mirror.refresh() == 0
+
+    def test_expired_sync_token_starts_over(self, with_fake_google):
+        google = with_fake_google
+        google.add_event('primary', '2025-01-02T09:00:00Z', '2025-01-02T10:00:00Z', 'one', summary='One')
+        mirror = make_connector().mirror()
+        mirror.refresh()
+
+        # Pretend google forgot about our sync token
+        google.add_event('primary', '2025-01-03T09:00:00Z', '2025-01-03T10:00:00Z', 'two', summary='Two')
+        google.changes = []
+
+        assert mirror.refresh(force=True) == 2
+        assert titles(mirror) == ['One', 'Two']
+
+    def test_busting_cached_events_refreshes(self, with_fake_google):
+        google = with_fake_google
+        connector = make_connector()
+        mirror = connector.mirror()
+        mirror.refresh()
+
+        # Booking busts the cached events first, so we have to look even though the mirror is recent
+        google.add_event('primary', '2025-01-02T09:00:00Z', '2025-01-02T10:00:00Z', 'one', summary='One')
+        assert mirror.refresh() is None
+        connector.bust_cached_events(all_calendars=True)
+        assert mirror.refresh() == 1
+        assert mirror.refresh() is None
+
+        # Busting a calendar refreshes its own mirror, but not the mirrors of other calendars
+        other = connector.mirror('other')
+        other.refresh()
+        connector.bust_cached_events()
+        assert other.refresh() is None
+        assert mirror.refresh() == 0
+
+    def test_ended_events_are_dropped(self, with_fake_google, monkeypatch):
+        monkeypatch.setenv('GOOGLE_MIRROR_RESYNC_AGE', '86400')
+        google = with_fake_google
+        google.add_event('primary', '2024-06-01T09:00:00Z', '2024-06-01T10:00:00Z', 'old', summary='Old')
+        google.add_event('primary', '2025-01-02T09:00:00Z', '2025-01-02T10:00:00Z', 'one', summary='One')
+        mirror = make_connector().mirror()
+
+        # The history isn't even sent over
+        assert mirror.refresh() == 1
+        assert titles(mirror) == ['One']
+
+        # Changes to the past aren't kept either
+        google.add_event('primary', '2024-06-02T09:00:00Z', '2024-06-02T10:00:00Z', 'older', summary='Older')
+        google.add_event('primary', '2025-01-04T09:00:00Z', '2025-01-04T10:00:00Z', 'two', summary='Two')
+        assert mirror.refresh(force=True) == 2
+        assert sorted(mirror.redis_instance.hkeys(mirror.key)) == ['meta', 'one', 'two']
+
+        # Once in a while we start over, which drops what ended since
+        with freeze_time('2025-01-04'):
+            assert mirror.refresh(force=True) == 1
+        assert sorted(mirror.redis_instance.hkeys(mirror.key)) == ['meta', 'two']
+
+    def test_push_notifications(self, with_fake_google, monkeypatch):
+        monkeypatch.setenv('GOOGLE_WEBHOOK_URL', 'https://example.org/webhooks/google-calendar')
+        google = with_fake_google
+        redis = FakeRedis()
+        mirror = make_connector(redis).mirror()
+
+        # Reading doesn't open channels, renewing does
+        mirror.refresh()
+        assert google.channels == {}
+        assert mirror.renew_watch()
+
+        (channel,) = google.channels['primary']
+        assert channel['address'] == 'https://example.org/webhooks/google-calendar'
+        assert mirror.get_state()[3]['until'] > datetime.now().timestamp()
+
+        # Watched mirrors are trusted for longer
+        with mock.patch('time.time', return_value=datetime.now().timestamp() + 600):
+            assert mirror.refresh() is None
+
+        # A bad token, or the hello message, don't do anything
+        assert not notify_google_channel(redis, channel['id'], 'wrong', 'exists')
+        assert not notify_google_channel(redis, 'unknown', channel['token'], 'exists')
+        assert notify_google_channel(redis, channel['id'], channel['token'], 'sync')
+        assert mirror.get_meta()[1] is False
+
+        # A change makes us look on the next read
+        google.add_event('primary', '2025-01-02T09:00:00Z', '2025-01-02T10:00:00Z', 'one', summary='One')
+        assert notify_google_channel(redis, channel['id'], channel['token'], 'exists')
+        assert redis.hget(mirror.key, DIRTY_FIELD) == '1'
+
+        assert mirror.refresh() == 1
+        assert redis.hget(mirror.key, DIRTY_FIELD) is None
+        assert titles(mirror) == ['One']
+        # The channel is still good, so there's no need for a new one, and starting over doesn't forget about it
+        mirror.redis_instance.delete(mirror.key)
+        mirror.refresh()
+        assert not mirror.renew_watch()
+        assert len(google.channels['primary']) == 1
+
+    def test_renewing_stops_the_old_channel(self, with_fake_google, monkeypatch):
+        monkeypatch.setenv('GOOGLE_WEBHOOK_URL', 'https://example.org/webhooks/google-calendar')
+        google = with_fake_google
+        redis = FakeRedis()
+        mirror = make_connector(redis).mirror()
+        mirror.refresh()
+        mirror.renew_watch()
+        (channel,) = google.channels['primary']
+
+        # Close to running out, so we open a new one
+        with freeze_time('2025-01-07 12:00'):
+            assert mirror.renew_watch()
+
+        (renewed,) = google.channels['primary']
+        assert renewed['id'] != channel['id']
+        assert ('POST', '/calendar/v3/channels/stop') in google.requests
+        assert not notify_google_channel(redis, channel['id'], channel['token'], 'exists')
+        assert notify_google_channel(redis, renewed['id'], renewed['token'], 'exists')
+
+    def test_unused_mirrors_lose_their_channel(self, with_fake_google, monkeypatch):
+        monkeypatch.setenv('GOOGLE_WEBHOOK_URL', 'https://example.org/webhooks/google-calendar')
+        google = with_fake_google
+        redis = FakeRedis()
+        mirror = make_connector(redis).mirror()
+
+        # Nobody read from it yet
+        assert not mirror.renew_watch()
+        assert google.channels == {}
+
+        mirror.refresh()
+        mirror.renew_watch()
+        (channel,) = google.channels['primary']
+
+        # Nobody read from it for so long it went away
+        redis.delete(mirror.key)
+        assert not mirror.renew_watch()
+        assert google.channels['primary'] == []
+        assert not notify_google_channel(redis, channel['id'], channel['token'], 'exists')
+
+    def test_busy_time_from_mirrors(self, with_fake_google):
+        google = with_fake_google
+        google.add_event('primary', '2025-01-02T10:00:00+01:00', '2025-01-02T11:00:00+01:00', 'one', summary='One')
+        google.add_event('other', '2025-01-03T09:00:00Z', '2025-01-03T10:00:00Z', 'two', summary='Two')
+        google.events['other']['holiday'] = {
+            'id': 'holiday', 'status': 'confirmed', 'start': {'date': '2025-01-06'}, 'end': {'date': '2025-01-07'}
+        }
+        connector = make_connector()
+
+        busy = connector.get_busy_time(['primary', 'other'], '2025-01-01', '2025-01-08')
+
+        # Same naive utc datetimes FreeBusy would give us
+        assert busy == [
+            {'start': datetime(2025, 1, 2, 9), 'end': datetime(2025, 1, 2, 10)},
+            {'start': datetime(2025, 1, 3, 9), 'end': datetime(2025, 1, 3, 10)},
+            {'start': datetime(2025, 1, 6), 'end': datetime(2025, 1, 7)},
+        ]
+        assert not any(path.endswith('freeBusy') for _, path in google.requests)
+
+        # The second time around is all local
+        google.requests.clear()
+        assert connector.get_busy_time(['primary', 'other'], '2025-01-01', '2025-01-08') == busy
+        assert google.requests == []
+
+    def test_busy_time_past_the_horizon(self, with_fake_google):
+        google = with_fake_google
+        google.busy['primary'] = [{'start': '2025-03-03T09:00:00Z', 'end': '2025-03-03T10:00:00Z'}]
+        connector = make_connector()
+
+        # The mirror doesn't reach that far, so we ask FreeBusy
+        assert connector.get_busy_time(['primary'], '2025-01-01', '2025-04-01') == [
+            {'start': datetime(2025, 3, 3, 9), 'end': datetime(2025, 3, 3, 10)}
+        ]
+        assert ('POST', '/calendar/v3/freeBusy') in google.requests
+
+        google.requests.clear()
+        assert connector.fetch_events([(datetime(2025, 3, 1), datetime(2025, 3, 8))]) == [[]]
+        assert ('GET', '/calendar/v3/calendars/primary/events') in google.requests
+
+    @pytest.mark.parametrize('redis', [None, FakeRedis()])
+    def test_mirror_availability(self, redis, monkeypatch):
+        connector = make_connector()
+        connector.redis_instance = redis
+        assert (connector.mirror() is not None) == (redis is not None)
+
+        # It's opt-in
+        monkeypatch.setenv('GOOGLE_MIRROR_ENABLED', 'False')
+        assert connector.mirror() is None
+        monkeypatch.delenv('GOOGLE_MIRROR_ENABLED')
+        assert connector.mirror() is None
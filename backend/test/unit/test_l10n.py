@@ -0,0 +1,35 @@
+from appointment.middleware import l10n as l10n_middleware
+from appointment.middleware.l10n import L10n, LazyFluent, get_fluent, get_localization
+
+
+class TestL10n:
+    def test_localizations_are_cached(self):
+        """Ensure each locale chain is only built once, and the fallback locale is always included"""
+        locales = ['de']
+        format_value = get_fluent(locales)
+
+        # We don't touch the caller's list
+        assert locales == ['de']
+        assert format_value.__self__ is get_localization(('de', 'en'))
+        assert get_fluent(['de']).__self__ is format_value.__self__
+
+        assert get_fluent(['en'])('locale') == 'en'
+        assert format_value('locale') == 'de'
+
+    def test_plugin_is_lazy(self, monkeypatch):
+        """Ensure the plugin only resolves a localization when a message is actually formatted"""
+        calls = []
+        original_get_fluent = l10n_middleware.get_fluent
+
+        def get_fluent_spy(locales):
+            calls.append(locales)
+            return original_get_fluent(locales)
+
+        monkeypatch.setattr(l10n_middleware, 'get_fluent', get_fluent_spy)
+
+        lazy_fluent = LazyFluent(L10n(), 'de-DE,de;q=0.9,en;q=0.8')
+        assert calls == []
+
+        assert lazy_fluent('locale') == 'de'
+        assert lazy_fluent('locale') == 'de'
+        assert calls == [['de', 'en']]
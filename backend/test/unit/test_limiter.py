@@ -0,0 +1,89 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from limits import parse
+from limits.storage import MemoryStorage
+from redis.exceptions import NoScriptError
+
+from appointment import utils
+from appointment.dependencies import limiter as limiter_module
+from appointment.dependencies.limiter import (
+    get_limiter,
+    RedisSlidingWindowStorage,
+    ACQUIRE_SCRIPT,
+    ACQUIRE_SCRIPT_SHA,
+)
+
+
+class ScriptRecorder:
+    """Remembers the scripts it's asked to run, and pretends it hasn't seen them before the first eval"""
+
+    def __init__(self, result=1):
+        self.result = result
+        self.scripts = set()
+        self.calls = []
+
+    def evalsha(self, sha, numkeys, *args):
+        self.calls.append(('evalsha', sha, numkeys, *args))
+        if sha not in self.scripts:
+            raise NoScriptError()
+        return self.result
+
+    def eval(self, script, numkeys, *args):
+        self.calls.append(('eval', script, numkeys, *args))
+        self.scripts.add(ACQUIRE_SCRIPT_SHA)
+        return self.result
+
+
+def make_app(limiter):
+    app = FastAPI()
+
+    @app.get('/limited')
+    @limiter.limit('2/minute')
+    def limited(request: Request):
+        return True
+
+    return app
+
+
+class TestLimiter:
+    def test_memory_without_redis(self, monkeypatch):
+        monkeypatch.delenv('REDIS_URL', raising=False)
+        limiter = get_limiter()
+
+        assert isinstance(limiter._storage, MemoryStorage)
+        assert limiter.limiter.hit(parse('1/minute'), 'client')
+        assert not limiter.limiter.hit(parse('1/minute'), 'client')
+
+    def test_falls_back_to_memory(self, monkeypatch):
+        monkeypatch.setenv('REDIS_URL', 'redis')
+        monkeypatch.setattr(limiter_module, 'get_redis', lambda: None)
+        limiter = get_limiter()
+        assert isinstance(limiter._storage, RedisSlidingWindowStorage)
+        assert not limiter._storage.check()
+
+        client = TestClient(make_app(limiter))
+        assert client.get('/limited').status_code == 200
+        assert client.get('/limited').status_code == 200
+        assert client.get('/limited').status_code == 429
+
+    def test_one_script_call_per_check(self, monkeypatch):
+        redis = ScriptRecorder()
+        monkeypatch.setattr(limiter_module, 'get_redis', lambda: redis)
+        storage = RedisSlidingWindowStorage()
+
+        assert storage.acquire_sliding_window_entry('LIMITER/127.0.0.1/limited', 2, 60)
+        assert storage.acquire_sliding_window_entry('LIMITER/127.0.0.1/limited', 2, 60)
+
+        # The script is only sent over once, and the client's ip address doesn't end up in redis
+        key = f'rate_limit:{utils.obscure_key("LIMITER/127.0.0.1/limited")}'
+        assert redis.calls == [
+            ('evalsha', ACQUIRE_SCRIPT_SHA, 1, key, 2, 60, 1),
+            ('eval', ACQUIRE_SCRIPT, 1, key, 2, 60, 1),
+            ('evalsha', ACQUIRE_SCRIPT_SHA, 1, key, 2, 60, 1),
+        ]
+
+        redis.result = 0
+        assert not storage.acquire_sliding_window_entry('LIMITER/127.0.0.1/limited', 2, 60)
+        # Asking for more than the limit never reaches redis
+        assert not storage.acquire_sliding_window_entry('LIMITER/127.0.0.1/limited', 2, 60, amount=3)
+        assert len(redis.calls) == 4
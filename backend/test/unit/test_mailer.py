@@ -1,11 +1,43 @@
 import datetime
+import smtplib
+from email.message import EmailMessage
+from unittest.mock import patch
+
+import pytest
 
 from appointment.controller.mailer import ConfirmationMail, RejectionMail, ZoomMeetingFailedMail, InvitationMail, \
-    NewBookingMail, PendingRequestMail, Attachment
+    NewBookingMail, PendingRequestMail, Attachment, Mailer, SmtpPool, boot_templates, get_jinja, \
+    get_static_attachment, get_template
 from appointment.database import schemas
 
 
 class TestMailer:
+    def test_templates_are_compiled_once(self):
+        """Ensure every email template is compiled at boot and then served from memory"""
+        boot_templates()
+
+        env = get_jinja().env
+        assert get_jinja() is get_jinja()
+        for template_name in env.list_templates(extensions=['jinja2']):
+            assert get_template(template_name) is env.get_template(template_name)
+
+    def test_static_attachments_are_cached(self, with_l10n):
+        """Ensure inline images are read and encoded once, and built emails share the same MIME parts"""
+        now = datetime.datetime.now()
+        mail = ConfirmationMail('confirm', 'deny', 'Name', 'name@example.org', now, 30, 'schedule', to='to@example.org',
+                                lang='en')
+        mail.build()
+
+        with patch('builtins.open', side_effect=AssertionError('No file io please')):
+            first = mail.build()
+            second = mail.build()
+
+        first_images = [part for part in first.walk() if part.get_content_maintype() == 'image']
+        second_images = [part for part in second.walk() if part.get_content_maintype() == 'image']
+        assert [part['Content-ID'] for part in first_images] == ['<tbpro_logo.png>', '<calendar.png>', '<clock.png>']
+        assert all(a is b for a, b in zip(first_images, second_images))
+        assert first_images[0].get_content() == get_static_attachment('tbpro_logo.png').data
+
     def test_invite(self, with_l10n):
         fake_email = 'to@example.org'
 
@@ -103,3 +135,69 @@ class TestMailer:
         for idx, content in enumerate([mailer.text(), mailer.html()]):
             fault = 'text' if idx == 0 else 'html'
             assert fake_title in content, fault
+
+
+class TestSmtpPool:
+    def test_send_reuses_connection(self, with_l10n, with_smtp_server):
+        """Ensure consecutive emails go out over one kept alive connection"""
+        for i in range(3):
+            RejectionMail(owner_name='Owner', date=datetime.datetime.now(), to=f'to{i}@example.org').send()
+
+        assert with_smtp_server.connections == 1
+        assert [recipients for recipients, _ in with_smtp_server.messages] == [
+            ['to0@example.org'],
+            ['to1@example.org'],
+            ['to2@example.org'],
+        ]
+        assert with_smtp_server.messages[0][1]['To'] == 'to0@example.org'
+
+    def test_send_batch(self, with_l10n, with_smtp_server):
+        """Ensure a batch goes out over one session, and a refused email doesn't stop the rest"""
+        mails = [
+            RejectionMail(owner_name='Owner', date=datetime.datetime.now(), to=to)
+            for to in ['a@example.org', 'reject@example.org', 'b@example.org']
+        ]
+
+        errors = Mailer.send_batch(mails)
+
+        assert errors[0] is None
+        assert isinstance(errors[1], smtplib.SMTPRecipientsRefused)
+        assert errors[2] is None
+        assert with_smtp_server.connections == 1
+        assert [recipients for recipients, _ in with_smtp_server.messages] == [['a@example.org'], ['b@example.org']]
+
+    def test_send_raises_on_refused(self, with_l10n, with_smtp_server):
+        """Ensure a single send still raises, and the connection survives for the next email"""
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            RejectionMail(owner_name='Owner', date=datetime.datetime.now(), to='reject@example.org').send()
+
+        RejectionMail(owner_name='Owner', date=datetime.datetime.now(), to='to@example.org').send()
+        assert with_smtp_server.connections == 1
+        assert len(with_smtp_server.messages) == 1
+
+    def test_reconnects_after_disconnect(self, with_l10n, with_smtp_server):
+        """Ensure we transparently reconnect if the server hung up on an idle connection"""
+        RejectionMail(owner_name='Owner', date=datetime.datetime.now(), to='to@example.org').send()
+        with_smtp_server.drop_connections()
+
+        RejectionMail(owner_name='Owner', date=datetime.datetime.now(), to='to@example.org').send()
+
+        assert with_smtp_server.connections == 2
+        assert len(with_smtp_server.messages) == 2
+
+    def test_idle_connection_is_checked(self, with_smtp_server):
+        """Ensure a connection that sat idle too long is checked, and replaced if it's gone"""
+        pool = SmtpPool(host='127.0.0.1', port=with_smtp_server.port, max_idle=0)
+        message = EmailMessage()
+        message['To'] = 'to@example.org'
+        message.set_content('Hello')
+
+        pool.send(message)
+        pool.send(message)
+        assert with_smtp_server.connections == 1
+
+        with_smtp_server.drop_connections()
+        pool.send(message)
+        assert with_smtp_server.connections == 2
+
+        pool.close()
@@ -1,5 +1,10 @@
+import datetime
+import glob
+import importlib.util
+
 import pytest
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
 from appointment.database import models, repo, schemas
 from appointment.database.models import calculate_encrypted_length
 from appointment.utils import encrypt
@@ -29,6 +34,115 @@ class TestMisc:
             assert len(encrypt(clear_str)) == calculate_encrypted_length(len(clear_str))
 
 
+class TestBlindIndex:
+    def test_blind_index_follows_column(self, with_db, make_basic_subscriber):
+        """Ensure blind indexes are set on insert, kept up to date on update, and are used for lookups"""
+        subscriber = make_basic_subscriber(email='blind@example.org')
+
+        with with_db() as db:
+            subscriber = repo.subscriber.get(db, subscriber.id)
+            assert subscriber.email_index == models.blind_index('blind@example.org')
+            assert len(subscriber.email_index) == 64
+            assert repo.subscriber.get_by_email(db, 'Blind@Example.org').id == subscriber.id
+
+            subscriber.email = 'index@example.org'
+            db.commit()
+
+            assert subscriber.email_index == models.blind_index('index@example.org')
+            assert repo.subscriber.get_by_email(db, 'blind@example.org') is None
+            assert repo.subscriber.get_by_email(db, 'index@example.org').id == subscriber.id
+
+    def test_backfill(self, with_db, make_basic_subscriber, make_invite):
+        """Ensure the backfill command fills in missing blind indexes in batches"""
+        from appointment.commands.backfill_blind_indexes import backfill
+
+        subscribers = [make_basic_subscriber() for _ in range(3)]
+        subscribers = [(subscriber.id, subscriber.email, subscriber.username) for subscriber in subscribers]
+        invite = make_invite()
+        invite_id, invite_code = invite.id, invite.code
+
+        with with_db() as db:
+            # Simulate rows from before blind indexes
+            db.query(models.Subscriber).update({'email_index': None, 'username_index': None})
+            db.query(models.Invite).update({'code_index': None})
+            db.commit()
+            assert repo.invite.get_by_code(db, invite_code) is None
+
+            processed = backfill(db, batch_size=2)
+            # Our 3 subscribers and the default test subscriber
+            assert processed['subscribers'] == 4
+            assert processed['invites'] == 1
+
+            for subscriber_id, email, username in subscribers:
+                assert repo.subscriber.get_by_email(db, email).id == subscriber_id
+                assert repo.subscriber.get_by_username(db, username).id == subscriber_id
+            assert repo.invite.get_by_code(db, invite_code).id == invite_id
+
+    def test_migration_backfill(self, with_db, make_basic_subscriber, make_invite):
+        """Ensure the migration adding blind indexes fills them in without going through the models"""
+        (path,) = glob.glob('src/appointment/migrations/versions/*-1480de4431aa_*.py')
+        spec = importlib.util.spec_from_file_location('add_blind_index_columns', path)
+        migration = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration)
+
+        subscriber = make_basic_subscriber()
+        subscriber_id, email = subscriber.id, subscriber.email
+        invite = make_invite()
+        invite_id, invite_code = invite.id, invite.code
+
+        with with_db() as db:
+            db.query(models.Subscriber).update({'email_index': None, 'username_index': None})
+            db.query(models.Invite).update({'code_index': None})
+            db.commit()
+
+            migration.backfill(db.connection(), batch_size=1)
+            db.commit()
+
+            assert repo.subscriber.get_by_email(db, email).id == subscriber_id
+            assert repo.invite.get_by_code(db, invite_code).id == invite_id
+
+
+class TestLazyDecryption:
+    def test_decrypt_on_access(self, with_db, make_basic_subscriber):
+        """Ensure subscriber columns are only decrypted on access, without marking the subscriber as changed"""
+        subscriber = make_basic_subscriber(email='lazy@example.org')
+
+        with with_db() as db:
+            subscriber = repo.subscriber.get(db, subscriber.id)
+            assert isinstance(subscriber._email, models.EncryptedValue)
+            assert isinstance(subscriber._username, models.EncryptedValue)
+
+            assert subscriber.email == 'lazy@example.org'
+            assert subscriber._email == 'lazy@example.org'
+            assert isinstance(subscriber._username, models.EncryptedValue)
+            assert subscriber not in db.dirty
+
+            # Non-string columns are converted like before
+            subscriber.minimum_valid_iat_time = datetime.datetime(2025, 1, 1, 12, 30)
+            db.commit()
+            db.expire(subscriber)
+            assert subscriber.minimum_valid_iat_time == datetime.datetime(2025, 1, 1, 12, 30)
+
+    def test_query_by_column(self, with_db, make_basic_subscriber):
+        """Ensure the decrypted attributes can still be used in queries"""
+        subscriber = make_basic_subscriber(name='Lazy Subscriber')
+
+        with with_db() as db:
+            found = db.query(models.Subscriber).filter(models.Subscriber.name == 'Lazy Subscriber').first()
+            assert found.id == subscriber.id
+            db.expunge_all()
+
+            # And only load what we need
+            found = (
+                db.query(models.Subscriber)
+                .options(load_only(models.Subscriber.name))
+                .filter(models.Subscriber.id == subscriber.id)
+                .first()
+            )
+            assert '_email' not in found.__dict__
+            assert found.name == 'Lazy Subscriber'
+
+
 class TestAppointment:
     def test_appointment_uuids_are_unique(self, with_db, make_caldav_calendar):
         calendar = make_caldav_calendar()
@@ -0,0 +1,228 @@
+from datetime import datetime, UTC
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+import pytest
+from redis.exceptions import NoScriptError
+
+from starlette_context import request_cycle_context
+
+from appointment.controller.mailer import Attachment, Mailer
+from appointment.defines import REDIS_JOB_STREAM_KEY, REDIS_JOB_RETRY_KEY, REDIS_JOB_DEAD_KEY
+from appointment.middleware.l10n import L10n, LazyFluent
+from appointment.tasks import queue
+from appointment.tasks.emails import send_rejection_email
+
+
+class FakeRedis:
+    """Just enough of redis streams and sorted sets for the job queue"""
+
+    def __init__(self):
+        self.streams = {}
+        self.zsets = {}
+        self.acked = []
+        self.last_id = 0
+
+    def xadd(self, key, fields, **kwargs):
+        self.last_id += 1
+        entry_id = f'{self.last_id}-0'
+        self.streams.setdefault(key, []).append((entry_id, fields))
+        return entry_id
+
+    def xack(self, key, group, entry_id):
+        self.acked.append(entry_id)
+
+    def xdel(self, key, entry_id):
+        self.streams[key] = [entry for entry in self.streams.get(key, []) if entry[0] != entry_id]
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrangebyscore(self, key, low, high, start=0, num=None):
+        members = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+        return [member for member, score in members if score <= high]
+
+    def zrem(self, key, member):
+        return self.zsets.get(key, {}).pop(member, None) is not None
+
+    def evalsha(self, sha, numkeys, *args):
+        # Pretend it's the first time we see the script
+        raise NoScriptError()
+
+    def eval(self, script, numkeys, *args):
+        """Runs the only script we know about"""
+        assert script == queue.PROMOTE_SCRIPT
+        (retry_key, stream_key), (now, count) = args[:numkeys], args[numkeys:]
+        payloads = self.zrangebyscore(retry_key, '-inf', now)[:count]
+        for payload in payloads:
+            self.zrem(retry_key, payload)
+            self.xadd(stream_key, {'job': payload})
+        return len(payloads)
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+
+@queue.task
+def fake_task(to, date=None, attachment=None):
+    fake_task.calls.append((to, date, attachment))
+    if to.startswith('fail'):
+        raise RuntimeError('Nope')
+
+
+fake_task.calls = []
+
+
+@queue.task
+def fake_batch_task(recipients):
+    raise queue.RetryJob('One failed', recipients=recipients[1:])
+
+
+class TestJobQueue:
+    def setup_method(self):
+        fake_task.calls = []
+
+    def test_job_round_trip(self):
+        date = datetime(2025, 1, 1, 9, tzinfo=ZoneInfo('Europe/Berlin'))
+        attachment = Attachment(mime=('image', 'png'), filename='logo.png', data=b'\x89PNG')
+        invites = [{'date': datetime(2025, 1, 1, tzinfo=UTC), 'to': 'a@example.org', 'lang': 'en'}]
+
+        kwargs = {'date': date, 'attachment': attachment, 'i': invites}
+        payload = queue.encode_job('fake_task', ['a@example.org'], kwargs)
+        assert 'a@example.org' not in payload
+
+        name, args, kwargs, attempt, locales = queue.decode_job(payload)
+        assert name == 'fake_task'
+        assert args == ['a@example.org']
+        assert attempt == 0
+        assert locales is None
+        assert kwargs['date'] == date
+        assert kwargs['date'].tzinfo == ZoneInfo('Europe/Berlin')
+        assert kwargs['attachment'].mime_main == 'image'
+        assert kwargs['attachment'].data == b'\x89PNG'
+        assert kwargs['i'] == invites
+
+    def test_enqueue_without_redis(self):
+        """Ensure we fall back to a background task if there's no redis around"""
+        background_tasks = mock.Mock()
+        with mock.patch('appointment.tasks.queue.get_redis', return_value=None):
+            assert queue.enqueue(background_tasks, fake_task, 'to@example.org', date=None) is False
+        background_tasks.add_task.assert_called_once_with(fake_task, 'to@example.org', date=None)
+
+    def test_enqueue(self):
+        redis = FakeRedis()
+        background_tasks = mock.Mock()
+        with mock.patch('appointment.tasks.queue.get_redis', return_value=redis):
+            assert queue.enqueue(background_tasks, fake_task, to='to@example.org') is True
+
+        background_tasks.add_task.assert_not_called()
+        (entry_id, fields), = redis.streams[REDIS_JOB_STREAM_KEY]
+        assert queue.decode_job(fields['job']) == ('fake_task', [], {'to': 'to@example.org'}, 0, None)
+
+    def test_task_called_directly_swallows_errors(self):
+        fake_task('fail@example.org')
+        assert len(fake_task.calls) == 1
+
+    def test_handle(self):
+        redis = FakeRedis()
+        worker = queue.Worker(redis)
+        entry_id = redis.xadd(REDIS_JOB_STREAM_KEY, {'job': queue.encode_job('fake_task', [], {'to': 'a@example.org'})})
+
+        worker.handle(entry_id, redis.streams[REDIS_JOB_STREAM_KEY][0][1])
+
+        assert fake_task.calls == [('a@example.org', None, None)]
+        assert redis.acked == [entry_id]
+        assert redis.streams[REDIS_JOB_STREAM_KEY] == []
+        assert REDIS_JOB_RETRY_KEY not in redis.zsets
+
+    @pytest.mark.parametrize('attempt,delay', [(0, 30), (1, 60), (3, 240)])
+    def test_handle_retries_with_backoff(self, attempt, delay):
+        redis = FakeRedis()
+        worker = queue.Worker(redis, max_attempts=5, backoff=30)
+        payload = queue.encode_job('fake_task', [], {'to': 'fail@example.org'}, attempt)
+        entry_id = redis.xadd(REDIS_JOB_STREAM_KEY, {'job': payload})
+
+        with mock.patch('time.time', return_value=1000):
+            worker.handle(entry_id, {'job': payload})
+
+        assert redis.acked == [entry_id]
+        (retry, run_at), = redis.zsets[REDIS_JOB_RETRY_KEY].items()
+        assert run_at == 1000 + delay
+        assert queue.decode_job(retry) == ('fake_task', [], {'to': 'fail@example.org'}, attempt + 1, None)
+
+        # Nothing is due yet, then it's back on the stream once it is
+        assert worker.promote_retries(now=1000) == 0
+        assert worker.promote_retries(now=1000 + delay) == 1
+        assert redis.zsets[REDIS_JOB_RETRY_KEY] == {}
+        assert redis.streams[REDIS_JOB_STREAM_KEY][-1][1] == {'job': retry}
+
+    def test_handle_dead_letters(self):
+        redis = FakeRedis()
+        worker = queue.Worker(redis, max_attempts=3)
+        payload = queue.encode_job('fake_task', [], {'to': 'fail@example.org'}, 2)
+        entry_id = redis.xadd(REDIS_JOB_STREAM_KEY, {'job': payload})
+
+        worker.handle(entry_id, {'job': payload})
+
+        assert redis.acked == [entry_id]
+        assert REDIS_JOB_RETRY_KEY not in redis.zsets
+        (_, dead), = redis.streams[REDIS_JOB_DEAD_KEY]
+        assert 'Nope' in dead['error']
+        assert queue.decode_job(dead['job']) == ('fake_task', [], {'to': 'fail@example.org'}, 3, None)
+
+    def test_handle_unreadable_job(self):
+        redis = FakeRedis()
+        worker = queue.Worker(redis)
+        payload = queue.encode_job('not_a_task', [], {})
+
+        worker.handle('1-0', {'job': payload})
+
+        assert redis.acked == ['1-0']
+        assert len(redis.streams[REDIS_JOB_DEAD_KEY]) == 1
+
+    def test_retry_job_only_retries_the_rest(self):
+        redis = FakeRedis()
+        worker = queue.Worker(redis)
+        payload = queue.encode_job('fake_batch_task', [], {'recipients': ['a', 'b', 'c']})
+
+        worker.handle('1-0', {'job': payload})
+
+        (retry, _), = redis.zsets[REDIS_JOB_RETRY_KEY].items()
+        assert queue.decode_job(retry) == ('fake_batch_task', [], {'recipients': ['b', 'c']}, 1, None)
+
+    def test_enqueue_keeps_the_request_locale(self):
+        redis = FakeRedis()
+        with mock.patch('appointment.tasks.queue.get_redis', return_value=redis):
+            with request_cycle_context({'l10n': LazyFluent(L10n(), 'de-DE,de;q=0.9,en;q=0.8')}):
+                queue.enqueue(mock.Mock(), fake_task, to='to@example.org')
+
+        (_, fields), = redis.streams[REDIS_JOB_STREAM_KEY]
+        assert queue.decode_job(fields['job'])[4] == ['de', 'en']
+
+    @pytest.mark.parametrize('locales,subject', [
+        (None, 'Booking request declined'),
+        (['en'], 'Booking request declined'),
+        (['de'], 'Buchungsanfrage abgelehnt'),
+    ])
+    def test_worker_localizes_emails(self, locales, subject):
+        """Queued emails are sent outside of a request, they still have to be translated"""
+        redis = FakeRedis()
+        worker = queue.Worker(redis)
+        attachment = Attachment(mime=('text', 'calendar'), filename='invite.ics', data='')
+        payload = queue.encode_job(
+            send_rejection_email.__name__, [], {
+                'owner_name': 'Owner', 'date': datetime(2025, 1, 1), 'to': 'a@example.org', 'attachment': attachment
+            }, 0, locales
+        )
+
+        sent = []
+        with mock.patch.object(Mailer, 'send', lambda mail: sent.append((mail.subject, mail.text()))):
+            worker.handle('1-0', {'job': payload})
+
+        assert redis.acked == ['1-0']
+        (sent_subject, text), = sent
+        assert sent_subject == subject
+        assert 'reject-mail-plain' not in text
@@ -0,0 +1,91 @@
+import asyncio
+
+from fastapi import FastAPI
+
+from appointment.database import schemas
+from appointment.middleware.SanitizeMiddleware import SanitizeMiddleware, free_text_tree_of_model
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.post('/schedule/{id}')
+    def update_schedule(id: int, schedule: schemas.ScheduleValidationIn):
+        return schedule
+
+    @app.put('/request')
+    def request_booking(s_a: schemas.AvailabilitySlotAttendee):
+        return s_a
+
+    @app.post('/connect')
+    def connect(connection: schemas.CalendarConnectionIn):
+        return connection
+
+    return app
+
+
+def run(app, method, path, chunks):
+    """Send a request through the middleware, and return the body the route receives"""
+    received = []
+
+    async def endpoint(scope, receive, send):
+        while True:
+            message = await receive()
+            received.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': index < len(chunks) - 1}
+        for index, chunk in enumerate(chunks)
+    ]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        pass
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'root_path': '', 'app': app, 'headers': []}
+    asyncio.run(SanitizeMiddleware(endpoint)(scope, receive, send))
+    return b''.join(received)
+
+
+class TestSanitizeMiddleware:
+    def test_free_text_tree(self):
+        assert free_text_tree_of_model(schemas.ScheduleValidationIn) == {'name': True, 'details': True}
+        assert free_text_tree_of_model(schemas.AvailabilitySlotAttendee) == {'attendee': {'name': True}}
+        assert free_text_tree_of_model(schemas.CalendarConnectionIn) == {'title': True}
+
+    def test_sanitizes_free_text_only(self):
+        app = make_app()
+        body = run(
+            app,
+            'POST',
+            '/connect',
+            [b'{"title": "<b>Work</b>", "url": "https://example.org/?a=1&b=2", "user": "me", "password": "<a&b>"}'],
+        )
+        assert body == b'{"title":"Work","url":"https://example.org/?a=1&b=2","user":"me","password":"<a&b>"}'
+
+    def test_nested_and_chunked(self):
+        app = make_app()
+        chunks = [b'{"slot": {"start": "2025-01-01T09:00:00Z", "duration": 30}, ', b'"attendee": {"email": "a@b.c", ',
+                  b'"name": "<script>evil()</script>Bob"}}']
+        body = run(app, 'PUT', '/request', chunks)
+        assert b'"name":"Bob"' in body
+        assert b'"email":"a@b.c"' in body
+
+    def test_untouched_body_is_not_reserialized(self):
+        app = make_app()
+        raw = b'{"name":  "Schedule",   "calendar_id": 1, "details": "A & B"}'
+        # nh3 would escape the ampersand, so this one does change
+        assert run(app, 'POST', '/schedule/1', [raw]) != raw
+
+        raw = b'{"name":  "Schedule",   "calendar_id": 1, "details": "Nothing to see"}'
+        assert run(app, 'POST', '/schedule/1', [raw]) == raw
+
+    def test_passes_through_other_routes(self):
+        app = make_app()
+        raw = b'{"title": "<b>Work</b>"}'
+        assert run(app, 'POST', '/unknown', [raw]) == raw
+        assert run(app, 'POST', '/schedule/1', [b'not json']) == b'not json'
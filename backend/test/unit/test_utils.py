@@ -4,7 +4,7 @@ from freezegun import freeze_time
 
 from appointment.database import schemas
 from appointment.routes.schedule import is_this_a_valid_booking_time
-from appointment.utils import retrieve_user_url_data
+from appointment.utils import retrieve_user_url_data, obscure_key
 
 
 class TestRetrieveUserUrlData:
@@ -58,6 +58,19 @@ class TestRetrieveUserUrlData:
         assert original_clean_url != clean_url
 
 
+class TestObscureKey:
+    def test_deterministic(self):
+        assert obscure_key(1) == obscure_key('1') == obscure_key(1)
+        assert obscure_key(1) != obscure_key(2)
+
+    def test_obscured(self):
+        key = obscure_key('https://caldav.example.org/dav/')
+        assert len(key) == 32
+        assert 'example' not in key
+        # Only our hex digits, so it's safe to use within redis keys
+        assert int(key, 16) >= 0
+
+
 class TestIsAValidBookingTime:
     def test_bug_735(self, make_schedule):
         """A test case to cover unsuccessfully capturing bug 735, which is the seemingly random slot not found issue.